@@ -0,0 +1,255 @@
+# alert_listing.py
+"""
+Filtered, keyset-paginated alert listing behind /api/alerts.
+
+Unlike /api/cars, which reads the alerts stored in fleet_alerts, the alerts
+here are derived per request from indexed date columns, so the thresholds
+can be chosen per query ("everything expiring in the next 30 days") without
+touching the stored alerts:
+
+    document_expired / document_expiring_soon  vehicle_documents.expiry_date
+    maintenance_overdue / no_maintenance_record vehicle_alert_reviews.last_maintenance_on
+    fuel_low                                    vehicles.fuel_level
+
+Every alert has a due date (the expiry date, or the day maintenance became
+overdue) except fuel_low and no_maintenance_record. Alerts are ordered by
+due date, undated alerts last, then by vehicle. Each source is read in that
+order straight from its index and cut at the page size before the sources
+are merged, so a page costs the same however many alerts match.
+"""
+import json
+import base64
+from datetime import date, timedelta
+
+from alerts import (ALERT_SEVERITIES, MAINTENANCE_OVERDUE_DAYS, DOCUMENT_EXPIRY_WARNING_DAYS, to_date,
+                    vehicle_label, fuel_alert, maintenance_overdue_alert, no_maintenance_alert, document_alert)
+
+DEFAULT_ALERT_PAGE_SIZE = 50
+MAX_ALERT_PAGE_SIZE = 500
+MAX_THRESHOLD_DAYS = 3660
+
+# (index name, table, column list), built concurrently by migration 4
+ALERT_LISTING_INDEXES = [
+    ("idx_vehicle_documents_expiry_date", "vehicle_documents", "expiry_date, vehicle_id, id"),
+    ("idx_vehicle_alert_reviews_last_maintenance_on", "vehicle_alert_reviews", "last_maintenance_on, vehicle_id"),
+    ("idx_vehicles_fuel_level_id", "vehicles", "fuel_level, id"),
+]
+
+# Tie-breakers between alerts of one vehicle with the same due date; documents use their (positive) id
+FUEL_SOURCE_ID = -2
+NO_MAINTENANCE_SOURCE_ID = -1
+MAINTENANCE_SOURCE_ID = 0
+
+DOCUMENT_TYPES = {'document_expired', 'document_expiring_soon'}
+SEVERITIES = ['critical', 'warning', 'info']
+
+
+def encode_alert_cursor(due_on, vehicle_id, source_id):
+    """Builds an opaque cursor from the sort key of the last alert on a page."""
+    payload = json.dumps({"d": due_on.isoformat() if due_on else None, "v": vehicle_id, "s": source_id},
+                         separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_alert_cursor(cursor):
+    """Returns the (due_on, vehicle_id, source_id) key stored in a cursor."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        due_on = date.fromisoformat(payload['d']) if payload['d'] is not None else None
+        return due_on, int(payload['v']), int(payload['s'])
+    except (ValueError, KeyError, TypeError):
+        raise ValueError("Invalid cursor")
+
+
+def parse_list_param(args, name, allowed):
+    """Parses a comma-separated (or repeated) parameter, validating every value."""
+    values = {value.strip() for raw in args.getlist(name) for value in raw.split(',') if value.strip()}
+    unknown = values - set(allowed)
+    if unknown:
+        raise ValueError(f"Unknown {name} '{sorted(unknown)[0]}'. Use one of: {', '.join(allowed)}")
+    return values
+
+
+def parse_int_param(args, name, default, minimum, maximum):
+    try:
+        value = int(args.get(name, default))
+    except ValueError:
+        raise ValueError(f"{name} must be an integer")
+    if value < minimum or value > maximum:
+        raise ValueError(f"{name} must be between {minimum} and {maximum}")
+    return value
+
+
+def parse_alert_args(args, today=None):
+    """
+    Validates the alert listing query parameters. Raises ValueError with a
+    message suitable for a 400 response.
+    """
+    types = parse_list_param(args, 'type', list(ALERT_SEVERITIES)) or set(ALERT_SEVERITIES)
+    severities = parse_list_param(args, 'severity', SEVERITIES)
+    if severities:
+        types = {alert_type for alert_type in types if ALERT_SEVERITIES[alert_type] in severities}
+
+    vehicle_id = None
+    if args.get('vehicle_id'):
+        try:
+            vehicle_id = int(args['vehicle_id'])
+        except ValueError:
+            raise ValueError("vehicle_id must be an integer")
+
+    return {
+        "today": today or date.today(),
+        "types": types,
+        "vehicle_id": vehicle_id,
+        "category": args.get('category') or None,
+        "expiry_window_days": parse_int_param(args, 'expiry_window_days', DOCUMENT_EXPIRY_WARNING_DAYS,
+                                              0, MAX_THRESHOLD_DAYS),
+        "maintenance_overdue_days": parse_int_param(args, 'maintenance_overdue_days', MAINTENANCE_OVERDUE_DAYS,
+                                                    1, MAX_THRESHOLD_DAYS),
+        "limit": parse_int_param(args, 'limit', DEFAULT_ALERT_PAGE_SIZE, 1, MAX_ALERT_PAGE_SIZE),
+        "after": decode_alert_cursor(args['cursor']) if args.get('cursor') else None,
+    }
+
+
+def source_query(select, vehicle_column, date_column, source_id, conditions, listing, after_date_param=None):
+    """
+    One alert source: `select` filtered by `conditions`, the vehicle filters
+    and the cursor, in sort order and cut at the page size. Dated sources
+    sort on `date_column`, which the cursor's due date is compared with as
+    %(<after_date_param>)s; returns None if the cursor is past every row.
+    """
+    conditions = list(conditions)
+    joins = ""
+    if listing['vehicle_id'] is not None:
+        conditions.append(f"{vehicle_column} = %(vehicle_id)s")
+    if listing['category'] is not None:
+        if vehicle_column != "v.id":
+            joins = f" JOIN vehicles v ON v.id = {vehicle_column}"
+        conditions.append("v.category = %(category)s")
+
+    key = [vehicle_column] if date_column is None else [date_column, vehicle_column]
+    after = listing['after']
+    if after is not None:
+        if date_column is not None and after[0] is None:
+            return None  # Undated alerts sort last: the cursor is past every dated one
+        if date_column is not None or after[0] is None:
+            bounds = ["%(after_vehicle)s"] if date_column is None else [f"%({after_date_param})s", "%(after_vehicle)s"]
+            # The row comparison without the source id can use the index; the full one breaks ties
+            conditions.append(f"({', '.join(key)}) >= ({', '.join(bounds)})")
+            conditions.append(f"({', '.join(key)}, {source_id}) > ({', '.join(bounds)}, %(after_source)s)")
+    order_by = ", ".join(key + ([source_id] if isinstance(source_id, str) else []))
+    return f"({select}{joins} WHERE {' AND '.join(conditions)} ORDER BY {order_by} LIMIT %(fetch)s)"
+
+
+def build_alert_query(listing):
+    """
+    Returns (sql, params) for one page of alerts described by
+    parse_alert_args(), or None when no alert can match.
+    """
+    today = listing['today']
+    types = listing['types']
+    overdue_days = listing['maintenance_overdue_days']
+    params = {
+        "today": today,
+        "horizon": today + timedelta(days=listing['expiry_window_days']),
+        "overdue_before": today - timedelta(days=overdue_days),
+        "overdue_days": overdue_days,
+        "vehicle_id": listing['vehicle_id'],
+        "category": listing['category'],
+        "fetch": listing['limit'] + 1,  # One extra row tells us whether another page exists
+    }
+    after = listing['after']
+    if after is not None:
+        params.update(after_vehicle=after[1], after_source=after[2])
+        if after[0] is not None:
+            params.update(after_due=after[0], after_maintenance=after[0] - timedelta(days=overdue_days))
+
+    sources = []
+    if types & DOCUMENT_TYPES:
+        conditions = ["d.expiry_date <= %(horizon)s"]
+        if 'document_expired' not in types:
+            conditions.append("d.expiry_date >= %(today)s")
+        elif 'document_expiring_soon' not in types:
+            conditions.append("d.expiry_date < %(today)s")
+        sources.append(source_query(
+            "SELECT d.vehicle_id, d.expiry_date, d.id, d.document_name FROM vehicle_documents d",
+            "d.vehicle_id", "d.expiry_date", "d.id", conditions, listing, "after_due"))
+    if 'maintenance_overdue' in types:
+        # Sorting on last_maintenance_on (not on the due date computed from it) lets the index supply the order
+        sources.append(source_query(
+            f"SELECT r.vehicle_id, r.last_maintenance_on + %(overdue_days)s, {MAINTENANCE_SOURCE_ID}, NULL "
+            "FROM vehicle_alert_reviews r",
+            "r.vehicle_id", "r.last_maintenance_on", MAINTENANCE_SOURCE_ID,
+            ["r.last_maintenance_on <= %(overdue_before)s"], listing, "after_maintenance"))
+    if 'no_maintenance_record' in types:
+        sources.append(source_query(
+            f"SELECT r.vehicle_id, NULL::date, {NO_MAINTENANCE_SOURCE_ID}, NULL FROM vehicle_alert_reviews r",
+            "r.vehicle_id", None, NO_MAINTENANCE_SOURCE_ID, ["r.last_maintenance_on IS NULL"], listing))
+    if 'fuel_low' in types:
+        sources.append(source_query(
+            f"SELECT v.id, NULL::date, {FUEL_SOURCE_ID}, NULL FROM vehicles v",
+            "v.id", None, FUEL_SOURCE_ID, ["v.fuel_level = 'Low'"], listing))
+
+    sources = [source for source in sources if source is not None]
+    if not sources:
+        return None
+    query = f"""
+        SELECT a.vehicle_id, a.due_on, a.source_id, a.document_name, v.make, v.model, v.year, v.category
+        FROM ({' UNION ALL '.join(sources)}) AS a (vehicle_id, due_on, source_id, document_name)
+        JOIN vehicles v ON v.id = a.vehicle_id
+        ORDER BY a.due_on NULLS LAST, a.vehicle_id, a.source_id
+        LIMIT %(fetch)s;
+    """
+    return query, params
+
+
+def serialize_alert(row, listing, raised_at):
+    """Builds the alert of one build_alert_query() row, with its severity, vehicle and due date."""
+    vehicle_id, due_on, source_id, document_name, make, model, year, category = row
+    label = vehicle_label({"make": make, "model": model, "year": year})
+    due_on = to_date(due_on)
+    if source_id == FUEL_SOURCE_ID:
+        alert = fuel_alert(vehicle_id, label, None)
+    elif source_id == NO_MAINTENANCE_SOURCE_ID:
+        alert = no_maintenance_alert(vehicle_id, label, None)
+    elif source_id == MAINTENANCE_SOURCE_ID:
+        overdue_days = listing['maintenance_overdue_days']
+        alert = maintenance_overdue_alert(vehicle_id, label, due_on - timedelta(days=overdue_days), None,
+                                          overdue_days)
+    else:
+        alert = document_alert(vehicle_id, label, document_name, due_on, listing['today'], None)
+    raised_at = raised_at.get((vehicle_id, alert['id']))
+    alert.update({
+        "severity": ALERT_SEVERITIES[alert['type']],
+        "vehicle_id": vehicle_id,
+        "category": "" if category is None else category,
+        "due_date": due_on.isoformat() if due_on else None,
+        # When the stored alert was raised; null for alerts only the requested thresholds raise
+        "timestamp": raised_at.isoformat() if raised_at else None,
+    })
+    return alert
+
+
+def fetch_alert_page(cur, listing):
+    """
+    Fetches one page of alerts. Returns (alerts, next_cursor), where
+    next_cursor is None on the last page.
+    """
+    query = build_alert_query(listing)
+    if query is None:
+        return [], None
+    cur.execute(*query)
+    rows = cur.fetchall()
+    next_cursor = None
+    if len(rows) > listing['limit']:
+        rows = rows[:listing['limit']]
+        last = rows[-1]
+        next_cursor = encode_alert_cursor(to_date(last[1]), last[0], last[2])
+
+    raised_at = {}
+    if rows:
+        cur.execute("SELECT vehicle_id, alert_id, raised_at FROM fleet_alerts WHERE vehicle_id = ANY(%s);",
+                    (sorted({row[0] for row in rows}),))
+        raised_at = {(vehicle_id, alert_id): timestamp for vehicle_id, alert_id, timestamp in cur.fetchall()}
+    return [serialize_alert(row, listing, raised_at) for row in rows], next_cursor
@@ -0,0 +1,615 @@
+# alerts.py
+"""
+Fleet alert engine.
+
+Generates the fuel, maintenance and document-expiry alerts shown on the
+dashboard. All child-table lookups are done with a fixed number of set-based
+queries for the whole set of vehicles instead of one query per vehicle.
+
+Alerts are persisted in fleet_alerts. Every write that can change a
+vehicle's alerts calls refresh_vehicle_alerts() for that vehicle inside its
+own transaction, and rollover_alerts() re-evaluates, once per day, only the
+vehicles whose date thresholds are crossed that day. Reading the alerts is
+then a single scan of fleet_alerts.
+
+The thresholds below are read from the environment; after changing them run
+`python rollover_alerts.py --rebuild` so the stored alerts follow.
+alert_listing.py answers filtered alert queries with per-request thresholds.
+"""
+import os
+from datetime import datetime, date, timedelta
+
+from psycopg2.extras import execute_values
+
+from db import transaction
+from images import rendition_url
+from events import publish
+
+# --- Alert Thresholds ---
+MAINTENANCE_OVERDUE_DAYS = int(os.environ.get("MAINTENANCE_OVERDUE_DAYS", 14))  # Last maintenance older than this raises a reminder
+DOCUMENT_EXPIRY_WARNING_DAYS = int(os.environ.get("DOCUMENT_EXPIRY_WARNING_DAYS", 10))  # Documents expiring within this window raise a warning
+
+# Alert type -> severity
+ALERT_SEVERITIES = {
+    "document_expired": "critical",
+    "maintenance_overdue": "warning",
+    "document_expiring_soon": "warning",
+    "fuel_low": "warning",
+    "no_maintenance_record": "info",
+}
+
+# Advisory lock namespaces (two-key form, so they never collide with storage.lock_digest)
+ALERTS_LOCK_NAMESPACE = 8001   # Second key is the vehicle id modulo ALERT_LOCK_SLOTS
+ALERT_LOCK_SLOTS = 256  # Bounds the locks one bulk refresh holds (the lock table is small)
+ROLLOVER_LOCK_NAMESPACE = 8002
+
+ALERT_TABLES = [
+    """
+    CREATE TABLE IF NOT EXISTS fleet_alerts (
+        vehicle_id INTEGER NOT NULL,
+        seq INTEGER NOT NULL,
+        alert_id TEXT NOT NULL,
+        alert_type VARCHAR(50) NOT NULL,
+        title VARCHAR(255) NOT NULL,
+        content TEXT NOT NULL,
+        raised_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (vehicle_id, seq),
+        FOREIGN KEY (vehicle_id) REFERENCES vehicles(id) ON DELETE CASCADE
+    );
+    """,
+    # When each vehicle's alerts were last evaluated and the next date on which they change by themselves
+    """
+    CREATE TABLE IF NOT EXISTS vehicle_alert_reviews (
+        vehicle_id INTEGER PRIMARY KEY,
+        evaluated_on DATE NOT NULL,
+        next_review_on DATE,
+        FOREIGN KEY (vehicle_id) REFERENCES vehicles(id) ON DELETE CASCADE
+    );
+    """,
+    # Single row: the last day rollover_alerts() completed
+    """
+    CREATE TABLE IF NOT EXISTS alert_rollovers (
+        id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+        rolled_over_on DATE NOT NULL
+    );
+    """,
+]
+
+# (index name, table, column list, method, predicate), built concurrently by migration 1
+ALERT_INDEXES = [
+    ("idx_vehicle_alert_reviews_next_review_on", "vehicle_alert_reviews", "next_review_on", "btree",
+     "next_review_on IS NOT NULL"),
+]
+
+# Migration 4: the latest maintenance date of each vehicle, so overdue vehicles are found by index
+ALERT_REVIEW_MAINTENANCE_DATE = [
+    "ALTER TABLE vehicle_alert_reviews ADD COLUMN IF NOT EXISTS last_maintenance_on DATE;",
+    """
+    UPDATE vehicle_alert_reviews r SET last_maintenance_on = m.log_date
+    FROM (SELECT vehicle_id, MAX(log_date) AS log_date FROM maintenance_logs GROUP BY vehicle_id) m
+    WHERE m.vehicle_id = r.vehicle_id AND r.last_maintenance_on IS DISTINCT FROM m.log_date;
+    """,
+]
+
+# Content hash of a vehicle's thumbnail, selected from vehicles
+THUMBNAIL_SHA256_COLUMN = """(SELECT content_sha256 FROM vehicle_images
+     WHERE vehicle_images.vehicle_id = vehicles.id AND vehicle_images.rendition = 'thumbnail') AS thumbnail_sha256"""
+
+# Columns returned for every vehicle in the fleet listing
+VEHICLE_LIST_COLUMNS = f"""id, model, year, make, vin, color, category, plate_number, created_at, last_fueled_date, fuel_level,
+    {THUMBNAIL_SHA256_COLUMN}"""
+
+
+def to_date(value):
+    """Normalizes a DATE/TIMESTAMP column value to a date (or None)."""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return None
+
+
+def serialize_vehicle_summary(row):
+    """
+    Converts a vehicle row (VEHICLE_LIST_COLUMNS, tuple or DictRow) into the
+    dict shape used by the fleet listing. Runs once per vehicle on every
+    listing, so the fields are mapped explicitly rather than by looping.
+    """
+    (vehicle_id, model, year, make, vin, color, category, plate_number, created_at, last_fueled_date,
+     fuel_level, thumbnail_sha256) = row
+    # Empty fields are "" rather than null, and 'fuel_level' is 'fuelLevel', as the frontend expects
+    return {
+        "id": vehicle_id,
+        "model": "" if model is None else model,
+        "year": "" if year is None else year,
+        "make": "" if make is None else make,
+        "vin": "" if vin is None else vin,
+        "color": "" if color is None else color,
+        "category": "" if category is None else category,
+        "plate_number": "" if plate_number is None else plate_number,
+        "created_at": created_at.isoformat() if created_at is not None else "",
+        "last_fueled_date": last_fueled_date.isoformat() if last_fueled_date is not None else "",
+        "fuelLevel": "" if fuel_level is None else fuel_level,
+        # Only a cacheable thumbnail URL is listed, never image bytes
+        "thumbnail_url": rendition_url(vehicle_id, 'thumbnail', thumbnail_sha256) if thumbnail_sha256 else "",
+    }
+
+
+# --- Set-based lookups ---
+
+def fetch_latest_maintenance(cur, vehicle_ids=None):
+    """Returns {vehicle_id: latest log_date} for the given vehicles (or all vehicles)."""
+    if vehicle_ids is None:
+        cur.execute("""
+            SELECT vehicle_id, MAX(log_date) AS log_date
+            FROM maintenance_logs GROUP BY vehicle_id;
+        """)
+    else:
+        cur.execute("""
+            SELECT vehicle_id, MAX(log_date) AS log_date
+            FROM maintenance_logs WHERE vehicle_id = ANY(%s) GROUP BY vehicle_id;
+        """, (list(vehicle_ids),))
+    return {row[0]: to_date(row[1]) for row in cur.fetchall()}
+
+
+def fetch_expiring_documents(cur, today, vehicle_ids=None):
+    """
+    Returns {vehicle_id: [(document_name, expiry_date), ...]} for documents that
+    are expired or expire within the warning window. Documents further in the
+    future can never raise an alert, so they are filtered out in SQL.
+    """
+    horizon = today + timedelta(days=DOCUMENT_EXPIRY_WARNING_DAYS)
+    if vehicle_ids is None:
+        cur.execute("""
+            SELECT vehicle_id, document_name, expiry_date FROM vehicle_documents
+            WHERE expiry_date IS NOT NULL AND expiry_date <= %s
+            ORDER BY vehicle_id, id;
+        """, (horizon,))
+    else:
+        cur.execute("""
+            SELECT vehicle_id, document_name, expiry_date FROM vehicle_documents
+            WHERE vehicle_id = ANY(%s) AND expiry_date IS NOT NULL AND expiry_date <= %s
+            ORDER BY vehicle_id, id;
+        """, (list(vehicle_ids), horizon))
+    documents = {}
+    for vehicle_id, document_name, expiry_date in cur.fetchall():
+        documents.setdefault(vehicle_id, []).append((document_name, to_date(expiry_date)))
+    return documents
+
+
+# --- Alert construction ---
+
+def vehicle_label(vehicle):
+    """The "Make Model (Year)" label used in alert texts."""
+    return f"{vehicle['make']} {vehicle['model']} ({vehicle['year']})"
+
+
+def describe_days(days):
+    """Renders a threshold for an alert text: 14 -> "2 weeks", 10 -> "10 days"."""
+    if days and days % 7 == 0:
+        weeks = days // 7
+        return f"{weeks} week{'s' if weeks != 1 else ''}"
+    return f"{days} day{'s' if days != 1 else ''}"
+
+
+def fuel_alert(vehicle_id, label, timestamp):
+    return {
+        "id": f"{vehicle_id}_fuel",
+        "type": "fuel_low",
+        "title": "Low Fuel Alert",
+        "content": f"⛽ {label} has low fuel. Consider refueling soon!",
+        "timestamp": timestamp
+    }
+
+
+def maintenance_overdue_alert(vehicle_id, label, latest_maintenance, timestamp, overdue_days=MAINTENANCE_OVERDUE_DAYS):
+    return {
+        "id": f"{vehicle_id}_maint_overdue",
+        "type": "maintenance_overdue",
+        "title": "Maintenance Reminder",
+        "content": f"🛠️ Check {label} maintenance logs. Last maintenance was over {describe_days(overdue_days)} ago (on {latest_maintenance.isoformat()}).",
+        "timestamp": timestamp
+    }
+
+
+def no_maintenance_alert(vehicle_id, label, timestamp):
+    return {
+        "id": f"{vehicle_id}_no_maint",
+        "type": "no_maintenance_record",
+        "title": "No Maintenance Record",
+        "content": f"⚙️ No maintenance records found for {label}. It's recommended to log maintenance regularly.",
+        "timestamp": timestamp
+    }
+
+
+def document_alert(vehicle_id, label, document_name, expiry_date, today, timestamp):
+    """The expiry warning (or, once expired, the expiry alert) of one document."""
+    days_until_expiry = (expiry_date - today).days
+    if days_until_expiry >= 0:
+        return {
+            "id": f"{vehicle_id}_doc_{document_name}_expiring",
+            "type": "document_expiring_soon",
+            "title": "Document Expiry Warning",
+            "content": f"📄 {label}'s {document_name} is expiring in {days_until_expiry} days! Expiry: {expiry_date.isoformat()}.",
+            "timestamp": timestamp
+        }
+    return {
+        "id": f"{vehicle_id}_doc_{document_name}_expired",
+        "type": "document_expired",
+        "title": "Document Expired!",
+        "content": f"🔴 {label}'s {document_name} expired on {expiry_date.isoformat()}! Please update.",
+        "timestamp": timestamp
+    }
+
+
+def build_vehicle_alerts(vehicle, latest_maintenance, documents, today, timestamp):
+    """
+    Builds the alerts for a single serialized vehicle.
+
+    `latest_maintenance` is the date of the newest maintenance log (or None),
+    `documents` a list of (document_name, expiry_date) tuples.
+    """
+    alerts = []
+    vehicle_id = vehicle['id']
+    label = vehicle_label(vehicle)
+
+    # Alert for low fuel
+    if vehicle['fuelLevel'] == 'Low':
+        alerts.append(fuel_alert(vehicle_id, label, timestamp))
+
+    # Alert for maintenance overdue (last maintenance older than the threshold)
+    if latest_maintenance is not None:
+        days_since_maintenance = (today - latest_maintenance).days
+        if days_since_maintenance >= MAINTENANCE_OVERDUE_DAYS:
+            alerts.append(maintenance_overdue_alert(vehicle_id, label, latest_maintenance, timestamp))
+    else:
+        # Alert if no maintenance logs exist
+        alerts.append(no_maintenance_alert(vehicle_id, label, timestamp))
+
+    # Alerts for documents nearing expiry or expired
+    for document_name, expiry_date in documents:
+        if expiry_date is None:
+            continue
+        if (expiry_date - today).days <= DOCUMENT_EXPIRY_WARNING_DAYS:
+            alerts.append(document_alert(vehicle_id, label, document_name, expiry_date, today, timestamp))
+
+    return alerts
+
+
+def build_fleet_alerts(cur, vehicles, today=None, all_vehicles=True):
+    """
+    Generates alerts for a list of serialized vehicles using two set-based
+    queries, regardless of fleet size.
+
+    Pass all_vehicles=False when `vehicles` is only a subset of the table so the
+    child-table lookups are restricted to those ids.
+    """
+    today = today or date.today()
+    timestamp = datetime.now().isoformat()
+    vehicle_ids = None if all_vehicles else [v['id'] for v in vehicles]
+    if vehicle_ids == []:
+        return []
+
+    latest_maintenance = fetch_latest_maintenance(cur, vehicle_ids)
+    expiring_documents = fetch_expiring_documents(cur, today, vehicle_ids)
+
+    alerts = []
+    for vehicle in vehicles:
+        alerts.extend(build_vehicle_alerts(
+            vehicle,
+            latest_maintenance.get(vehicle['id']),
+            expiring_documents.get(vehicle['id'], []),
+            today,
+            timestamp,
+        ))
+    return alerts
+
+
+# --- Persisted alerts ---
+
+def next_review_date(latest_maintenance, expiry_dates, today):
+    """
+    Returns the first day after `today` on which a vehicle's alerts change
+    without any write (or None if they never will): maintenance turning
+    overdue, a document entering the warning window, or a warning whose
+    countdown ticks or turns into an expiry.
+    """
+    candidates = []
+    if latest_maintenance is not None:
+        overdue_on = latest_maintenance + timedelta(days=MAINTENANCE_OVERDUE_DAYS)
+        if overdue_on > today:
+            candidates.append(overdue_on)
+    for expiry_date in expiry_dates:
+        warning_from = expiry_date - timedelta(days=DOCUMENT_EXPIRY_WARNING_DAYS)
+        if warning_from > today:
+            candidates.append(warning_from)
+        elif expiry_date >= today:
+            candidates.append(today + timedelta(days=1))  # "expiring in N days" changes daily
+    return min(candidates) if candidates else None
+
+
+def lock_vehicle_alerts(cur, vehicle_ids):
+    """Serializes refreshes of the same vehicles until the end of the transaction."""
+    slots = sorted({vehicle_id % ALERT_LOCK_SLOTS for vehicle_id in vehicle_ids})
+    cur.execute("SELECT pg_advisory_xact_lock(%s, slot) FROM unnest(%s::integer[]) AS slot;",
+                (ALERTS_LOCK_NAMESPACE, slots))
+
+
+def refresh_vehicle_alerts(cur, vehicle_ids, today=None, notify=True):
+    """
+    Recomputes the stored alerts of the given vehicles. Call it in the same
+    transaction as any write that affects a vehicle's fuel level, label,
+    maintenance logs or document expiry dates. Alerts that are still raised
+    keep their original raised_at. Publishes alert.raised / alert.cleared
+    events for whatever changed, unless notify=False (bulk writers publish a
+    single resync instead).
+    """
+    vehicle_ids = sorted({int(vehicle_id) for vehicle_id in vehicle_ids if vehicle_id is not None})
+    if not vehicle_ids:
+        return
+    today = today or date.today()
+    now = datetime.now()
+    lock_vehicle_alerts(cur, vehicle_ids)
+
+    cur.execute("SELECT id, make, model, year, fuel_level FROM vehicles WHERE id = ANY(%s) ORDER BY id;",
+                (vehicle_ids,))
+    vehicles = [{"id": row[0], "make": row[1], "model": row[2], "year": row[3], "fuelLevel": row[4] or ""}
+                for row in cur.fetchall()]
+
+    cur.execute("""
+        DELETE FROM fleet_alerts WHERE vehicle_id = ANY(%s)
+        RETURNING alert_id, alert_type, title, content, raised_at;
+    """, (vehicle_ids,))
+    previous = {row[0]: tuple(row[1:]) for row in cur.fetchall()}
+
+    latest_maintenance = fetch_latest_maintenance(cur, vehicle_ids)
+    expiring_documents = fetch_expiring_documents(cur, today, vehicle_ids)
+    # Only the nearest document outside the warning window can start a new warning
+    cur.execute("""
+        SELECT vehicle_id, MIN(expiry_date) FROM vehicle_documents
+        WHERE vehicle_id = ANY(%s) AND expiry_date > %s GROUP BY vehicle_id;
+    """, (vehicle_ids, today + timedelta(days=DOCUMENT_EXPIRY_WARNING_DAYS)))
+    next_expiry = {row[0]: to_date(row[1]) for row in cur.fetchall()}
+
+    alert_rows = []
+    review_rows = []
+    changed_alerts = []
+    for vehicle in vehicles:
+        vehicle_id = vehicle['id']
+        documents = expiring_documents.get(vehicle_id, [])
+        vehicle_alerts = build_vehicle_alerts(vehicle, latest_maintenance.get(vehicle_id), documents, today, None)
+        for seq, alert in enumerate(vehicle_alerts):
+            old = previous.pop(alert['id'], None)
+            alert['timestamp'] = old[3] if old else now
+            alert_rows.append((vehicle_id, seq, alert['id'], alert['type'], alert['title'], alert['content'],
+                               alert['timestamp']))
+            if old is None or old[:3] != (alert['type'], alert['title'], alert['content']):
+                changed_alerts.append(alert)
+        expiry_dates = [expiry for _, expiry in documents if expiry is not None]
+        if vehicle_id in next_expiry:
+            expiry_dates.append(next_expiry[vehicle_id])
+        review_rows.append((vehicle_id, today, next_review_date(latest_maintenance.get(vehicle_id), expiry_dates, today),
+                            latest_maintenance.get(vehicle_id)))
+
+    if alert_rows:
+        execute_values(cur, """
+            INSERT INTO fleet_alerts (vehicle_id, seq, alert_id, alert_type, title, content, raised_at) VALUES %s;
+        """, alert_rows, page_size=1000)
+    if review_rows:
+        execute_values(cur, """
+            INSERT INTO vehicle_alert_reviews (vehicle_id, evaluated_on, next_review_on, last_maintenance_on) VALUES %s
+            ON CONFLICT (vehicle_id) DO UPDATE
+            SET evaluated_on = EXCLUDED.evaluated_on, next_review_on = EXCLUDED.next_review_on,
+                last_maintenance_on = EXCLUDED.last_maintenance_on;
+        """, review_rows, page_size=1000)
+
+    if not notify:
+        return
+    # Whatever is left in `previous` is no longer raised
+    for alert_id in previous:
+        publish(cur, "alert.cleared", {"id": alert_id})
+    for alert in changed_alerts:
+        publish(cur, "alert.raised", {**alert, "timestamp": alert['timestamp'].isoformat()})
+
+
+def clear_vehicle_alerts(cur, vehicle_id):
+    """Deletes a vehicle's stored alerts (before the vehicle itself is deleted) and announces it."""
+    lock_vehicle_alerts(cur, [vehicle_id])
+    cur.execute("DELETE FROM fleet_alerts WHERE vehicle_id = %s RETURNING alert_id;", (vehicle_id,))
+    for (alert_id,) in cur.fetchall():
+        publish(cur, "alert.cleared", {"id": alert_id})
+
+
+def fetch_fleet_alerts(cur, vehicles, all_vehicles=True):
+    """
+    Reads the stored alerts for a list of serialized vehicles, in the same
+    order build_fleet_alerts() produces. Pass all_vehicles=False when
+    `vehicles` is only a subset of the table.
+    """
+    query = fleet_alerts_query(vehicles, all_vehicles)
+    if query is None:
+        return []
+    cur.execute(*query)
+    return order_fleet_alerts(cur.fetchall(), vehicles)
+
+
+def fleet_alerts_query(vehicles, all_vehicles=True):
+    """Returns (sql, params) reading the stored alerts of fetch_fleet_alerts(), or None if there are none."""
+    if all_vehicles:
+        return """
+            SELECT vehicle_id, alert_id, alert_type, title, content, raised_at
+            FROM fleet_alerts ORDER BY vehicle_id, seq;
+        """, None
+    vehicle_ids = [vehicle['id'] for vehicle in vehicles]
+    if not vehicle_ids:
+        return None
+    return """
+        SELECT vehicle_id, alert_id, alert_type, title, content, raised_at
+        FROM fleet_alerts WHERE vehicle_id = ANY(%s) ORDER BY vehicle_id, seq;
+    """, (vehicle_ids,)
+
+
+def order_fleet_alerts(rows, vehicles):
+    """
+    Serializes the rows of fleet_alerts_query() in the order of `vehicles`.
+    `timestamp` is the stored raised_at, not the request time the original
+    loop reported, so identical fleets give byte-identical responses.
+    """
+    stored = {}
+    for vehicle_id, alert_id, alert_type, title, content, raised_at in rows:
+        stored.setdefault(vehicle_id, []).append({
+            "id": alert_id,
+            "type": alert_type,
+            "title": title,
+            "content": content,
+            "timestamp": raised_at.isoformat(),
+        })
+    alerts = []
+    for vehicle in vehicles:
+        alerts.extend(stored.get(vehicle['id'], []))
+    return alerts
+
+
+def rollover_alerts(cur, today=None):
+    """
+    Brings the stored alerts up to `today`: re-evaluates the vehicles whose
+    next review date has arrived, plus any vehicle that has never been
+    evaluated (e.g. rows inserted by scripts). Live clients get a single
+    resync event rather than one event per changed alert. Returns the number
+    of vehicles refreshed.
+    """
+    today = today or date.today()
+    cur.execute("SELECT pg_advisory_xact_lock(%s, 0);", (ROLLOVER_LOCK_NAMESPACE,))
+    cur.execute("""
+        SELECT vehicle_id FROM vehicle_alert_reviews WHERE next_review_on <= %s
+        UNION
+        SELECT v.id FROM vehicles v
+        WHERE NOT EXISTS (SELECT 1 FROM vehicle_alert_reviews r WHERE r.vehicle_id = v.id);
+    """, (today,))
+    vehicle_ids = [row[0] for row in cur.fetchall()]
+    # Date-driven changes can touch much of the fleet at once: one resync instead of an event per alert
+    refresh_vehicle_alerts(cur, vehicle_ids, today, notify=False)
+    if vehicle_ids:
+        publish(cur, "resync", {})
+    cur.execute("""
+        INSERT INTO alert_rollovers (id, rolled_over_on) VALUES (TRUE, %s)
+        ON CONFLICT (id) DO UPDATE SET rolled_over_on = GREATEST(alert_rollovers.rolled_over_on, EXCLUDED.rolled_over_on);
+    """, (today,))
+    return len(vehicle_ids)
+
+
+def ensure_alerts_current(cur, today=None):
+    """
+    Runs the daily rollover if nobody has run it yet today, so readers never
+    see alerts from a previous day even without a scheduled job.
+    """
+    today = today or date.today()
+    cur.execute(ROLLOVER_STATE_QUERY)
+    if rolled_over_today(cur.fetchone(), today):
+        return 0
+    # Another request may be rolling over right now; wait for it and check again
+    cur.execute("SELECT pg_advisory_xact_lock(%s, 0);", (ROLLOVER_LOCK_NAMESPACE,))
+    cur.execute(ROLLOVER_STATE_QUERY)
+    if rolled_over_today(cur.fetchone(), today):
+        return 0
+    return rollover_alerts(cur, today)
+
+
+def ensure_alerts_current_for_read(cur, today=None):
+    """
+    ensure_alerts_current() for a read_transaction() cursor. A replica's
+    read-only session cannot run the rollover, so a due rollover runs in a
+    transaction of its own on the primary.
+    """
+    if not cur.connection.readonly:
+        return ensure_alerts_current(cur, today)
+    cur.execute(ROLLOVER_STATE_QUERY)
+    if rolled_over_today(cur.fetchone(), today or date.today()):
+        return 0
+    with transaction() as primary_cur:
+        return ensure_alerts_current(primary_cur, today)
+
+
+ROLLOVER_STATE_QUERY = "SELECT rolled_over_on FROM alert_rollovers;"
+
+
+def rolled_over_today(row, today):
+    """Whether a ROLLOVER_STATE_QUERY row shows that `today`'s rollover has run."""
+    return row is not None and row[0] >= today
+
+
+def legacy_fleet_alerts(cur, vehicles, today=None):
+    """
+    Reference implementation of the original per-vehicle alert loop from
+    /api/cars (two queries per vehicle), queries unchanged. Kept only so
+    verify_alerts.py can prove that build_fleet_alerts() produces the same
+    output. Its document query has no ORDER BY, so the order of one vehicle's
+    document alerts is unspecified.
+    """
+    now = today or date.today()
+    alerts = []
+    for vehicle_dict in vehicles:
+        vehicle_id = vehicle_dict['id']
+
+        if vehicle_dict['fuelLevel'] == 'Low':
+            alerts.append({
+                "id": f"{vehicle_id}_fuel",
+                "type": "fuel_low",
+                "title": "Low Fuel Alert",
+                "content": f"⛽ {vehicle_dict['make']} {vehicle_dict['model']} ({vehicle_dict['year']}) has low fuel. Consider refueling soon!",
+                "timestamp": datetime.now().isoformat()
+            })
+
+        cur.execute("""
+            SELECT log_date FROM maintenance_logs
+            WHERE vehicle_id = %s ORDER BY log_date DESC LIMIT 1;
+        """, (vehicle_id,))
+        latest_maintenance = cur.fetchone()
+
+        if latest_maintenance and latest_maintenance[0] is not None:
+            log_date_obj = to_date(latest_maintenance[0])
+            if log_date_obj:
+                days_since_maintenance = (now - log_date_obj).days
+                if days_since_maintenance >= 14:
+                    alerts.append({
+                        "id": f"{vehicle_id}_maint_overdue",
+                        "type": "maintenance_overdue",
+                        "title": "Maintenance Reminder",
+                        "content": f"🛠️ Check {vehicle_dict['make']} {vehicle_dict['model']} ({vehicle_dict['year']}) maintenance logs. Last maintenance was over 2 weeks ago (on {log_date_obj.isoformat()}).",
+                        "timestamp": datetime.now().isoformat()
+                    })
+        else:
+            alerts.append({
+                "id": f"{vehicle_id}_no_maint",
+                "type": "no_maintenance_record",
+                "title": "No Maintenance Record",
+                "content": f"⚙️ No maintenance records found for {vehicle_dict['make']} {vehicle_dict['model']} ({vehicle_dict['year']}). It's recommended to log maintenance regularly.",
+                "timestamp": datetime.now().isoformat()
+            })
+
+        cur.execute("""
+            SELECT document_name, expiry_date FROM vehicle_documents
+            WHERE vehicle_id = %s AND expiry_date IS NOT NULL;
+        """, (vehicle_id,))
+        for document_name, expiry_date_val in cur.fetchall():
+            expiry_date_obj = to_date(expiry_date_val)
+            if not expiry_date_obj:
+                continue
+            days_until_expiry = (expiry_date_obj - now).days
+            if 0 <= days_until_expiry <= 10:
+                alerts.append({
+                    "id": f"{vehicle_id}_doc_{document_name}_expiring",
+                    "type": "document_expiring_soon",
+                    "title": "Document Expiry Warning",
+                    "content": f"📄 {vehicle_dict['make']} {vehicle_dict['model']} ({vehicle_dict['year']})'s {document_name} is expiring in {days_until_expiry} days! Expiry: {expiry_date_obj.isoformat()}.",
+                    "timestamp": datetime.now().isoformat()
+                })
+            elif days_until_expiry < 0:
+                alerts.append({
+                    "id": f"{vehicle_id}_doc_{document_name}_expired",
+                    "type": "document_expired",
+                    "title": "Document Expired!",
+                    "content": f"🔴 {vehicle_dict['make']} {vehicle_dict['model']} ({vehicle_dict['year']})'s {document_name} expired on {expiry_date_obj.isoformat()}! Please update.",
+                    "timestamp": datetime.now().isoformat()
+                })
+    return alerts
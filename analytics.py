@@ -0,0 +1,383 @@
+# analytics.py
+"""
+Fleet maintenance analytics.
+
+Reports are answered from rollup tables only, never from maintenance_logs:
+
+- maintenance_rollups: events and service intervals per
+  (category, make, month, log_type);
+- maintenance_vehicle_facts: the same per vehicle, which is what a
+  vehicle's contribution to the rollups is subtracted with when it changes;
+- maintenance_vehicle_summaries: event count and last service date per
+  vehicle, for "no service in N days".
+
+Triggers on maintenance_logs and vehicles queue the vehicles whose logs,
+category or make change (new log ids alone would miss transactions that
+commit out of order, deletions and recategorized vehicles).
+refresh_maintenance_rollups() takes a batch of queued vehicles, recomputes
+their facts from their own logs and applies the difference to the rollups,
+so a refresh costs the same however large the log table is. Run it from
+refresh_analytics.py.
+
+A service interval is the number of days since the vehicle's previous
+maintenance event; it is counted in the month and log type of the later
+event, so the mean interval of any group is gap_days_sum / gap_count.
+"""
+import os
+from datetime import date, timedelta
+
+from revisions import create_trigger_if_missing
+
+# --- Analytics Configuration ---
+ANALYTICS_REFRESH_BATCH = int(os.environ.get("ANALYTICS_REFRESH_BATCH", 1000))  # Vehicles per refresh transaction
+MAX_SERVICE_GAP_VEHICLES = 500
+
+# Advisory lock (two-key form) held by the refresh, so only one runs at a time
+ANALYTICS_LOCK_NAMESPACE = 8004
+
+ANALYTICS_TABLES = [
+    """
+    CREATE TABLE IF NOT EXISTS maintenance_rollups (
+        category VARCHAR(100) NOT NULL,
+        make VARCHAR(255) NOT NULL,
+        month DATE NOT NULL,
+        log_type VARCHAR(255) NOT NULL,
+        events BIGINT NOT NULL,
+        gap_days_sum BIGINT NOT NULL,
+        gap_count BIGINT NOT NULL,
+        PRIMARY KEY (category, make, month, log_type)
+    );
+    """,
+    # No foreign key: the facts of a deleted vehicle are still needed to subtract them from the rollups
+    """
+    CREATE TABLE IF NOT EXISTS maintenance_vehicle_facts (
+        vehicle_id INTEGER NOT NULL,
+        month DATE NOT NULL,
+        log_type VARCHAR(255) NOT NULL,
+        category VARCHAR(100) NOT NULL,
+        make VARCHAR(255) NOT NULL,
+        events INTEGER NOT NULL,
+        gap_days_sum INTEGER NOT NULL,
+        gap_count INTEGER NOT NULL,
+        PRIMARY KEY (vehicle_id, month, log_type)
+    );
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS maintenance_vehicle_summaries (
+        vehicle_id INTEGER PRIMARY KEY,
+        category VARCHAR(100) NOT NULL,
+        make VARCHAR(255) NOT NULL,
+        events INTEGER NOT NULL,
+        last_service_on DATE
+    );
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_maintenance_vehicle_summaries_last_service_on
+    ON maintenance_vehicle_summaries (last_service_on NULLS FIRST, vehicle_id);
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS maintenance_rollup_queue (
+        vehicle_id INTEGER PRIMARY KEY,
+        queued_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP
+    );
+    """,
+    # Single row: when the last refresh batch committed
+    """
+    CREATE TABLE IF NOT EXISTS analytics_refreshes (
+        id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+        refreshed_at TIMESTAMPTZ NOT NULL
+    );
+    """,
+    # The upsert (rather than DO NOTHING) locks the queue row, so a refresh that is taking the
+    # vehicle off the queue waits for this transaction and then sees its changes
+    """
+    CREATE OR REPLACE FUNCTION queue_new_maintenance_rollups() RETURNS trigger AS $$
+    BEGIN
+        INSERT INTO maintenance_rollup_queue (vehicle_id)
+        SELECT DISTINCT vehicle_id FROM new_rows ORDER BY vehicle_id
+        ON CONFLICT (vehicle_id) DO UPDATE SET queued_at = EXCLUDED.queued_at;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+    """,
+    """
+    CREATE OR REPLACE FUNCTION queue_new_vehicle_rollups() RETURNS trigger AS $$
+    BEGIN
+        INSERT INTO maintenance_rollup_queue (vehicle_id)
+        SELECT id FROM new_rows ORDER BY id
+        ON CONFLICT (vehicle_id) DO UPDATE SET queued_at = EXCLUDED.queued_at;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+    """,
+    """
+    CREATE OR REPLACE FUNCTION queue_maintenance_rollup() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'UPDATE' THEN
+            INSERT INTO maintenance_rollup_queue (vehicle_id) VALUES (NEW.vehicle_id)
+            ON CONFLICT (vehicle_id) DO UPDATE SET queued_at = EXCLUDED.queued_at;
+        END IF;
+        IF TG_OP = 'DELETE' OR OLD.vehicle_id IS DISTINCT FROM NEW.vehicle_id THEN
+            INSERT INTO maintenance_rollup_queue (vehicle_id) VALUES (OLD.vehicle_id)
+            ON CONFLICT (vehicle_id) DO UPDATE SET queued_at = EXCLUDED.queued_at;
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+    """,
+    """
+    CREATE OR REPLACE FUNCTION queue_vehicle_maintenance_rollup() RETURNS trigger AS $$
+    BEGIN
+        INSERT INTO maintenance_rollup_queue (vehicle_id) VALUES (OLD.id)
+        ON CONFLICT (vehicle_id) DO UPDATE SET queued_at = EXCLUDED.queued_at;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+    """,
+    # Statement level for inserts, so a maintenance batch or vehicle import queues its vehicles in one INSERT
+    create_trigger_if_missing(
+        'maintenance_logs_queue_new_rollups', 'maintenance_logs',
+        "AFTER INSERT ON maintenance_logs REFERENCING NEW TABLE AS new_rows "
+        "FOR EACH STATEMENT EXECUTE FUNCTION queue_new_maintenance_rollups()"),
+    create_trigger_if_missing(
+        'maintenance_logs_queue_rollup', 'maintenance_logs',
+        "AFTER UPDATE OR DELETE ON maintenance_logs FOR EACH ROW EXECUTE FUNCTION queue_maintenance_rollup()"),
+    create_trigger_if_missing(
+        'vehicles_queue_new_rollups', 'vehicles',
+        "AFTER INSERT ON vehicles REFERENCING NEW TABLE AS new_rows "
+        "FOR EACH STATEMENT EXECUTE FUNCTION queue_new_vehicle_rollups()"),
+    create_trigger_if_missing(
+        'vehicles_queue_rollup', 'vehicles',
+        "AFTER UPDATE OF category, make OR DELETE ON vehicles "
+        "FOR EACH ROW EXECUTE FUNCTION queue_vehicle_maintenance_rollup()"),
+    # Existing vehicles are summarized by the first refresh
+    "INSERT INTO maintenance_rollup_queue (vehicle_id) SELECT id FROM vehicles ON CONFLICT (vehicle_id) DO NOTHING;",
+]
+
+ROLLUP_KEY = "category, make, month, log_type"
+
+# Adds the grouped rows of a data-modifying CTE named `changed` to the rollups (negated for old facts)
+APPLY_TO_ROLLUPS = f"""
+    INSERT INTO maintenance_rollups AS r ({ROLLUP_KEY}, events, gap_days_sum, gap_count)
+    SELECT {ROLLUP_KEY}, {{sign}}SUM(events), {{sign}}SUM(gap_days_sum), {{sign}}SUM(gap_count)
+    FROM changed GROUP BY {ROLLUP_KEY} ORDER BY {ROLLUP_KEY}
+    ON CONFLICT ({ROLLUP_KEY}) DO UPDATE
+    SET events = r.events + EXCLUDED.events,
+        gap_days_sum = r.gap_days_sum + EXCLUDED.gap_days_sum,
+        gap_count = r.gap_count + EXCLUDED.gap_count;
+"""
+
+SUBTRACT_VEHICLE_FACTS = f"""
+    WITH changed AS (
+        DELETE FROM maintenance_vehicle_facts WHERE vehicle_id = ANY(%s)
+        RETURNING {ROLLUP_KEY}, events, gap_days_sum, gap_count
+    )
+""" + APPLY_TO_ROLLUPS.format(sign="-")
+
+# Vehicles that no longer exist have no logs left and simply drop out
+ADD_VEHICLE_FACTS = f"""
+    WITH changed AS (
+        INSERT INTO maintenance_vehicle_facts
+            (vehicle_id, month, log_type, category, make, events, gap_days_sum, gap_count)
+        SELECT l.vehicle_id, date_trunc('month', l.log_date)::date, l.log_type, COALESCE(v.category, ''), v.make,
+               COUNT(*), COALESCE(SUM(l.gap), 0), COUNT(l.gap)
+        FROM (SELECT vehicle_id, log_date, log_type,
+                     log_date - LAG(log_date) OVER (PARTITION BY vehicle_id ORDER BY log_date, id) AS gap
+              FROM maintenance_logs WHERE vehicle_id = ANY(%s)) l
+        JOIN vehicles v ON v.id = l.vehicle_id
+        GROUP BY 1, 2, 3, 4, 5
+        RETURNING {ROLLUP_KEY}, events, gap_days_sum, gap_count
+    )
+""" + APPLY_TO_ROLLUPS.format(sign="")
+
+REPLACE_VEHICLE_SUMMARIES = [
+    "DELETE FROM maintenance_vehicle_summaries WHERE vehicle_id = ANY(%(ids)s);",
+    """
+    INSERT INTO maintenance_vehicle_summaries (vehicle_id, category, make, events, last_service_on)
+    SELECT v.id, COALESCE(v.category, ''), v.make, COUNT(l.id), MAX(l.log_date)
+    FROM vehicles v LEFT JOIN maintenance_logs l ON l.vehicle_id = v.id
+    WHERE v.id = ANY(%(ids)s) GROUP BY v.id;
+    """,
+]
+
+
+def refresh_maintenance_rollups(cur, batch_size=ANALYTICS_REFRESH_BATCH):
+    """
+    Brings the rollups up to date for one batch of queued vehicles and
+    returns how many were refreshed (0 when the queue is empty or another
+    refresh is running). Commit after each call; repeat until it returns 0.
+    """
+    cur.execute("SELECT pg_try_advisory_xact_lock(%s, 0);", (ANALYTICS_LOCK_NAMESPACE,))
+    if not cur.fetchone()[0]:
+        return 0
+    # Locked in vehicle order, the order in which the triggers queue them
+    cur.execute("SELECT vehicle_id FROM maintenance_rollup_queue ORDER BY vehicle_id LIMIT %s FOR UPDATE;",
+                (batch_size,))
+    vehicle_ids = [row[0] for row in cur.fetchall()]
+    if not vehicle_ids:
+        return 0
+    cur.execute("DELETE FROM maintenance_rollup_queue WHERE vehicle_id = ANY(%s);", (vehicle_ids,))
+    cur.execute(SUBTRACT_VEHICLE_FACTS, (vehicle_ids,))
+    cur.execute(ADD_VEHICLE_FACTS, (vehicle_ids,))
+    for statement in REPLACE_VEHICLE_SUMMARIES:
+        cur.execute(statement, {"ids": vehicle_ids})
+    cur.execute("""
+        INSERT INTO analytics_refreshes (id, refreshed_at) VALUES (TRUE, CURRENT_TIMESTAMP)
+        ON CONFLICT (id) DO UPDATE SET refreshed_at = EXCLUDED.refreshed_at;
+    """)
+    return len(vehicle_ids)
+
+
+def rebuild_maintenance_rollups(cur):
+    """Empties the rollups and queues every vehicle, so the following refreshes recompute everything."""
+    cur.execute("SELECT pg_advisory_xact_lock(%s, 0);", (ANALYTICS_LOCK_NAMESPACE,))
+    cur.execute("TRUNCATE maintenance_rollups, maintenance_vehicle_facts, maintenance_vehicle_summaries;")
+    cur.execute("INSERT INTO maintenance_rollup_queue (vehicle_id) SELECT id FROM vehicles "
+                "ON CONFLICT (vehicle_id) DO NOTHING;")
+
+
+# --- Reports ---
+
+GROUP_COLUMNS = ['category', 'make', 'month', 'log_type']
+DEFAULT_GROUP_BY = ['category', 'month']
+FILTER_COLUMNS = ['category', 'make', 'log_type']
+
+
+def parse_month(value, name):
+    """Parses a YYYY-MM (or YYYY-MM-DD) parameter to the first day of its month."""
+    try:
+        return date.fromisoformat(value + '-01' if len(value) == 7 else value).replace(day=1)
+    except ValueError:
+        raise ValueError(f"{name} must be a month (YYYY-MM)")
+
+
+def parse_report_args(args):
+    """
+    Validates the maintenance report query parameters. Raises ValueError
+    with a message suitable for a 400 response.
+    """
+    group_by = [column.strip() for column in args.get('group_by', ','.join(DEFAULT_GROUP_BY)).split(',')
+                if column.strip()]
+    unknown = [column for column in group_by if column not in GROUP_COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown group_by '{unknown[0]}'. Use any of: {', '.join(GROUP_COLUMNS)}")
+
+    vehicle_id = None
+    if args.get('vehicle_id'):
+        try:
+            vehicle_id = int(args['vehicle_id'])
+        except ValueError:
+            raise ValueError("vehicle_id must be an integer")
+
+    return {
+        "group_by": list(dict.fromkeys(group_by)),
+        "filters": {column: args[column] for column in FILTER_COLUMNS if args.get(column)},
+        "from_month": parse_month(args['from'], 'from') if args.get('from') else None,
+        "to_month": parse_month(args['to'], 'to') if args.get('to') else None,
+        "vehicle_id": vehicle_id,
+    }
+
+
+def build_report_query(report):
+    """
+    Returns (sql, params) grouping the rollups (or, for one vehicle, its
+    facts) by report['group_by'].
+    """
+    conditions = []
+    params = []
+    table = "maintenance_rollups"
+    if report['vehicle_id'] is not None:
+        table = "maintenance_vehicle_facts"
+        conditions.append("vehicle_id = %s")
+        params.append(report['vehicle_id'])
+    for column, value in report['filters'].items():
+        conditions.append(f"{column} = %s")
+        params.append(value)
+    if report['from_month']:
+        conditions.append("month >= %s")
+        params.append(report['from_month'])
+    if report['to_month']:
+        conditions.append("month <= %s")
+        params.append(report['to_month'])
+
+    columns = report['group_by']
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    if columns:
+        query = f"""
+            SELECT {', '.join(columns)}, SUM(events), SUM(gap_days_sum), SUM(gap_count)
+            FROM {table} {where}
+            GROUP BY {', '.join(columns)} HAVING SUM(events) > 0 ORDER BY {', '.join(columns)};
+        """
+    else:
+        query = f"""
+            SELECT SUM(events), SUM(gap_days_sum), SUM(gap_count)
+            FROM {table} {where} HAVING SUM(events) > 0;
+        """
+    return query, params
+
+
+def fetch_maintenance_report(cur, report):
+    """Returns the report rows: the group columns, events and mean_days_between_services."""
+    cur.execute(*build_report_query(report))
+    rows = []
+    for row in cur.fetchall():
+        *keys, events, gap_days_sum, gap_count = row
+        entry = dict(zip(report['group_by'], keys))
+        if 'month' in entry:
+            entry['month'] = entry['month'].strftime('%Y-%m')
+        entry['events'] = int(events)
+        entry['mean_days_between_services'] = round(gap_days_sum / gap_count, 1) if gap_count else None
+        rows.append(entry)
+    return rows
+
+
+def fetch_service_gaps(cur, days, filters, limit, today=None):
+    """
+    Vehicles with no maintenance in the last `days` days (including those
+    never serviced): counts per category and make, and the `limit` vehicles
+    serviced longest ago.
+    """
+    cutoff = (today or date.today()) - timedelta(days=days)
+    conditions = ["(last_service_on IS NULL OR last_service_on < %s)"]
+    params = [cutoff]
+    for column in ('category', 'make'):
+        if filters.get(column):
+            conditions.append(f"{column} = %s")
+            params.append(filters[column])
+    where = ' AND '.join(conditions)
+
+    cur.execute(f"""
+        SELECT category, make, COUNT(*), COUNT(*) FILTER (WHERE last_service_on IS NULL)
+        FROM maintenance_vehicle_summaries WHERE {where}
+        GROUP BY category, make ORDER BY category, make;
+    """, params)
+    groups = [{"category": category, "make": make, "vehicles": vehicles, "never_serviced": never}
+              for category, make, vehicles, never in cur.fetchall()]
+
+    cur.execute(f"""
+        SELECT vehicle_id, category, make, events, last_service_on FROM maintenance_vehicle_summaries
+        WHERE {where} ORDER BY last_service_on NULLS FIRST, vehicle_id LIMIT %s;
+    """, params + [limit])
+    vehicles = [{
+        "vehicle_id": vehicle_id,
+        "category": category,
+        "make": make,
+        "events": events,
+        "last_service_on": last_service_on.isoformat() if last_service_on else None,
+    } for vehicle_id, category, make, events, last_service_on in cur.fetchall()]
+    return {"cutoff": cutoff.isoformat(), "groups": groups, "vehicles": vehicles}
+
+
+def fetch_refresh_state(cur):
+    """How current the rollups are: vehicles still queued and when the last refresh committed."""
+    cur.execute("""
+        SELECT (SELECT COUNT(*) FROM maintenance_rollup_queue),
+               (SELECT MIN(queued_at) FROM maintenance_rollup_queue),
+               (SELECT refreshed_at FROM analytics_refreshes);
+    """)
+    pending, oldest_queued_at, refreshed_at = cur.fetchone()
+    return {
+        "pending_vehicles": pending,
+        "oldest_pending_since": oldest_queued_at.isoformat() if oldest_queued_at else None,
+        "refreshed_at": refreshed_at.isoformat() if refreshed_at else None,
+    }
@@ -0,0 +1,635 @@
+# asgi.py
+"""
+Asynchronous (ASGI) serving mode.
+
+    uvicorn asgi:app --workers 4
+
+Serves the same routes and JSON as app.py. The read paths that are hit
+hardest or held open longest run natively on the event loop with
+non-blocking database access (async_db.py):
+
+    GET /api/cars (all vehicles or one page)
+    GET /api/vehicles/search
+    GET /api/vehicles/<id>/details
+    GET /api/vehicles/details (batch)
+    GET /api/documents/<id>/content
+    GET /api/vehicles/<id>/image/<rendition>
+    GET /api/events
+
+A worker waiting for Postgres, or for a slow client to accept the next
+chunk of a document, costs a coroutine instead of a thread, so one process
+serves many such clients at once. Every other route (all writes, uploads,
+pages and static files) is handed to the Flask app on a bounded thread
+pool, so there is one implementation of each write path. Routing uses the
+Flask URL map, so both modes always expose the same URLs.
+
+Non-blocking database access uses psycopg2's asynchronous connection mode
+(async_db.py) rather than a separate async driver such as asyncpg: rows
+come back with the same type conversions as in the Flask routes, so both
+modes share one serialization path and no second driver is installed.
+Writes deliberately stay on Flask's synchronous transaction code; they are
+short and rare next to the reads, and keeping one implementation of each
+write avoids two copies of the alert, revision and event bookkeeping.
+"""
+import io
+import os
+import sys
+import queue
+import asyncio
+import threading
+import traceback
+from collections import deque
+from datetime import date
+from concurrent.futures import ThreadPoolExecutor
+
+import psycopg2.extras
+from werkzeug.exceptions import HTTPException
+from werkzeug.wrappers import Request, Response
+
+from app import (app as flask_app, VEHICLE_MAINTENANCE_QUERY, VEHICLE_DOCUMENTS_QUERY,
+                 VEHICLE_IMAGE_QUERY, DOCUMENT_CONTENT_QUERY, READ_YOUR_WRITES_COOKIE, vehicle_details_query,
+                 build_vehicle_details, vehicle_list_payload, serialize_vehicle_list, parse_vehicle_ids, batch_details_queries,
+                 build_vehicle_details_batch, mark_pool_exhausted)
+from alerts import (VEHICLE_LIST_COLUMNS, ROLLOVER_STATE_QUERY, serialize_vehicle_summary, rolled_over_today,
+                    ensure_alerts_current, fleet_alerts_query, order_fleet_alerts)
+from async_db import get_async_pool, read_cursor, close_async_pool, async_pool_stats
+from db import PoolTimeout, transaction, use_primary_for_reads, set_pool_timed_out
+from events import EVENT_QUEUE_SIZE, EVENT_KEEPALIVE_SECONDS, format_event, get_broker
+from images import ORIGINAL, RENDITIONS, IMAGE_URLS_QUERY, image_urls_from_rows
+from listing import SORT_ORDERS, is_paginated_request, parse_listing_args, build_listing_query, split_page
+from fieldsets import (LIST_FIELDS, LIST_INCLUDES, DETAIL_FIELDS, DETAIL_INCLUDES, parse_fieldset, includes,
+                       wants_images, list_columns)
+from search import parse_search_args, build_search_query
+from metrics import GAUGE_SOURCES, start_request, finish_request
+from revisions import fleet_etag, vehicle_etag, validators_match, with_validators
+from serialization import dumps, fetch_dicts
+from compression import compress_json_response
+from storage import DatabaseDocumentStore, get_store_for
+from streaming import blob_headers, plan_blob_response
+
+# --- ASGI Configuration ---
+ASGI_WSGI_THREADS = int(os.environ.get("ASGI_WSGI_THREADS", 20))  # Threads running delegated Flask routes
+BODY_BUFFER_SIZE = 64 * 1024
+
+_wsgi_executor = ThreadPoolExecutor(max_workers=ASGI_WSGI_THREADS, thread_name_prefix="asgi-wsgi")
+
+
+class Delegate(Exception):
+    """Raised by a native handler to let the Flask route answer instead (e.g. legacy base64 content)."""
+
+
+# --- Requests and responses ---
+
+def build_environ(scope, body):
+    """Translates an ASGI HTTP scope into a WSGI environ."""
+    server_name, server_port = scope.get('server') or ("localhost", 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server_name,
+        'SERVER_PORT': str(server_port),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': (scope.get('client') or ("", 0))[0],
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for raw_name, raw_value in scope.get('headers', []):
+        name = raw_name.decode('latin-1').upper().replace('-', '_')
+        value = raw_value.decode('latin-1')
+        if name == 'CONTENT_TYPE' or name == 'CONTENT_LENGTH':
+            environ[name] = value
+            continue
+        key = f"HTTP_{name}"
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    if 'CONTENT_LENGTH' not in environ:
+        environ['wsgi.input_terminated'] = True  # Chunked request body: read until EOF
+    return environ
+
+
+def encode_headers(headers):
+    return [(name.lower().encode('latin-1'), str(value).encode('latin-1')) for name, value in headers]
+
+
+async def send_response(send, response, request=None):
+    """
+    Sends a (non-streamed) werkzeug Response. Given the request, a large JSON
+    body is compressed as app.compress_json() does for the Flask routes.
+    """
+    mark_pool_exhausted(response)
+    if request is not None:
+        # Compressing the full listing takes tens of milliseconds: keep it off the event loop
+        await asyncio.get_running_loop().run_in_executor(None, compress_json_response, response,
+                                                         request.accept_encodings)
+    body = b"" if response.status_code in (204, 304) else response.get_data()
+    if response.status_code not in (204, 304):
+        response.headers["Content-Length"] = str(len(body))
+    await send({'type': 'http.response.start', 'status': response.status_code,
+                'headers': encode_headers(response.headers.items())})
+    await send({'type': 'http.response.body', 'body': body})
+    return len(body)
+
+
+def json_error(status, error, details=None):
+    """The {"error", "details"} body of the Flask routes, byte for byte (jsonify() ends with a newline)."""
+    payload = {"error": error} if details is None else {"error": error, "details": details}
+    return Response(dumps(payload) + b"\n", status=status, mimetype="application/json")
+
+
+class RequestBody(io.RawIOBase):
+    """wsgi.input for a delegated request: reads the ASGI body messages from the worker thread."""
+
+    def __init__(self, receive, loop):
+        self.receive = receive
+        self.loop = loop
+        self.buffer = memoryview(b"")
+        self.more_body = True
+
+    def readable(self):
+        return True
+
+    def readinto(self, target):
+        while not self.buffer and self.more_body:
+            message = asyncio.run_coroutine_threadsafe(self.receive(), self.loop).result()
+            if message['type'] == 'http.disconnect':
+                raise ConnectionResetError("Client disconnected while sending the request body")
+            self.buffer = memoryview(message.get('body', b""))
+            self.more_body = message.get('more_body', False)
+        count = min(len(target), len(self.buffer))
+        target[:count] = self.buffer[:count]
+        self.buffer = self.buffer[count:]
+        return count
+
+
+def run_wsgi(environ, send_sync):
+    """Runs the Flask app for one request on a worker thread, forwarding its response to the event loop."""
+    started = []
+
+    def start_response(status, headers, exc_info=None):
+        if exc_info and started:
+            raise exc_info[1].with_traceback(exc_info[2])
+        started[:] = [(int(status.split(' ', 1)[0]), headers)]
+        return write
+
+    def begin():
+        if started and started[0] is not None:
+            status, headers = started[0]
+            send_sync({'type': 'http.response.start', 'status': status, 'headers': encode_headers(headers)})
+            started.append(None)  # Marks the start message as sent
+
+    def write(data):
+        if len(started) == 1:
+            begin()
+        if data:
+            send_sync({'type': 'http.response.body', 'body': bytes(data), 'more_body': True})
+
+    iterable = flask_app.wsgi_app(environ, start_response)
+    try:
+        for chunk in iterable:
+            write(chunk)
+        if len(started) == 1:
+            begin()
+        send_sync({'type': 'http.response.body', 'body': b"", 'more_body': False})
+    finally:
+        close = getattr(iterable, 'close', None)
+        if close is not None:
+            close()
+
+
+async def delegate_to_flask(scope, receive, send):
+    loop = asyncio.get_running_loop()
+    body = io.BufferedReader(RequestBody(receive, loop), buffer_size=BODY_BUFFER_SIZE)
+    environ = build_environ(scope, body)
+
+    def send_sync(message):
+        asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+    await loop.run_in_executor(_wsgi_executor, run_wsgi, environ, send_sync)
+
+
+# --- Native routes ---
+
+async def alerts_current(cur):
+    """
+    ensure_alerts_current() for the event loop. Returns the number of
+    vehicles re-evaluated; the once-a-day rollover itself is a write and runs
+    on the synchronous pool in a thread.
+    """
+    await cur.execute(ROLLOVER_STATE_QUERY)
+    if rolled_over_today(cur.fetchone(), date.today()):
+        return 0
+
+    def rollover():
+        with transaction() as sync_cur:
+            return ensure_alerts_current(sync_cur)
+
+    return await asyncio.get_running_loop().run_in_executor(None, rollover)
+
+
+async def get_vehicles(request, send):
+    """Native GET /api/cars: same responses as app.get_vehicles() / get_vehicles_page()."""
+    paginated = is_paginated_request(request.args)
+    listing = None
+    try:
+        fieldset = parse_fieldset(request.args, LIST_FIELDS, LIST_INCLUDES)
+        if paginated:
+            listing = parse_listing_args(request.args)
+    except ValueError as e:
+        return await send_response(send, json_error(400, str(e)))
+
+    query_string = request.query_string
+    try:
+        # Rows as DictRows: split_page() reads the sort key of the last row by name
+        async with read_cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
+            await cur.execute("SELECT revision, changed_at FROM fleet_revisions;")
+            row = cur.fetchone()
+            revision, changed_at = (row[0], row[1]) if row else (0, None)
+            etag = fleet_etag(revision, query_string=query_string)
+            if request.if_none_match and validators_match(request.if_none_match, None, etag):
+                return await send_response(send, with_validators(Response(status=304), etag, changed_at,
+                                                                 request.accept_encodings))
+
+            rolled_over = await alerts_current(cur)
+            if not rolled_over and validators_match(request.if_none_match, request.if_modified_since, etag,
+                                                    changed_at):
+                return await send_response(send, with_validators(Response(status=304), etag, changed_at,
+                                                                 request.accept_encodings))
+
+            if paginated:
+                columns = list_columns(fieldset, VEHICLE_LIST_COLUMNS, SORT_ORDERS[listing['sort']][0])
+                await cur.execute(*build_listing_query(listing, columns))
+                rows, next_cursor = split_page(cur.fetchall(), listing)
+            else:
+                await cur.execute(f"SELECT {list_columns(fieldset, VEHICLE_LIST_COLUMNS)} FROM vehicles "
+                                  "ORDER BY created_at DESC;")
+                rows = cur.fetchall()
+                next_cursor = None
+            vehicles_list = serialize_vehicle_list(rows, fieldset)
+            alerts = None
+            if includes(fieldset, 'alerts'):
+                alerts_query = fleet_alerts_query(vehicles_list, all_vehicles=not paginated)
+                alert_rows = []
+                if alerts_query is not None:
+                    await cur.execute(*alerts_query)
+                    alert_rows = cur.fetchall()
+                alerts = order_fleet_alerts(alert_rows, vehicles_list)
+    except Exception as e:
+        print(f"Error fetching vehicles and alerts: {e}")
+        return await send_response(send, json_error(500, "Failed to fetch data", str(e)))
+
+    payload = vehicle_list_payload(vehicles_list, alerts, paginated, next_cursor)
+    response = Response(dumps(payload), mimetype="application/json")
+    return await send_response(send, with_validators(response, etag, changed_at, request.accept_encodings), request)
+
+
+async def search_vehicles(request, send):
+    """Native GET /api/vehicles/search: same responses as app.search_vehicles()."""
+    try:
+        text, limit = parse_search_args(request.args)
+    except ValueError as e:
+        return await send_response(send, json_error(400, str(e)))
+    search_query = build_search_query(text, limit)
+    vehicles_list = []
+    if search_query is not None:
+        try:
+            async with read_cursor() as cur:
+                await cur.execute(*search_query)
+                vehicles_list = [serialize_vehicle_summary(vehicle) for vehicle in cur.fetchall()]
+        except Exception as e:
+            print(f"Error searching vehicles: {e}")
+            return await send_response(send, json_error(500, "Failed to search vehicles", str(e)))
+    response = Response(dumps({"query": text, "vehicles": vehicles_list}), mimetype="application/json")
+    return await send_response(send, response, request)
+
+
+async def get_vehicle_details(request, send, vehicle_id):
+    """Native GET /api/vehicles/<id>/details: same responses as app.get_vehicle_details()."""
+    try:
+        fieldset = parse_fieldset(request.args, DETAIL_FIELDS, DETAIL_INCLUDES)
+    except ValueError as e:
+        return await send_response(send, json_error(400, str(e)))
+    try:
+        async with read_cursor() as cur:
+            await cur.execute("SELECT revision, changed_at FROM vehicle_revisions WHERE vehicle_id = %s;",
+                              (vehicle_id,))
+            vehicle_revision = cur.fetchone()
+            if vehicle_revision is not None:
+                etag = vehicle_etag(vehicle_id, vehicle_revision[0], query_string=request.query_string)
+                changed_at = vehicle_revision[1]
+                if validators_match(request.if_none_match, request.if_modified_since, etag, changed_at):
+                    return await send_response(send, with_validators(Response(status=304), etag, changed_at,
+                                                                     request.accept_encodings))
+
+            await cur.execute(vehicle_details_query(fieldset), (vehicle_id,))
+            vehicles = fetch_dicts(cur)
+            if not vehicles:
+                return await send_response(send, json_error(404, "Vehicle not found"))
+            image_urls = maintenance_logs = documents = None
+            if wants_images(fieldset):
+                await cur.execute(IMAGE_URLS_QUERY, (vehicle_id,))
+                image_urls = image_urls_from_rows(vehicle_id, cur.fetchall())
+            if includes(fieldset, 'maintenance_logs'):
+                await cur.execute(VEHICLE_MAINTENANCE_QUERY, (vehicle_id,))
+                maintenance_logs = fetch_dicts(cur)
+            if includes(fieldset, 'documents'):
+                await cur.execute(VEHICLE_DOCUMENTS_QUERY, (vehicle_id,))
+                documents = fetch_dicts(cur)
+            vehicle_dict = build_vehicle_details(vehicles[0], image_urls, maintenance_logs, documents, fieldset)
+    except Exception as e:
+        print(f"Error fetching vehicle details for ID {vehicle_id}: {e}")
+        return await send_response(send, json_error(500, "Failed to fetch vehicle details", str(e)))
+
+    response = Response(dumps(vehicle_dict), mimetype="application/json")
+    if vehicle_revision is not None:
+        with_validators(response, etag, changed_at, request.accept_encodings)
+    return await send_response(send, response, request)
+
+
+async def get_vehicle_details_batch(request, send):
+    """Native GET /api/vehicles/details: same responses as app.get_vehicle_details_batch()."""
+    try:
+        vehicle_ids = parse_vehicle_ids(request.args)
+        fieldset = parse_fieldset(request.args, DETAIL_FIELDS, DETAIL_INCLUDES)
+    except ValueError as e:
+        return await send_response(send, json_error(400, str(e)))
+    try:
+        async with read_cursor() as cur:
+            results = []
+            for query in batch_details_queries(fieldset):
+                rows = None
+                if query is not None:
+                    await cur.execute(query, (vehicle_ids,))
+                    rows = fetch_dicts(cur)
+                results.append(rows)
+        body = build_vehicle_details_batch(vehicle_ids, *results, fieldset)
+    except Exception as e:
+        print(f"Error fetching details for vehicles {vehicle_ids}: {e}")
+        return await send_response(send, json_error(500, "Failed to fetch vehicle details", str(e)))
+    return await send_response(send, Response(dumps(body), mimetype="application/json"), request)
+
+
+async def stream_blob(request, send, sha256, size, storage, mimetype, filename=None, attachment=False,
+                      cache_control="private, no-cache"):
+    """Native blob_response(): reads the blob chunk by chunk while the client consumes it."""
+    headers = blob_headers(sha256, filename, attachment, cache_control)
+    status, start, stop = plan_blob_response(headers, size, sha256, request.if_none_match, request.range,
+                                             request.if_range)
+    if status in (304, 416):
+        return await send_response(send, Response(status=status, headers=headers))
+
+    response = Response(status=status, headers=headers, mimetype=mimetype)
+    await send({'type': 'http.response.start', 'status': status, 'headers': encode_headers(response.headers.items())})
+    sent = 0
+    store = get_store_for(storage)
+    if stop > start and isinstance(store, DatabaseDocumentStore):
+        for seq, chunk_start in store.chunks_in_range(start, stop):
+            # A connection is held per chunk only, never while waiting for the client
+            async with read_cursor() as cur:
+                await cur.execute(store.CHUNK_QUERY, (sha256, seq))
+                row = cur.fetchone()
+                on_replica = cur.on_replica
+            if row is None and on_replica:
+                # As in DatabaseDocumentStore.iter_range(): a lagging replica may not have the blob yet
+                async with get_async_pool().cursor() as cur:
+                    await cur.execute(store.CHUNK_QUERY, (sha256, seq))
+                    row = cur.fetchone()
+            chunk = store.slice_chunk(sha256, seq, chunk_start, row, start, stop)
+            await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            sent += len(chunk)
+    elif stop > start:
+        # File reads are blocking; each chunk is read on a thread
+        loop = asyncio.get_running_loop()
+        chunks = store.iter_range(sha256, start, stop)
+        try:
+            while True:
+                chunk = await loop.run_in_executor(None, next, chunks, None)
+                if chunk is None:
+                    break
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+                sent += len(chunk)
+        finally:
+            chunks.close()
+    await send({'type': 'http.response.body', 'body': b""})
+    return sent
+
+
+async def download_document(request, send, document_id):
+    """Native GET /api/documents/<id>/content; documents still stored as base64 are served by Flask."""
+    try:
+        async with read_cursor() as cur:
+            await cur.execute(DOCUMENT_CONTENT_QUERY, (document_id,))
+            doc_item = cur.fetchone()
+    except Exception as e:
+        print(f"Error downloading document {document_id}: {e}")
+        return await send_response(send, json_error(500, "Failed to download document", str(e)))
+    if not doc_item:
+        return await send_response(send, json_error(404, "Document not found"))
+    document_name, mime_type, content_sha256, storage, size = doc_item
+    if not storage:
+        raise Delegate()
+    return await stream_blob(request, send, content_sha256, size, storage, mime_type, filename=document_name,
+                             attachment=request.args.get('download') == '1')
+
+
+async def get_vehicle_image(request, send, vehicle_id, rendition):
+    """Native GET /api/vehicles/<id>/image/<rendition>; legacy inline images are served by Flask."""
+    if rendition not in (ORIGINAL, *RENDITIONS):
+        return await send_response(send, json_error(404, "Unknown image rendition"))
+    try:
+        async with read_cursor() as cur:
+            await cur.execute(VEHICLE_IMAGE_QUERY, (vehicle_id, rendition))
+            image = cur.fetchone()
+    except Exception as e:
+        print(f"Error fetching image for vehicle {vehicle_id}: {e}")
+        return await send_response(send, json_error(500, "Failed to fetch vehicle image", str(e)))
+    if image is None:
+        raise Delegate()
+    content_sha256, mime_type, size, storage = image
+    version = request.args.get('v')
+    if version and content_sha256.startswith(version):
+        cache_control = "public, max-age=31536000, immutable"
+    else:
+        cache_control = "public, no-cache"
+    return await stream_blob(request, send, content_sha256, size, storage, mime_type, cache_control=cache_control)
+
+
+class AsyncSubscriber:
+    """
+    Event queue for EventBroker that a coroutine can wait on. put_nowait() is
+    called from the broker's listener thread and wakes the event loop.
+    """
+
+    def __init__(self, loop, maxsize=EVENT_QUEUE_SIZE):
+        self.loop = loop
+        self.maxsize = maxsize
+        self._events = deque()
+        self._lock = threading.Lock()
+        self._ready = asyncio.Event()
+
+    def put_nowait(self, event):
+        with self._lock:
+            if len(self._events) >= self.maxsize:
+                raise queue.Full
+            self._events.append(event)
+        try:
+            self.loop.call_soon_threadsafe(self._ready.set)
+        except RuntimeError:
+            pass  # The loop has shut down; the stream is gone
+
+    def get_nowait(self):
+        with self._lock:
+            if not self._events:
+                raise queue.Empty
+            return self._events.popleft()
+
+    async def get(self, timeout):
+        """Returns the next event; raises asyncio.TimeoutError after `timeout` idle seconds."""
+        while True:
+            try:
+                return self.get_nowait()
+            except queue.Empty:
+                pass
+            self._ready.clear()
+            try:
+                return self.get_nowait()  # Put between the first check and clear()
+            except queue.Empty:
+                pass
+            await asyncio.wait_for(self._ready.wait(), timeout)
+
+
+async def fleet_events(request, send):
+    """Native GET /api/events: one coroutine per connected dashboard instead of one thread."""
+    try:
+        last_event_id = int(request.headers['Last-Event-ID'])
+    except (KeyError, ValueError):
+        last_event_id = None
+    broker = get_broker()
+    subscriber, backlog = broker.subscribe(last_event_id, AsyncSubscriber(asyncio.get_running_loop()))
+    try:
+        response = Response(mimetype='text/event-stream', headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+        })
+        await send({'type': 'http.response.start', 'status': 200,
+                    'headers': encode_headers(response.headers.items())})
+        messages = ["retry: 3000\n\n", *(format_event(event) for event in backlog)]
+        while True:
+            for message in messages:
+                await send({'type': 'http.response.body', 'body': message.encode('utf-8'), 'more_body': True})
+            try:
+                messages = [format_event(await subscriber.get(EVENT_KEEPALIVE_SECONDS))]
+            except asyncio.TimeoutError:
+                messages = [": keepalive\n\n"]
+    finally:
+        # The stream only ends when the client disconnects (the task is cancelled)
+        broker.unsubscribe(subscriber)
+
+
+# Flask endpoint -> native handler
+NATIVE_ROUTES = {
+    'get_vehicles': get_vehicles,
+    'search_vehicles': search_vehicles,
+    'get_vehicle_details': get_vehicle_details,
+    'get_vehicle_details_batch': get_vehicle_details_batch,
+    'download_document': download_document,
+    'get_vehicle_image': get_vehicle_image,
+    'fleet_events': fleet_events,
+}
+
+
+async def wait_for_disconnect(receive):
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return
+
+
+async def serve_native(handler, rule, view_args, scope, receive, send):
+    """Runs a native handler, cancelling it (and its queries) if the client disconnects."""
+    request = Request(build_environ(scope, io.BytesIO()))
+    state = start_request(scope['method'], rule.rule)
+    # Inherited by the handler task (writes are served by Flask, which sets the cookie)
+    use_primary_for_reads(request.cookies.get(READ_YOUR_WRITES_COOKIE) == "1")
+    set_pool_timed_out(False)
+    started = []
+
+    async def tracked_send(message):
+        if message['type'] == 'http.response.start':
+            state.status = message['status']
+            started.append(True)
+        await send(message)
+
+    handler_task = asyncio.ensure_future(handler(request, tracked_send, **view_args))
+    disconnect_task = asyncio.ensure_future(wait_for_disconnect(receive))
+    tasks = {handler_task, disconnect_task}
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.wait(tasks)
+    try:
+        state.response_bytes = handler_task.result() or 0
+    except asyncio.CancelledError:
+        pass  # The client went away
+    except Delegate:
+        return await delegate_to_flask(scope, receive, send)
+    except Exception as e:
+        traceback.print_exc()
+        if not started:
+            # The handler task's context is not ours; mark_pool_exhausted() needs to know here too
+            if isinstance(e, PoolTimeout):
+                set_pool_timed_out(True)
+            await send_response(tracked_send, json_error(500, "Internal Server Error", str(e)))
+    finally:
+        finish_request(state)
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            close_async_pool()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send):
+    """The ASGI application."""
+    if scope['type'] == 'lifespan':
+        return await lifespan(receive, send)
+    if scope['type'] != 'http':
+        return
+
+    adapter = flask_app.url_map.bind_to_environ(build_environ(scope, io.BytesIO()))
+    try:
+        rule, view_args = adapter.match(return_rule=True)
+    except HTTPException:
+        rule = None  # Flask answers 404/405 (and redirects) itself
+    handler = NATIVE_ROUTES.get(rule.endpoint) if rule is not None else None
+    if handler is None:
+        return await delegate_to_flask(scope, receive, send)
+    return await serve_native(handler, rule, view_args, scope, receive, send)
+
+
+def async_pool_gauges():
+    """Async pool gauges for /metrics (the event loop's pool; empty before the first native request)."""
+    gauges = []
+    for stats in async_pool_stats():
+        gauges.extend([
+            ("async_db_pool_size", "Open async connections.", stats['size']),
+            ("async_db_pool_in_use", "Async connections checked out.", stats['in_use']),
+            ("async_db_pool_waiting", "Native requests waiting for an async connection.", stats['waiting']),
+        ])
+    return gauges
+
+
+GAUGE_SOURCES.append(async_pool_gauges)
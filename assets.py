@@ -0,0 +1,101 @@
+# assets.py
+"""
+Static asset serving with content versions and precompressed variants.
+
+Templates link assets with url_for('static', filename=...), which app.py
+extends with ?v=<content hash>, like the image URLs of images.py. A
+request carrying the current hash may be cached forever (immutable); one
+without it, or with an outdated hash, revalidates against the ETag. A new
+deploy changes the hash, so pages pick up new assets straight away.
+
+Each file is read, hashed and compressed at the highest gzip (and brotli)
+level once per process, the first time it is linked or requested, and
+again only if its modification time changes.
+"""
+import os
+import hashlib
+import mimetypes
+import threading
+
+from compression import ENCODINGS, COMPRESSIBLE_TYPES, compress, encoded_etag, negotiate_encoding
+
+# Resolved like the requested paths below, so a symlinked deploy directory (e.g. releases/current) still matches
+STATIC_DIR = os.path.realpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static'))
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "public, no-cache"
+
+_assets = {}
+_assets_lock = threading.Lock()
+
+
+class Asset:
+    """One static file: its content hash and its body in every encoding worth sending."""
+
+    def __init__(self, path, mtime, content):
+        self.path = path
+        self.mtime = mtime
+        self.sha256 = hashlib.sha256(content).hexdigest()
+        self.version = self.sha256[:16]
+        mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        self.mimetype = mimetype
+        self.bodies = {None: content}
+        if mimetype in COMPRESSIBLE_TYPES:
+            for encoding in ENCODINGS:
+                compressed = compress(content, encoding)
+                if len(compressed) < len(content):
+                    self.bodies[encoding] = compressed
+
+    def etag(self, encoding):
+        return encoded_etag(self.version, encoding)
+
+
+def resolve_static_path(filename):
+    """Maps a URL path onto a file under STATIC_DIR, or None if it is outside it or missing."""
+    path = os.path.realpath(os.path.join(STATIC_DIR, filename))
+    if not path.startswith(STATIC_DIR + os.sep) or not os.path.isfile(path):
+        return None
+    return path
+
+
+def get_asset(filename):
+    """Returns the loaded Asset for a static path (reloaded if the file changed), or None."""
+    path = resolve_static_path(filename)
+    if path is None:
+        return None
+    mtime = os.stat(path).st_mtime_ns
+    asset = _assets.get(path)
+    if asset is not None and asset.mtime == mtime:
+        return asset
+    with _assets_lock:
+        asset = _assets.get(path)
+        if asset is None or asset.mtime != mtime:
+            with open(path, 'rb') as f:
+                asset = Asset(path, mtime, f.read())
+            _assets[path] = asset
+    return asset
+
+
+def asset_version(filename):
+    """The ?v= value for a static path, or None if there is no such file."""
+    asset = get_asset(filename)
+    return asset.version if asset is not None else None
+
+
+def plan_asset_response(asset, version, accept_encodings, if_none_match):
+    """
+    Chooses how to answer a request for `asset`: returns (status, body, headers).
+    `version` is the request's ?v= value (None if absent).
+    """
+    encoding = negotiate_encoding(accept_encodings, [name for name in ENCODINGS if name in asset.bodies])
+    etag = asset.etag(encoding)
+    headers = {
+        "ETag": f'"{etag}"',
+        "Vary": "Accept-Encoding",
+        "Cache-Control": IMMUTABLE_CACHE_CONTROL if version == asset.version else REVALIDATE_CACHE_CONTROL,
+    }
+    if if_none_match and if_none_match.contains(etag):
+        return 304, b"", headers
+    if encoding is not None:
+        headers["Content-Encoding"] = encoding
+    return 200, asset.bodies[encoding], headers
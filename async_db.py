@@ -0,0 +1,272 @@
+# async_db.py
+"""
+Non-blocking PostgreSQL access for the ASGI server (asgi.py).
+
+Uses psycopg2's asynchronous connections: a query is sent without waiting
+and the event loop is told to wake up when the socket is readable, so one
+process can have many queries in flight while it keeps serving other
+clients. psycopg2 is already a dependency and speaks the same type
+conversions as the synchronous pool in db.py, so rows look exactly like
+the ones the Flask routes see.
+
+Asynchronous connections run every statement in autocommit mode, which
+matches the READ COMMITTED reads of the Flask routes (each statement sees
+the latest committed data). Writes stay on the synchronous code paths.
+read_cursor() routes reads to the replicas exactly like db.read_transaction().
+"""
+import os
+import time
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+
+import psycopg2
+from psycopg2 import extensions
+
+from db import DATABASE_URL, DB_POOL_TIMEOUT, PoolTimeout, get_replica_router, reads_on_primary, set_pool_timed_out
+from metrics import record_query
+
+# --- Async Pool Configuration ---
+ASYNC_DB_POOL_MAX_SIZE = int(os.environ.get("ASYNC_DB_POOL_MAX_SIZE", 20))  # Connections per event loop
+
+
+async def wait_ready(conn):
+    """Waits, without blocking the event loop, until the connection's pending operation has finished."""
+    loop = asyncio.get_running_loop()
+    while True:
+        state = conn.poll()
+        if state == extensions.POLL_OK:
+            return
+        fileno = conn.fileno()
+        ready = loop.create_future()
+
+        def wake():
+            if not ready.done():
+                ready.set_result(None)
+
+        if state == extensions.POLL_READ:
+            loop.add_reader(fileno, wake)
+            try:
+                await ready
+            finally:
+                loop.remove_reader(fileno)
+        elif state == extensions.POLL_WRITE:
+            loop.add_writer(fileno, wake)
+            try:
+                await ready
+            finally:
+                loop.remove_writer(fileno)
+        else:
+            raise psycopg2.OperationalError(f"Unexpected poll() state {state}")
+
+
+class AsyncCursor:
+    """Cursor whose execute() is awaited; rows are then read with the usual fetch methods."""
+
+    def __init__(self, conn, cursor_factory=None):
+        self.connection = conn
+        self.on_replica = False
+        self._cursor = conn.cursor(cursor_factory=cursor_factory)
+
+    async def execute(self, query, vars=None):
+        started = time.perf_counter()
+        try:
+            self._cursor.execute(query, vars)
+            await wait_ready(self.connection)
+        finally:
+            record_query(self._cursor, query, vars, time.perf_counter() - started)
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    def close(self):
+        self._cursor.close()
+
+
+class AsyncConnectionPool:
+    """Pool of asynchronous connections, owned by one event loop."""
+
+    def __init__(self, dsn, max_size=ASYNC_DB_POOL_MAX_SIZE, timeout=DB_POOL_TIMEOUT):
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1")
+        self.dsn = dsn
+        self.max_size = max_size
+        self.timeout = timeout
+        self._idle = []
+        self._waiters = deque()
+        self._size = 0
+        self._in_use = 0
+        self._checkouts = 0
+        self._timeouts = 0
+        self._discarded = 0
+
+    async def _connect(self):
+        conn = psycopg2.connect(self.dsn, async_=True)
+        try:
+            await wait_ready(conn)
+        except BaseException:
+            conn.close()
+            raise
+        return conn
+
+    def _wake_one(self):
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+
+    async def getconn(self):
+        """Checks a connection out, waiting up to the pool timeout for one to be returned."""
+        deadline = time.monotonic() + self.timeout
+        while True:
+            if self._idle:
+                conn = self._idle.pop()
+                if conn.closed:
+                    self._size -= 1
+                    continue
+                break
+            if self._size < self.max_size:
+                self._size += 1
+                try:
+                    conn = await self._connect()
+                except BaseException:
+                    self._size -= 1
+                    self._wake_one()
+                    raise
+                break
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self._timeouts += 1
+                set_pool_timed_out(True)
+                raise PoolTimeout(f"No database connection available within {self.timeout:.1f}s "
+                                  f"(max_size={self.max_size})")
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await asyncio.wait_for(waiter, remaining)
+            except asyncio.TimeoutError:
+                pass
+        self._in_use += 1
+        self._checkouts += 1
+        return conn
+
+    def putconn(self, conn, discard=False):
+        """Returns a connection. One cancelled mid-query (its client went away) is still busy and is closed."""
+        self._in_use -= 1
+        if discard or conn.closed or conn.isexecuting():
+            try:
+                conn.close()
+            except psycopg2.Error:
+                pass
+            self._size -= 1
+            self._discarded += 1
+        else:
+            self._idle.append(conn)
+        self._wake_one()
+
+    @asynccontextmanager
+    async def cursor(self, cursor_factory=None, conn=None):
+        """
+        Borrows a connection (or takes over `conn`, already checked out of this
+        pool) and yields an AsyncCursor on it (autocommit).
+        """
+        if conn is None:
+            conn = await self.getconn()
+        discard = False
+        try:
+            cur = AsyncCursor(conn, cursor_factory)
+            try:
+                yield cur
+            finally:
+                cur.close()
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            discard = True
+            raise
+        finally:
+            self.putconn(conn, discard=discard)
+
+    def closeall(self):
+        idle, self._idle = self._idle, []
+        self._size -= len(idle)
+        for conn in idle:
+            conn.close()
+
+    def stats(self):
+        return {
+            "max_size": self.max_size,
+            "size": self._size,
+            "idle": len(self._idle),
+            "in_use": self._in_use,
+            "waiting": sum(1 for waiter in self._waiters if not waiter.done()),
+            "checkouts": self._checkouts,
+            "timeouts": self._timeouts,
+            "connections_discarded": self._discarded,
+        }
+
+
+# --- Per-loop Pools ---
+_pools = {}  # (event loop, dsn) -> AsyncConnectionPool
+
+
+def get_async_pool(dsn=None):
+    """Returns the running event loop's pool for `dsn` (the primary by default), creating it on first use."""
+    key = (asyncio.get_running_loop(), dsn or DATABASE_URL)
+    pool = _pools.get(key)
+    if pool is None:
+        pool = _pools[key] = AsyncConnectionPool(key[1])
+    return pool
+
+
+@asynccontextmanager
+async def read_cursor(cursor_factory=None):
+    """
+    Yields an AsyncCursor for read-only work on a replica, with the same
+    round-robin, failover and read-your-writes rules as db.read_transaction().
+    The cursor's `on_replica` attribute tells which kind of server it is on.
+    """
+    router = get_replica_router()
+    for dsn in ([] if reads_on_primary() else router.candidates()):
+        pool = get_async_pool(dsn)
+        try:
+            conn = await pool.getconn()
+        except psycopg2.OperationalError as e:
+            print(f"Replica unavailable, trying the next one: {e}")
+            router.mark_down(dsn)
+            continue
+        try:
+            async with pool.cursor(cursor_factory, conn) as cur:
+                cur.on_replica = True
+                yield cur
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            if conn.closed:
+                router.mark_down(dsn)
+            raise
+        return
+    if router.dsns and not reads_on_primary():
+        router.record_primary_fallback()
+    async with get_async_pool().cursor(cursor_factory) as cur:
+        yield cur
+
+
+def async_pool_stats():
+    """Returns the stats() of every pool of every event loop (one loop per ASGI worker)."""
+    return [pool.stats() for pool in list(_pools.values())]
+
+
+def close_async_pool():
+    """Closes the idle connections of the running loop's pools (at shutdown)."""
+    loop = asyncio.get_running_loop()
+    for key in [key for key in _pools if key[0] is loop]:
+        _pools.pop(key).closeall()
@@ -0,0 +1,634 @@
+#!/usr/bin/env python3
+"""
+Endpoint Benchmark Script for Logistics Application
+Drives every route of app.py and reports, per scenario, latency percentiles
+(p50/p95/p99), throughput and peak memory, so that changes can be compared
+run against run.
+
+By default requests go straight to the WSGI app in this process: there is no
+network in the measurement and the harness can trace the Python memory each
+request allocates. --mode asgi drives the ASGI app (asgi.py) the same way, on
+one event loop like a single uvicorn worker, and --mode both runs WSGI then
+ASGI and reports ASGI against WSGI. --url benchmarks a running server instead
+(memory is not reported then). Either way the database is the one DATABASE_URL points at;
+fill it first with generate_fleet.py. Write scenarios only touch vehicles they
+create themselves (VINs starting with BENCH) and delete them at the end.
+
+    python benchmark.py                                  # Every scenario, 200 requests each
+    python benchmark.py --only cars,details --requests 1000 --concurrency 8
+    python benchmark.py --json before.json               # Save the results...
+    python benchmark.py --compare before.json            # ...and compare a later run with them
+    python benchmark.py --mode both --only cars,details,document_full --concurrency 32
+    python benchmark.py --url http://localhost:8000      # Against a running server
+    python benchmark.py --list
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import resource
+import asyncio
+import argparse
+import threading
+import statistics
+import tracemalloc
+import http.client
+from datetime import date, timedelta
+from urllib.parse import quote, urlsplit
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+try:
+    from db import get_db_connection
+    from storage import get_document_store
+    from images import Image
+    from werkzeug.datastructures import Headers
+except ImportError as e:
+    print(f"❌ Import error: {e}")
+    print("Make sure you're running this script from your application directory")
+    sys.exit(1)
+
+BENCH_VIN_PREFIX = "BENCH"
+BENCH_VEHICLES = 10          # Vehicles created for the write scenarios
+DOCUMENT_SIZE = 100 * 1024   # Bytes per uploaded test document
+IMPORT_ROWS = 100            # Rows per bulk import request
+MAINTENANCE_BATCH = 100      # Events per batch ingestion request
+
+
+# --- Clients ---
+
+class WsgiClient:
+    """Calls the Flask app in-process through the Werkzeug test client."""
+
+    def __init__(self):
+        from app import app
+        self.client = app.test_client()
+
+    def request(self, method, path, headers=None, body=None, first_chunk=False):
+        response = self.client.open(path, method=method, headers=headers or {}, data=body, buffered=False)
+        try:
+            chunks = iter(response.response)
+            data = next(chunks, b"") if first_chunk else b"".join(chunks)
+        finally:
+            response.close()
+        return response.status_code, response.headers, data
+
+
+class AsgiClient:
+    """
+    Calls the ASGI app in-process. All clients share one event loop running in
+    a background thread, so concurrent requests are served the way a single
+    ASGI worker would serve them.
+    """
+
+    _loop = None
+    _loop_lock = threading.Lock()
+
+    def __init__(self):
+        from asgi import app
+        self.app = app
+        with AsgiClient._loop_lock:
+            if AsgiClient._loop is None:
+                AsgiClient._loop = asyncio.new_event_loop()
+                threading.Thread(target=AsgiClient._loop.run_forever, daemon=True).start()
+
+    async def call(self, method, path, headers, body, first_chunk):
+        path, _, query = path.partition('?')
+        headers = dict(headers or {})
+        if body:
+            headers['Content-Length'] = len(body)
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': method, 'scheme': 'http',
+            'path': path, 'raw_path': path.encode(), 'query_string': query.encode(), 'root_path': '',
+            'headers': [(name.lower().encode('latin-1'), str(value).encode('latin-1'))
+                        for name, value in headers.items()],
+            'client': ('127.0.0.1', 0), 'server': ('localhost', 80),
+        }
+        pending = [{'type': 'http.request', 'body': body or b"", 'more_body': False}]
+        finished = asyncio.Event()
+        response = {'status': None, 'headers': Headers(), 'chunks': []}
+
+        async def receive():
+            if pending:
+                return pending.pop()
+            await finished.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                response['status'] = message['status']
+                response['headers'] = Headers([(name.decode('latin-1'), value.decode('latin-1'))
+                                               for name, value in message['headers']])
+                return
+            response['chunks'].append(message.get('body', b""))
+            if not message.get('more_body', False) or (first_chunk and message.get('body')):
+                finished.set()
+
+        task = asyncio.ensure_future(self.app(scope, receive, send))
+        await finished.wait()
+        await task  # An endless stream (first_chunk) ends once receive() reports the disconnect
+        return response['status'], response['headers'], b"".join(response['chunks'])
+
+    def request(self, method, path, headers=None, body=None, first_chunk=False):
+        future = asyncio.run_coroutine_threadsafe(self.call(method, path, headers, body, first_chunk), self._loop)
+        return future.result()
+
+
+class HttpClient:
+    """Calls a running server over a keep-alive HTTP connection."""
+
+    def __init__(self, base_url):
+        parts = urlsplit(base_url)
+        self.connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        self.netloc = parts.netloc
+        self.connection = None
+
+    def request(self, method, path, headers=None, body=None, first_chunk=False):
+        if self.connection is None:
+            self.connection = self.connection_class(self.netloc, timeout=60)
+        try:
+            self.connection.request(method, path, body=body, headers=headers or {})
+            response = self.connection.getresponse()
+            data = response.read1(65536) if first_chunk else response.read()
+        except (OSError, http.client.HTTPException):
+            self.connection.close()
+            self.connection = None
+            raise
+        if first_chunk:
+            # The stream never ends; drop the connection instead of reading it
+            self.connection.close()
+            self.connection = None
+        return response.status, dict(response.getheaders()), data
+
+
+# --- Request helpers ---
+
+def json_request(data):
+    return {"Content-Type": "application/json"}, json.dumps(data).encode()
+
+
+def multipart_request(fields, files):
+    """Encodes form fields and {field: (file name, bytes, mime type)} as multipart/form-data."""
+    boundary = uuid.uuid4().hex
+    body = io.BytesIO()
+    for name, value in fields.items():
+        body.write(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    for name, (file_name, content, mime_type) in files.items():
+        body.write(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{file_name}"\r\n'
+                   f'Content-Type: {mime_type}\r\n\r\n'.encode())
+        body.write(content + b"\r\n")
+    body.write(f"--{boundary}--\r\n".encode())
+    return {"Content-Type": f"multipart/form-data; boundary={boundary}"}, body.getvalue()
+
+
+def sample_image():
+    """A 1200x900 JPEG, or None without Pillow."""
+    if Image is None:
+        return None
+    buffer = io.BytesIO()
+    Image.new('RGB', (1200, 900), (90, 120, 160)).save(buffer, format='JPEG', quality=90)
+    return buffer.getvalue()
+
+
+class Context:
+    """Ids sampled from the fleet plus the resources created for the write scenarios."""
+
+    def __init__(self, client, seed):
+        self.client = client
+        self.rng = random.Random(seed)
+        self.run_id = uuid.uuid4().hex[:4].upper()
+        self.counter = 0
+        self.lock = threading.Lock()
+        self.document_content = self.rng.randbytes(DOCUMENT_SIZE)
+        self.image_content = sample_image()
+
+    def next_number(self):
+        with self.lock:
+            self.counter += 1
+            return self.counter
+
+    def new_vin(self):
+        return f"{BENCH_VIN_PREFIX}{self.run_id}{self.next_number():08d}"
+
+    def call(self, method, path, headers=None, body=None, expect=(200, 201)):
+        status, response_headers, data = self.client.request(method, path, headers, body)
+        if status not in expect:
+            raise RuntimeError(f"{method} {path} returned {status}: {data[:200]!r}")
+        return response_headers, json.loads(data) if data else None
+
+    def load_fleet(self):
+        conn = get_db_connection()
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT id FROM vehicles WHERE vin NOT LIKE %s ORDER BY random() LIMIT 500;",
+                        (BENCH_VIN_PREFIX + "%",))
+            self.vehicle_ids = [row[0] for row in cur.fetchall()]
+            cur.execute("SELECT DISTINCT vehicle_id FROM vehicle_images ORDER BY vehicle_id LIMIT 500;")
+            self.image_vehicle_ids = [row[0] for row in cur.fetchall()]
+            cur.execute("""
+                SELECT id FROM vehicle_documents WHERE content_sha256 IS NOT NULL AND file_size >= 65536
+                ORDER BY random() LIMIT 500;
+            """)
+            self.document_ids = [row[0] for row in cur.fetchall()]
+            # Typeahead input: partial plates, VIN endings and partially typed make/model names
+            cur.execute("SELECT plate_number, vin, make, model FROM vehicles WHERE vin NOT LIKE %s "
+                        "ORDER BY random() LIMIT 100;", (BENCH_VIN_PREFIX + "%",))
+            self.search_terms = []
+            for plate_number, vin, make, model in cur.fetchall():
+                self.search_terms += [(plate_number or vin)[:4], vin[-6:], f"{make} {model[:2]}", make[:3]]
+        finally:
+            conn.close()
+        if not self.vehicle_ids:
+            raise RuntimeError("The database has no vehicles; run generate_fleet.py first")
+
+        self.bench_vehicle_ids = [self.new_vehicle() for _ in range(BENCH_VEHICLES)]
+        headers, page = self.call("GET", "/api/cars?limit=50")
+        self.page_cursor = page["next_cursor"]
+        self.fleet_etag = self.call("GET", "/api/cars")[0]["ETag"]
+        self.detail_etags = {vehicle_id: self.call("GET", f"/api/vehicles/{vehicle_id}/details")[0]["ETag"]
+                             for vehicle_id in self.vehicle_ids[:100]}
+
+    def new_vehicle(self):
+        headers, body = json_request({"model": "Bench", "year": 2024, "make": "Bench", "vin": self.new_vin(),
+                                      "color": "White", "category": "van", "plate_number": "BENCH"})
+        return self.call("POST", "/api/register_vehicle", headers, body)[1]["id"]
+
+    def new_document(self, vehicle_id):
+        headers, body = document_upload(self)
+        return self.call("POST", f"/api/vehicles/{vehicle_id}/documents", headers, body)[1]["id"]
+
+    def new_upload(self, vehicle_id):
+        headers, body = json_request({"vehicleId": vehicle_id, "kind": "document", "fileName": "bench.pdf",
+                                      "mimeType": "application/pdf", "size": DOCUMENT_SIZE})
+        return self.call("POST", "/api/uploads", headers, body)[1]["upload_id"]
+
+    def new_maintenance_logs(self, count):
+        events = maintenance_events(self, count)
+        headers, body = json_request({"events": events})
+        return list(self.call("POST", "/api/maintenance_logs/batch", headers, body)[1]["log_ids"].values())
+
+    def cleanup(self):
+        """Deletes every BENCH vehicle and releases the stored content only they referenced."""
+        conn = get_db_connection()
+        try:
+            cur = conn.cursor()
+            cur.execute("""
+                SELECT content_sha256 FROM vehicle_documents d JOIN vehicles v ON v.id = d.vehicle_id
+                WHERE v.vin LIKE %(prefix)s AND content_sha256 IS NOT NULL
+                UNION
+                SELECT content_sha256 FROM vehicle_images i JOIN vehicles v ON v.id = i.vehicle_id
+                WHERE v.vin LIKE %(prefix)s;
+            """, {"prefix": BENCH_VIN_PREFIX + "%"})
+            hashes = sorted(row[0] for row in cur.fetchall())
+            cur.execute("DELETE FROM vehicles WHERE vin LIKE %s;", (BENCH_VIN_PREFIX + "%",))
+            deleted = cur.rowcount
+            store = get_document_store()
+            for sha256 in hashes:
+                store.release(cur, sha256)
+            conn.commit()
+            return deleted
+        finally:
+            conn.close()
+
+
+def document_upload(ctx):
+    expiry = (date.today() + timedelta(days=ctx.rng.randint(-30, 365))).isoformat()
+    return multipart_request({"documentName": "Bench Document", "expiryDate": expiry, "fileMimeType": "application/pdf"},
+                             {"file": ("bench.pdf", ctx.document_content, "application/pdf")})
+
+
+def maintenance_events(ctx, count):
+    return [{"eventKey": f"bench:{ctx.run_id}:{ctx.next_number()}", "vehicleId": ctx.rng.choice(ctx.bench_vehicle_ids),
+             "logType": "Oil Change", "logDate": (date.today() - timedelta(days=ctx.rng.randint(0, 60))).isoformat(),
+             "notes": "Benchmark"} for _ in range(count)]
+
+
+def import_csv(ctx):
+    lines = ["model,year,make,vin,color,category,plate_number"]
+    lines += [f"Bench,2024,Bench,{ctx.new_vin()},White,van,BENCH" for _ in range(IMPORT_ROWS)]
+    return {"Content-Type": "text/csv"}, ("\n".join(lines) + "\n").encode()
+
+
+# --- Scenarios ---
+
+class Scenario:
+    """
+    One benchmarked request shape. build(ctx, i) returns (method, path,
+    headers, body); prepare(ctx, count) creates whatever `count` requests
+    consume (untimed) and returns a list that build() reads as ctx.items.
+    """
+
+    def __init__(self, name, route, build, prepare=None, expect=(200,), first_chunk=False):
+        self.name = name
+        self.route = route
+        self.build = build
+        self.prepare = prepare
+        self.expect = expect
+        self.first_chunk = first_chunk
+
+
+def pick(ctx, values):
+    return ctx.rng.choice(values)
+
+
+def bench_vehicle(ctx):
+    return pick(ctx, ctx.bench_vehicle_ids)
+
+
+SCENARIOS = [
+    Scenario("static", "GET /static/<path>", lambda ctx, i, item: ("GET", "/static/style/style.css", None, None)),
+    Scenario("index_page", "GET /", lambda ctx, i, item: ("GET", "/", None, None)),
+    Scenario("details_page", "GET /vehicle_details/<id>",
+             lambda ctx, i, item: ("GET", f"/vehicle_details/{pick(ctx, ctx.vehicle_ids)}", None, None)),
+    Scenario("pool_stats", "GET /api/pool_stats", lambda ctx, i, item: ("GET", "/api/pool_stats", None, None)),
+    Scenario("events_stats", "GET /api/events/stats", lambda ctx, i, item: ("GET", "/api/events/stats", None, None)),
+    Scenario("events_connect", "GET /api/events", lambda ctx, i, item: ("GET", "/api/events", None, None),
+             first_chunk=True),
+    Scenario("cars", "GET /api/cars", lambda ctx, i, item: ("GET", "/api/cars", None, None)),
+    Scenario("cars_not_modified", "GET /api/cars (If-None-Match)",
+             lambda ctx, i, item: ("GET", "/api/cars", {"If-None-Match": ctx.fleet_etag}, None), expect=(304,)),
+    Scenario("cars_page", "GET /api/cars?limit=50", lambda ctx, i, item: ("GET", "/api/cars?limit=50", None, None)),
+    Scenario("cars_page_cursor", "GET /api/cars?limit=50&cursor=",
+             lambda ctx, i, item: ("GET", f"/api/cars?limit=50&cursor={ctx.page_cursor}", None, None)),
+    Scenario("cars_page_filtered", "GET /api/cars?limit=50&category=",
+             lambda ctx, i, item: ("GET", "/api/cars?limit=50&category=truck&sort=year_desc", None, None)),
+    Scenario("search", "GET /api/vehicles/search?q=",
+             lambda ctx, i, item: ("GET", f"/api/vehicles/search?q={quote(pick(ctx, ctx.search_terms))}", None, None)),
+    Scenario("details", "GET /api/vehicles/<id>/details",
+             lambda ctx, i, item: ("GET", f"/api/vehicles/{pick(ctx, ctx.vehicle_ids)}/details", None, None)),
+    Scenario("details_not_modified", "GET /api/vehicles/<id>/details (If-None-Match)",
+             lambda ctx, i, item: (lambda vehicle_id: ("GET", f"/api/vehicles/{vehicle_id}/details",
+                                                      {"If-None-Match": ctx.detail_etags[vehicle_id]}, None))(
+                 pick(ctx, list(ctx.detail_etags))), expect=(304,)),
+    Scenario("image_thumbnail", "GET /api/vehicles/<id>/image/<rendition>",
+             lambda ctx, i, item: ("GET", f"/api/vehicles/{pick(ctx, ctx.image_vehicle_ids)}/image/thumbnail", None, None)),
+    Scenario("document_content", "GET /api/documents/<id>/content",
+             lambda ctx, i, item: ("GET", f"/api/documents/{pick(ctx, ctx.document_ids)}/content", None, None)),
+    Scenario("document_range", "GET /api/documents/<id>/content (Range)",
+             lambda ctx, i, item: ("GET", f"/api/documents/{pick(ctx, ctx.document_ids)}/content",
+                                   {"Range": "bytes=0-65535"}, None), expect=(206,)),
+    Scenario("register_vehicle", "POST /api/register_vehicle",
+             lambda ctx, i, item: ("POST", "/api/register_vehicle", *json_request(
+                 {"model": "Bench", "year": 2024, "make": "Bench", "vin": ctx.new_vin(), "color": "White",
+                  "category": "van"})), expect=(201,)),
+    Scenario("import_vehicles", f"POST /api/vehicles/import ({IMPORT_ROWS} rows)",
+             lambda ctx, i, item: ("POST", "/api/vehicles/import", *import_csv(ctx))),
+    Scenario("update_vehicle", "PUT /api/vehicles/<id>",
+             lambda ctx, i, item: ("PUT", f"/api/vehicles/{bench_vehicle(ctx)}", *json_request(
+                 {"color": pick(ctx, ["White", "Red", "Blue"]), "fuelLevel": pick(ctx, ["Full", "Half", "Low"])}))),
+    Scenario("upload_image", "POST /api/vehicles/<id>/image",
+             lambda ctx, i, item: ("POST", f"/api/vehicles/{bench_vehicle(ctx)}/image", *multipart_request(
+                 {}, {"image": ("bench.jpg", ctx.image_content, "image/jpeg")}))),
+    Scenario("add_maintenance", "POST /api/vehicles/<id>/maintenance",
+             lambda ctx, i, item: ("POST", f"/api/vehicles/{bench_vehicle(ctx)}/maintenance", *json_request(
+                 {"logType": "Oil Change", "logDate": date.today().isoformat(), "notes": "Benchmark"})), expect=(201,)),
+    Scenario("maintenance_batch", f"POST /api/maintenance_logs/batch ({MAINTENANCE_BATCH} events)",
+             lambda ctx, i, item: ("POST", "/api/maintenance_logs/batch",
+                                   *json_request({"events": maintenance_events(ctx, MAINTENANCE_BATCH)}))),
+    Scenario("delete_maintenance", "DELETE /api/maintenance_logs/<id>",
+             lambda ctx, i, item: ("DELETE", f"/api/maintenance_logs/{item}", None, None),
+             prepare=lambda ctx, count: ctx.new_maintenance_logs(count)),
+    Scenario("upload_document", "POST /api/vehicles/<id>/documents (multipart)",
+             lambda ctx, i, item: ("POST", f"/api/vehicles/{bench_vehicle(ctx)}/documents", *document_upload(ctx)),
+             expect=(201,)),
+    Scenario("update_document", "PUT /api/documents/<id>",
+             lambda ctx, i, item: ("PUT", f"/api/documents/{item}", *json_request(
+                 {"documentName": "Bench Document", "expiryDate": date.today().isoformat()})),
+             prepare=lambda ctx, count: [ctx.new_document(vehicle_id) for vehicle_id in ctx.bench_vehicle_ids[:3]] *
+             (count // 3 + 1)),
+    Scenario("delete_document", "DELETE /api/documents/<id>",
+             lambda ctx, i, item: ("DELETE", f"/api/documents/{item}", None, None),
+             prepare=lambda ctx, count: [ctx.new_document(bench_vehicle(ctx)) for _ in range(count)]),
+    Scenario("upload_start", "POST /api/uploads",
+             lambda ctx, i, item: ("POST", "/api/uploads", *json_request(
+                 {"vehicleId": bench_vehicle(ctx), "kind": "document", "fileName": "bench.pdf",
+                  "mimeType": "application/pdf", "size": DOCUMENT_SIZE})), expect=(201,)),
+    Scenario("upload_status", "GET /api/uploads/<id>",
+             lambda ctx, i, item: ("GET", f"/api/uploads/{item}", None, None),
+             prepare=lambda ctx, count: [ctx.new_upload(vehicle_id) for vehicle_id in ctx.bench_vehicle_ids[:3]] *
+             (count // 3 + 1)),
+    Scenario("upload_patch", "PATCH /api/uploads/<id> (whole file)",
+             lambda ctx, i, item: ("PATCH", f"/api/uploads/{item}",
+                                   {"Upload-Offset": "0", "Content-Type": "application/offset+octet-stream"},
+                                   ctx.document_content),
+             prepare=lambda ctx, count: [ctx.new_upload(bench_vehicle(ctx)) for _ in range(count)], expect=(201,)),
+    Scenario("upload_cancel", "DELETE /api/uploads/<id>",
+             lambda ctx, i, item: ("DELETE", f"/api/uploads/{item}", None, None),
+             prepare=lambda ctx, count: [ctx.new_upload(bench_vehicle(ctx)) for _ in range(count)]),
+    Scenario("delete_vehicle", "DELETE /api/vehicles/<id>",
+             lambda ctx, i, item: ("DELETE", f"/api/vehicles/{item}", None, None),
+             prepare=lambda ctx, count: [ctx.new_vehicle() for _ in range(count)]),
+]
+
+
+# --- Measurement ---
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def run_scenario(scenario, ctx, client_factory, requests, concurrency, warmup, memory_requests):
+    """Runs one scenario and returns its result dict."""
+    total = warmup + requests + memory_requests
+    items = scenario.prepare(ctx, total) if scenario.prepare else [None] * total
+    next_index = iter(range(total))
+    index_lock = threading.Lock()
+    latencies = []
+    errors = []
+
+    def send(client, index):
+        method, path, headers, body = scenario.build(ctx, index, items[index])
+        started = time.perf_counter()
+        status, _, data = client.request(method, path, headers, body, first_chunk=scenario.first_chunk)
+        elapsed = time.perf_counter() - started
+        if status not in scenario.expect:
+            errors.append(f"{status}: {data[:120]!r}")
+        return elapsed
+
+    client = client_factory()
+    for index in range(warmup):
+        send(client, index)
+    for _ in range(warmup):
+        next(next_index)
+
+    def worker():
+        worker_client = client_factory()
+        while True:
+            with index_lock:
+                index = next(next_index, None)
+                if index is None or index >= warmup + requests:
+                    return
+            try:
+                latencies.append(send(worker_client, index))
+            except Exception as e:
+                errors.append(str(e))
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall_time = time.perf_counter() - started
+
+    # Memory is traced in a separate, sequential pass because tracing slows every request down
+    peak_memory = None
+    if memory_requests and not isinstance(client, HttpClient):
+        tracemalloc.start()
+        baseline = tracemalloc.get_traced_memory()[0]
+        for index in range(warmup + requests, total):
+            send(client, index)
+        peak_memory = tracemalloc.get_traced_memory()[1] - baseline
+        tracemalloc.stop()
+
+    latencies.sort()
+    return {
+        "route": scenario.route,
+        "requests": len(latencies),
+        "errors": len(errors),
+        "first_error": errors[0] if errors else None,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2) if latencies else None,
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2) if latencies else None,
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2) if latencies else None,
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 2) if latencies else None,
+        "throughput_rps": round(len(latencies) / wall_time, 1) if wall_time else None,
+        "peak_memory_kib": round(peak_memory / 1024) if peak_memory is not None else None,
+    }
+
+
+def format_change(current, previous, lower_is_better=True):
+    if current is None or not previous:
+        return ""
+    change = (current - previous) / previous * 100
+    better = change < 0 if lower_is_better else change > 0
+    return f" ({'+' if change >= 0 else ''}{change:.0f}%{' ✅' if better and abs(change) >= 5 else ''}" \
+           f"{' ⚠️' if not better and abs(change) >= 5 else ''})"
+
+
+def print_report(results, baseline=None):
+    header = f"{'scenario':<22} {'n':>5} {'err':>4} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>9} {'peak KiB':>9}"
+    print(header)
+    print("-" * len(header))
+    for name, result in results.items():
+        fmt = lambda value: "-" if value is None else f"{value:g}"
+        print(f"{name:<22} {result['requests']:>5} {result['errors']:>4} {fmt(result['p50_ms']):>9} "
+              f"{fmt(result['p95_ms']):>9} {fmt(result['p99_ms']):>9} {fmt(result['throughput_rps']):>9} "
+              f"{fmt(result['peak_memory_kib']):>9}")
+        previous = (baseline or {}).get(name)
+        if previous:
+            print(f"{'':<22} vs baseline: p50{format_change(result['p50_ms'], previous['p50_ms'])}"
+                  f", p95{format_change(result['p95_ms'], previous['p95_ms'])}"
+                  f", req/s{format_change(result['throughput_rps'], previous['throughput_rps'], False)}")
+        if result['first_error']:
+            print(f"{'':<22} ⚠️ {result['first_error']}")
+
+
+def fleet_size():
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor()
+        sizes = {}
+        for table in ("vehicles", "maintenance_logs", "vehicle_documents"):
+            cur.execute(f"SELECT COUNT(*) FROM {table};")
+            sizes[table] = cur.fetchone()[0]
+        return sizes
+    finally:
+        conn.close()
+
+
+def run_target(args, selected, client_factory):
+    """Runs the selected scenarios against one target and returns their results."""
+    ctx = Context(client_factory(), args.seed)
+    results = {}
+    try:
+        ctx.load_fleet()
+        for scenario in selected:
+            print(f"⏱️ {scenario.name} ...", end=" ", flush=True)
+            results[scenario.name] = run_scenario(scenario, ctx, client_factory, args.requests, args.concurrency,
+                                                  args.warmup, 0 if args.url else args.memory_requests)
+            print(f"p50 {results[scenario.name]['p50_ms']} ms")
+    finally:
+        deleted = ctx.cleanup()
+        print(f"🧹 Removed {deleted} benchmark vehicles.\n")
+    return results
+
+
+def run(args):
+    selected = [scenario for scenario in SCENARIOS if not args.only or scenario.name in args.only]
+    unknown = set(args.only or []) - {scenario.name for scenario in SCENARIOS}
+    if unknown:
+        print(f"❌ Unknown scenarios: {', '.join(sorted(unknown))} (see --list)")
+        return False
+    if Image is None:
+        selected = [scenario for scenario in selected if scenario.name != "upload_image"]
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)["results"]
+
+    sizes = fleet_size()
+    print(f"🚛 Fleet: {sizes['vehicles']} vehicles, {sizes['maintenance_logs']} maintenance logs, "
+          f"{sizes['vehicle_documents']} documents")
+    if args.url:
+        targets = [(args.url, lambda: HttpClient(args.url))]
+    else:
+        clients = {"wsgi": ("in-process WSGI app", WsgiClient), "asgi": ("in-process ASGI app", AsgiClient)}
+        targets = [clients[mode] for mode in (("wsgi", "asgi") if args.mode == "both" else (args.mode,))]
+
+    all_results = []
+    for target, client_factory in targets:
+        print(f"🎯 Target: {target}; {args.requests} requests per scenario, concurrency {args.concurrency}\n")
+        results = run_target(args, selected, client_factory)
+        # With --mode both the second (ASGI) run is reported against the first (WSGI) one
+        print_report(results, all_results[-1] if all_results else baseline)
+        print()
+        all_results.append(results)
+
+    print(f"Peak RSS of this process: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024} MiB")
+    results = all_results[-1]
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump({"fleet": sizes, "target": args.url or args.mode, "requests": args.requests,
+                       "concurrency": args.concurrency, "seed": args.seed, "results": results}, output, indent=2)
+        print(f"💾 Results written to {args.json}")
+    return all(result['errors'] == 0 for results in all_results for result in results.values())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark every API route against the configured database.")
+    parser.add_argument('--requests', type=int, default=200, help="Timed requests per scenario (default: 200)")
+    parser.add_argument('--concurrency', type=int, default=1, help="Parallel clients (default: 1)")
+    parser.add_argument('--warmup', type=int, default=10, help="Untimed requests before each scenario (default: 10)")
+    parser.add_argument('--memory-requests', type=int, default=20,
+                        help="Requests traced for peak memory per scenario (default: 20, 0 disables)")
+    parser.add_argument('--only', type=lambda value: value.split(','), help="Comma-separated scenario names")
+    parser.add_argument('--mode', choices=('wsgi', 'asgi', 'both'), default='wsgi',
+                        help="In-process app to benchmark; 'both' compares ASGI against WSGI (default: wsgi)")
+    parser.add_argument('--url', help="Benchmark a running server (e.g. http://localhost:8000) instead of in-process")
+    parser.add_argument('--json', help="Write the results to this file")
+    parser.add_argument('--compare', help="Show changes against results written earlier with --json")
+    parser.add_argument('--seed', type=int, default=42, help="Random seed for the requests (default: 42)")
+    parser.add_argument('--list', action='store_true', help="List the scenarios and exit")
+    args = parser.parse_args()
+
+    if args.list:
+        for scenario in SCENARIOS:
+            print(f"{scenario.name:<22} {scenario.route}")
+        sys.exit(0)
+    try:
+        ok = run(args)
+    except Exception as e:
+        print(f"❌ Benchmark failed: {e}")
+        sys.exit(1)
+    if not ok:
+        print("⚠️ Some requests failed; see the report above.")
+        sys.exit(1)
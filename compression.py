@@ -0,0 +1,84 @@
+# compression.py
+"""
+Response compression.
+
+Static assets are compressed once and kept (assets.py); JSON responses
+above JSON_COMPRESSION_MIN_BYTES are compressed per response, at a lower
+level, since the large listings are produced on every cache miss. Brotli
+is used when the brotli package is installed and the client accepts it,
+otherwise gzip.
+
+Each encoding is a different representation, so it gets its own strong
+ETag: the encoding is appended to the identity ETag (encoded_etag()), as
+for static assets. revisions.with_validators() does this for the JSON
+routes with revision validators, 304s included, and validators_match()
+accepts every encoded form. Every compressible JSON response carries
+`Vary: Accept-Encoding`, whatever its size, so shared caches never serve
+one encoding to a client that asked for another.
+"""
+import os
+import gzip
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; without it responses are gzip-compressed
+    brotli = None
+
+# --- Compression Configuration ---
+JSON_COMPRESSION_MIN_BYTES = int(os.environ.get("JSON_COMPRESSION_MIN_BYTES", 1024))
+JSON_GZIP_LEVEL = int(os.environ.get("JSON_GZIP_LEVEL", 5))
+JSON_BROTLI_QUALITY = int(os.environ.get("JSON_BROTLI_QUALITY", 4))
+
+ENCODINGS = ['br', 'gzip'] if brotli is not None else ['gzip']
+COMPRESSIBLE_TYPES = {'application/json', 'application/javascript', 'text/javascript', 'text/css', 'text/html',
+                      'text/plain', 'image/svg+xml'}
+
+
+def compress(data, encoding, level=None):
+    """Compresses bytes as `encoding` ('br' or 'gzip'); `level` defaults to the maximum."""
+    if encoding == 'br':
+        return brotli.compress(data, quality=11 if level is None else level)
+    # mtime=0 keeps the output (and so the static asset ETags) identical between processes
+    return gzip.compress(data, compresslevel=9 if level is None else level, mtime=0)
+
+
+def encoded_etag(etag, encoding):
+    """The ETag of the `encoding` representation of a response whose identity ETag is `etag`."""
+    return etag if encoding is None else f"{etag}-{encoding}"
+
+
+def etag_variants(etag):
+    """Every ETag a client may hold for a response with identity ETag `etag`."""
+    return [etag, *(encoded_etag(etag, encoding) for encoding in ENCODINGS)]
+
+
+def negotiate_encoding(accept_encodings, available=ENCODINGS):
+    """
+    Picks the best of `available` encodings for a request's parsed
+    Accept-Encoding (werkzeug Accept), or None to send the body as-is.
+    """
+    return accept_encodings.best_match(available)
+
+
+def compress_json_response(response, accept_encodings):
+    """
+    Compresses a buffered JSON response of at least JSON_COMPRESSION_MIN_BYTES
+    in place when the client accepts it. Other responses are returned untouched.
+    """
+    if (response.mimetype != 'application/json' or response.status_code != 200
+            or response.direct_passthrough or response.is_streamed or 'Content-Encoding' in response.headers):
+        return response
+    response.vary.add('Accept-Encoding')
+    body = response.get_data()
+    if len(body) < JSON_COMPRESSION_MIN_BYTES:
+        return response
+    encoding = negotiate_encoding(accept_encodings)
+    if encoding is None:
+        return response
+    response.set_data(compress(body, encoding, JSON_BROTLI_QUALITY if encoding == 'br' else JSON_GZIP_LEVEL))
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag and not weak and not etag.endswith(f"-{encoding}"):
+        # Not set by with_validators(): the compressed bytes still need an ETag of their own
+        response.set_etag(encoded_etag(etag, encoding))
+    return response
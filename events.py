@@ -0,0 +1,201 @@
+# events.py
+"""
+Live fleet events.
+
+Writers call publish() inside their transaction; it sends a Postgres
+NOTIFY, which is only delivered if the transaction commits. Every worker
+process runs one listener thread with its own LISTEN connection, and that
+thread fans each event out to the Server-Sent Events streams served by the
+process. Because the events travel through Postgres, a change made in one
+worker reaches dispatchers connected to any other worker.
+
+Event types:
+    vehicle.created / vehicle.updated  data: the vehicle as listed by /api/cars
+    vehicle.deleted                     data: {"id": vehicle_id}
+    alert.raised                        data: the alert as listed by /api/cars (new or changed)
+    alert.cleared                       data: {"id": alert_id}
+    resync                              data: {} - events may have been missed; refetch /api/cars
+"""
+import os
+import json
+import time
+import queue
+import select
+import threading
+from collections import deque
+
+import psycopg2
+
+from db import get_db_connection
+
+# --- Event Configuration ---
+EVENT_CHANNEL = "fleet_events"
+EVENT_REPLAY_SIZE = int(os.environ.get("EVENT_REPLAY_SIZE", 1000))  # Recent events kept for Last-Event-ID
+EVENT_QUEUE_SIZE = int(os.environ.get("EVENT_QUEUE_SIZE", 500))  # Events buffered per slow client
+EVENT_KEEPALIVE_SECONDS = float(os.environ.get("EVENT_KEEPALIVE_SECONDS", 15))
+MAX_NOTIFY_PAYLOAD = 7900  # Postgres rejects NOTIFY payloads of 8000 bytes or more
+
+EVENT_TABLES = [
+    "CREATE SEQUENCE IF NOT EXISTS fleet_event_ids;",
+]
+
+RESYNC = {"id": None, "type": "resync", "data": {}}
+
+
+def publish(cur, event_type, data):
+    """Queues an event for delivery when the caller's transaction commits."""
+    payload = json.dumps(data, default=str, separators=(',', ':'))
+    if len(payload.encode('utf-8')) > MAX_NOTIFY_PAYLOAD:
+        # Too large for NOTIFY: tell clients to refetch instead of dropping the change
+        event_type, payload = "resync", "{}"
+    cur.execute("""
+        SELECT pg_notify(%s, json_build_object('id', nextval('fleet_event_ids'), 'type', %s, 'data', %s::json)::text);
+    """, (EVENT_CHANNEL, event_type, payload))
+
+
+def format_event(event):
+    """Encodes an event in the text/event-stream format."""
+    lines = []
+    if event['id'] is not None:
+        lines.append(f"id: {event['id']}")
+    lines.append(f"event: {event['type']}")
+    lines.append(f"data: {json.dumps(event['data'], separators=(',', ':'))}")
+    return "\n".join(lines) + "\n\n"
+
+
+class EventBroker:
+    """Per-process LISTEN connection that fans events out to subscriber queues."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._recent = deque(maxlen=EVENT_REPLAY_SIZE)
+        self._thread = None
+        self._pid = None
+        self.listening = False
+
+    def subscribe(self, last_event_id=None, subscriber=None):
+        """
+        Registers a new stream. Returns (queue, backlog): backlog holds the
+        events missed since `last_event_id`, or a single resync event if they
+        are no longer known. `subscriber` replaces the default queue.Queue
+        with any object offering put_nowait()/get_nowait() with queue.Full /
+        queue.Empty semantics (asgi.py passes an asyncio-aware one).
+        """
+        self._ensure_listener()
+        if subscriber is None:
+            subscriber = queue.Queue(maxsize=EVENT_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers.add(subscriber)
+            backlog = []
+            if last_event_id is not None:
+                ids = [event['id'] for event in self._recent]
+                if last_event_id in ids:
+                    backlog = list(self._recent)[ids.index(last_event_id) + 1:]
+                else:
+                    backlog = [RESYNC]
+        return subscriber, backlog
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def stats(self):
+        with self._lock:
+            return {"subscribers": len(self._subscribers), "listening": self.listening,
+                    "recent_events": len(self._recent)}
+
+    def _ensure_listener(self):
+        # A forked worker inherits the object but not the thread
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            if self._pid != os.getpid():
+                self._subscribers = set()  # Queues of the parent process are not ours to serve
+                self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="fleet-event-listener", daemon=True)
+            self._thread.start()
+
+    def _dispatch(self, event):
+        with self._lock:
+            if event['id'] is not None:
+                self._recent.append(event)
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(event)
+            except queue.Full:
+                # The client is too slow to keep up; replace its backlog with a resync
+                while True:
+                    try:
+                        subscriber.get_nowait()
+                    except queue.Empty:
+                        break
+                subscriber.put_nowait(RESYNC)
+
+    def _run(self):
+        backoff = 1
+        connected_before = False
+        while True:
+            conn = None
+            try:
+                conn = get_db_connection()
+                conn.autocommit = True
+                with conn.cursor() as cur:
+                    cur.execute(f"LISTEN {EVENT_CHANNEL};")
+                self.listening = True
+                backoff = 1
+                if connected_before:
+                    # Notifications sent while we were disconnected are lost
+                    with self._lock:
+                        self._recent.clear()
+                    self._dispatch(RESYNC)
+                connected_before = True
+                while True:
+                    if select.select([conn], [], [], EVENT_KEEPALIVE_SECONDS) == ([], [], []):
+                        with conn.cursor() as cur:
+                            cur.execute("SELECT 1;")  # Detects a dead connection while idle
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        notification = conn.notifies.pop(0)
+                        try:
+                            self._dispatch(json.loads(notification.payload))
+                        except ValueError:
+                            print(f"Ignoring malformed fleet event: {notification.payload[:200]}")
+            except (psycopg2.Error, OSError) as e:
+                print(f"Fleet event listener disconnected: {e}; retrying in {backoff}s")
+            finally:
+                self.listening = False
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except psycopg2.Error:
+                        pass
+            time.sleep(backoff)
+            backoff = min(backoff * 2, 30)
+
+
+_broker = EventBroker()
+
+
+def get_broker():
+    return _broker
+
+
+def event_stream(last_event_id=None):
+    """Generator for a text/event-stream response. Holds no database connection."""
+    subscriber, backlog = _broker.subscribe(last_event_id)
+    try:
+        yield "retry: 3000\n\n"  # Reconnect delay for EventSource
+        for event in backlog:
+            yield format_event(event)
+        while True:
+            try:
+                event = subscriber.get(timeout=EVENT_KEEPALIVE_SECONDS)
+            except queue.Empty:
+                yield ": keepalive\n\n"  # Keeps proxies from closing an idle stream
+                continue
+            yield format_event(event)
+    finally:
+        _broker.unsubscribe(subscriber)
@@ -0,0 +1,151 @@
+# fieldsets.py
+"""
+Sparse fieldsets for the vehicle endpoints (/api/cars and the details
+endpoints).
+
+    ?fields=id,make,model          only these vehicle fields
+    ?include=maintenance_logs      only these child collections
+
+Without either parameter a response is unchanged. With `fields` and no
+`include`, no collections are returned. With `include` and no `fields`,
+every vehicle field is returned. `id` is always returned. Only the
+requested columns are selected, and a child table that is not included
+is not queried at all. The Edit form, for example, needs a handful of
+columns and none of the logs, documents or image rows of a details page.
+"""
+from alerts import THUMBNAIL_SHA256_COLUMN
+from images import rendition_url
+
+# Fleet listing fields (as serialize_vehicle_summary() names them) -> selected column
+LIST_FIELDS = {
+    "id": "id",
+    "model": "model",
+    "year": "year",
+    "make": "make",
+    "vin": "vin",
+    "color": "color",
+    "category": "category",
+    "plate_number": "plate_number",
+    "created_at": "created_at",
+    "last_fueled_date": "last_fueled_date",
+    "fuelLevel": "fuel_level",
+    "thumbnail_url": THUMBNAIL_SHA256_COLUMN,
+}
+LIST_INCLUDES = ['alerts']
+
+# Details fields -> selected column; image fields come from vehicle_images
+IMAGE_FIELDS = ['main_image_url', 'main_image_original_url', 'thumbnail_url']
+DETAIL_FIELDS = {
+    "id": "id",
+    "model": "model",
+    "year": "year",
+    "make": "make",
+    "vin": "vin",
+    "color": "color",
+    "category": "category",
+    "plate_number": "plate_number",
+    "created_at": "created_at",
+    "updated_at": "updated_at",
+    "last_fueled_date": "last_fueled_date",
+    "fuel_level": "fuel_level",
+    **{field: None for field in IMAGE_FIELDS},
+    # Read from the logs when they are included, otherwise looked up on its own
+    "last_maintenance_display": """(SELECT MAX(log_date) FROM maintenance_logs
+     WHERE maintenance_logs.vehicle_id = vehicles.id) AS last_maintenance_display""",
+}
+DETAIL_INCLUDES = ['maintenance_logs', 'documents']
+
+
+def parse_names(args, name, allowed):
+    """Parses a comma-separated (or repeated) parameter into a list in request order, validating every value."""
+    values = list(dict.fromkeys(value.strip() for raw in args.getlist(name) for value in raw.split(',')
+                                if value.strip()))
+    for value in values:
+        if value not in allowed:
+            raise ValueError(f"Unknown {name} '{value}'. Use one of: {', '.join(allowed)}")
+    return values
+
+
+def parse_fieldset(args, fields, includes):
+    """
+    Reads ?fields= and ?include= against the allowed `fields` and `includes`.
+    Returns None for the full representation, or {"fields": [...], "include": {...}}.
+    Raises ValueError with a message suitable for a 400 response.
+    """
+    if 'fields' not in args and 'include' not in args:
+        return None
+    requested = parse_names(args, 'fields', list(fields))
+    if 'fields' not in args:
+        requested = list(fields)
+    # The id comes first: the sparse serializers and the alert lookup rely on it
+    return {
+        "fields": ['id'] + [field for field in requested if field != 'id'],
+        "include": set(parse_names(args, 'include', includes)),
+    }
+
+
+def includes(fieldset, name):
+    """Whether a response with `fieldset` contains the `name` collection."""
+    return fieldset is None or name in fieldset['include']
+
+
+def wants_images(fieldset):
+    """Whether a details response with `fieldset` needs the vehicle's image rows."""
+    return fieldset is None or any(field in IMAGE_FIELDS for field in fieldset['fields'])
+
+
+def list_columns(fieldset, default, sort_column=None):
+    """
+    Columns to select for a fleet listing: `default` for the full
+    representation, else the requested fields in order, followed by the
+    page's sort column so the next cursor can be built from the last row.
+    """
+    if fieldset is None:
+        return default
+    columns = [LIST_FIELDS[field] for field in fieldset['fields']]
+    if sort_column is not None and sort_column not in columns:
+        columns.append(sort_column)
+    return ", ".join(columns)
+
+
+def serialize_vehicle_fields(row, fieldset):
+    """
+    Sparse counterpart of serialize_vehicle_summary() for a row selected with
+    list_columns(): the same values, for the requested fields only.
+    """
+    vehicle = {}
+    for field, value in zip(fieldset['fields'], row):
+        if field == 'id':
+            pass
+        elif field == 'thumbnail_url':
+            value = rendition_url(vehicle['id'], 'thumbnail', value) if value else ""
+        elif field in ('created_at', 'last_fueled_date'):
+            value = value.isoformat() if value is not None else ""
+        elif value is None:
+            value = ""
+        vehicle[field] = value
+    return vehicle
+
+
+def detail_columns(fieldset, default):
+    """
+    Columns to select for a details response: `default` for the full
+    representation, else the requested columns, plus what the image
+    fields are derived from.
+    """
+    if fieldset is None:
+        return default
+    columns = [DETAIL_FIELDS[field] for field in fieldset['fields']
+               if DETAIL_FIELDS[field] is not None
+               and not (field == 'last_maintenance_display' and includes(fieldset, 'maintenance_logs'))]
+    if wants_images(fieldset):
+        columns.append("main_image_base64 IS NOT NULL AS has_legacy_image")
+    return ", ".join(columns)
+
+
+def select_fields(vehicle, fieldset):
+    """Trims an assembled details dict to the requested fields and collections."""
+    if fieldset is None:
+        return vehicle
+    keep = set(fieldset['fields']) | fieldset['include']
+    return {key: value for key, value in vehicle.items() if key in keep}
@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+"""
+Synthetic Fleet Generator for Logistics Application
+Fills the database with a realistic fleet for load tests and benchmarks:
+vehicles spread over several years, maintenance histories whose latest
+entry is sometimes overdue, documents whose expiry dates cluster around
+today, and vehicle photos. Rows are streamed into Postgres with COPY, so
+even the large preset runs in constant memory.
+
+Document contents follow a log-normal size distribution. They are drawn
+from a pool of distinct blobs (--blob-pool) shared through the
+content-addressed store, so 500k documents do not need 500k files.
+
+Run it against a benchmark database, not production: child-table triggers
+are disabled (inside the loading transaction) while rows are copied in.
+
+    python generate_fleet.py --scale small               # 1k vehicles, 50k logs, 5k documents
+    python generate_fleet.py --scale large --seed 7      # 100k vehicles, 5M logs, 500k documents
+    python generate_fleet.py --vehicles 5000 --logs 100000 --documents 20000 --reset
+"""
+
+import io
+import os
+import sys
+import math
+import time
+import random
+import string
+import argparse
+from datetime import date, datetime, timedelta
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+try:
+    from db import get_db_connection
+    from init_db import test_database_connection
+    from migrations import apply_migrations
+    from storage import get_document_store
+    from images import Image, build_renditions, RENDITIONS
+    from alerts import refresh_vehicle_alerts
+    from uploads import MAX_UPLOAD_SIZE
+except ImportError as e:
+    print(f"❌ Import error: {e}")
+    print("Make sure you're running this script from your application directory")
+    sys.exit(1)
+
+SCALES = {
+    'small': {'vehicles': 1_000, 'logs': 50_000, 'documents': 5_000},
+    'medium': {'vehicles': 10_000, 'logs': 500_000, 'documents': 50_000},
+    'large': {'vehicles': 100_000, 'logs': 5_000_000, 'documents': 500_000},
+}
+
+MODELS = [
+    ('Toyota', 'Hilux', 'pickup'), ('Toyota', 'Corolla', 'sedan'), ('Toyota', 'Land Cruiser', 'suv'),
+    ('Toyota', 'HiAce', 'van'), ('Ford', 'Transit', 'van'), ('Ford', 'F-150', 'truck'), ('Ford', 'Ranger', 'pickup'),
+    ('Mercedes-Benz', 'Sprinter', 'van'), ('Mercedes-Benz', 'Actros', 'truck'), ('Volvo', 'FH16', 'truck'),
+    ('Scania', 'R 450', 'truck'), ('MAN', 'TGX', 'truck'), ('Isuzu', 'NPR', 'truck'), ('Nissan', 'Navara', 'pickup'),
+    ('Honda', 'Civic', 'sedan'), ('Hyundai', 'H-1', 'van'), ('Volkswagen', 'Crafter', 'van'),
+    ('Mitsubishi', 'Canter', 'truck'), ('Yutong', 'ZK6122', 'bus'), ('Honda', 'CB125F', 'motorcycle'),
+]
+COLORS = ['White', 'Silver', 'Black', 'Blue', 'Red', 'Grey', 'Green', 'Yellow']
+FUEL_LEVELS = [('Full', 0.55), ('Half', 0.33), ('Low', 0.12)]
+LOG_TYPES = ['Oil Change', 'Tire Rotation', 'Brake Inspection', 'Engine Service', 'Battery Replacement',
+             'Transmission Service', 'Air Filter', 'Wheel Alignment', 'Coolant Flush', 'General Inspection']
+DOCUMENT_NAMES = ['Insurance Certificate', 'Vehicle Registration', 'Roadworthiness Certificate',
+                  'Inspection Report', 'Hackney Permit', 'Proof of Ownership', 'Emission Test', 'Driver Logbook']
+DOCUMENT_TYPES = [('application/pdf', 0.7), ('image/jpeg', 0.2), ('image/png', 0.1)]
+DOCUMENT_MEDIAN_SIZE = 180 * 1024  # Bytes; sizes are log-normal around this
+DOCUMENT_SIZE_SIGMA = 1.0
+VIN_ALPHABET = "ABCDEFGHJKLMNPRSTUVWXYZ0123456789"  # VINs never use I, O or Q
+
+
+class RowStream:
+    """File-like object that feeds COPY ... FROM STDIN from a row generator."""
+
+    def __init__(self, rows):
+        self.rows = iter(rows)
+        self.buffer = ""
+        self.count = 0
+
+    def read(self, size=-1):
+        while size is None or size < 0 or len(self.buffer) < size:
+            row = next(self.rows, None)
+            if row is None:
+                break
+            self.buffer += "\t".join(r"\N" if value is None else str(value) for value in row) + "\n"
+            self.count += 1
+        if size is None or size < 0:
+            size = len(self.buffer)
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+
+def weighted(rng, choices):
+    return rng.choices([value for value, _ in choices], [weight for _, weight in choices])[0]
+
+
+def skewed_count(rng, mean):
+    """A per-vehicle count averaging `mean`: most vehicles have a few rows, some have many."""
+    return int(rng.expovariate(1 / mean) + 0.5) if mean > 0 else 0
+
+
+def copy_rows(cur, table, columns, rows):
+    """COPYs generated rows into `table` and returns how many were written."""
+    stream = RowStream(rows)
+    cur.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN;", stream)
+    return stream.count
+
+
+def vehicle_rows(rng, count, vin_prefix, today):
+    for n in range(count):
+        make, model, category = rng.choice(MODELS)
+        created_at = datetime.combine(today, datetime.min.time()) - timedelta(seconds=rng.randint(0, 3 * 365 * 86400))
+        vin = vin_prefix + "".join(rng.choice(VIN_ALPHABET) for _ in range(4)) + f"{n:09d}"
+        plate = "".join(rng.choice(string.ascii_uppercase) for _ in range(3)) + f"-{rng.randint(100, 999)}" + \
+            "".join(rng.choice(string.ascii_uppercase) for _ in range(2))
+        yield (model, rng.randint(2005, today.year), make, vin, rng.choice(COLORS), category, plate,
+               created_at.isoformat(sep=' '), created_at.isoformat(sep=' '),
+               today - timedelta(days=rng.randint(0, 30)), weighted(rng, FUEL_LEVELS))
+
+
+def maintenance_rows(rng, vehicle_ids, total, today):
+    """Spreads about `total` logs over the vehicles; most were serviced recently, some are overdue."""
+    mean = total / len(vehicle_ids)
+    for vehicle_id in vehicle_ids:
+        count = skewed_count(rng, mean)
+        log_date = today - timedelta(days=int(rng.expovariate(1 / 20)))
+        for _ in range(count):
+            yield (vehicle_id, rng.choice(LOG_TYPES), log_date, f"Routine {rng.choice(['check', 'service', 'repair'])}")
+            log_date -= timedelta(days=rng.randint(7, 60))
+
+
+def document_rows(rng, vehicle_ids, total, blob_pool, today):
+    """Documents with expiry dates around today (some expired, some about to expire)."""
+    mean = total / len(vehicle_ids)
+    for vehicle_id in vehicle_ids:
+        count = min(skewed_count(rng, mean), 3 * len(DOCUMENT_NAMES))
+        for n in range(count):
+            name = DOCUMENT_NAMES[n % len(DOCUMENT_NAMES)]
+            if n >= len(DOCUMENT_NAMES):
+                name = f"{name} {n // len(DOCUMENT_NAMES) + 1}"
+            sha256, size, mime_type = rng.choice(blob_pool)
+            expiry = None if rng.random() < 0.05 else today + timedelta(days=int(rng.gauss(45, 120)))
+            yield (vehicle_id, name, None, mime_type, expiry, sha256, size)
+
+
+def document_size(rng):
+    size = int(rng.lognormvariate(math.log(DOCUMENT_MEDIAN_SIZE), DOCUMENT_SIZE_SIGMA))
+    return max(2 * 1024, min(size, MAX_UPLOAD_SIZE))
+
+
+def create_blob_pool(cur, rng, count):
+    """Stores `count` distinct random documents; returns [(sha256, size, mime_type)]."""
+    store = get_document_store()
+    pool = []
+    for _ in range(count):
+        size = document_size(rng)
+        sha256, size = store.put(cur, rng.randbytes(size))
+        pool.append((sha256, size, weighted(rng, DOCUMENT_TYPES)))
+    return pool
+
+
+def create_image_pool(cur, rng, count):
+    """Renders `count` distinct photos and stores their renditions; returns [{rendition: row}]."""
+    from PIL import ImageDraw
+    store = get_document_store()
+    pool = []
+    for _ in range(count):
+        photo = Image.new('RGB', (1600, 1200), tuple(rng.randint(40, 220) for _ in range(3)))
+        draw = ImageDraw.Draw(photo)
+        for _ in range(30):
+            x, y = rng.randint(0, 1500), rng.randint(0, 1100)
+            draw.rectangle([x, y, x + rng.randint(50, 400), y + rng.randint(50, 300)],
+                           fill=tuple(rng.randint(0, 255) for _ in range(3)))
+        buffer = io.BytesIO()
+        photo.save(buffer, format='JPEG', quality=90)
+        renditions = {}
+        for name, (content, mime_type, width, height) in build_renditions(buffer.getvalue(), 'image/jpeg').items():
+            sha256, size = store.put(cur, content)
+            renditions[name] = (sha256, mime_type, width, height, size)
+        pool.append(renditions)
+    return pool
+
+
+def image_rows(rng, vehicle_ids, ratio, image_pool):
+    for vehicle_id in vehicle_ids:
+        if rng.random() < ratio:
+            for name, (sha256, mime_type, width, height, size) in rng.choice(image_pool).items():
+                yield (vehicle_id, name, sha256, mime_type, width, height, size)
+
+
+def load_child_table(conn, table, columns, rows):
+    """
+    COPYs rows into a table whose revision triggers are disabled for the
+    load. The vehicles are new, so there are no revisions to bump; the
+    ALTERs are undone automatically if the load fails.
+    """
+    cur = conn.cursor()
+    cur.execute(f"ALTER TABLE {table} DISABLE TRIGGER USER;")
+    count = copy_rows(cur, table, columns, rows)
+    cur.execute(f"ALTER TABLE {table} ENABLE TRIGGER USER;")
+    conn.commit()
+    return count
+
+
+def reset_fleet(conn):
+    cur = conn.cursor()
+    cur.execute("""
+        TRUNCATE vehicles, maintenance_logs, vehicle_documents, vehicle_images, fleet_alerts, vehicle_alert_reviews,
+                 alert_rollovers, upload_sessions, vehicle_revisions, document_blobs CASCADE;
+    """)
+    conn.commit()
+
+
+def generate(vehicles, logs, documents, blob_pool_size, image_ratio, image_pool_size, seed, reset):
+    rng = random.Random(seed)
+    today = date.today()
+    conn = None
+    try:
+        conn = get_db_connection()
+        apply_migrations(conn, log=lambda message: print(f"   {message}"))
+        conn.autocommit = False
+        cur = conn.cursor()
+        if reset:
+            print("🧹 Removing the existing fleet...")
+            reset_fleet(conn)
+
+        started = time.time()
+        # A random prefix keeps VINs unique across runs
+        vin_prefix = "".join(random.choice(VIN_ALPHABET) for _ in range(4))
+        print(f"🚗 Generating {vehicles} vehicles...")
+        copy_rows(cur, "vehicles", ("model", "year", "make", "vin", "color", "category", "plate_number", "created_at",
+                                    "updated_at", "last_fueled_date", "fuel_level"),
+                  vehicle_rows(rng, vehicles, vin_prefix, today))
+        conn.commit()
+        cur.execute("SELECT id FROM vehicles WHERE vin LIKE %s ORDER BY id;", (vin_prefix + "%",))
+        vehicle_ids = [row[0] for row in cur.fetchall()]
+
+        print(f"🛠️ Generating about {logs} maintenance logs...")
+        log_count = load_child_table(conn, "maintenance_logs", ("vehicle_id", "log_type", "log_date", "notes"),
+                                     maintenance_rows(rng, vehicle_ids, logs, today))
+
+        print(f"📄 Storing {blob_pool_size} distinct document blobs...")
+        blob_pool = create_blob_pool(cur, rng, blob_pool_size)
+        conn.commit()
+        print(f"📄 Generating about {documents} documents...")
+        document_count = load_child_table(
+            conn, "vehicle_documents",
+            ("vehicle_id", "document_name", "file_content_base64", "file_mime_type", "expiry_date", "content_sha256",
+             "file_size"),
+            document_rows(rng, vehicle_ids, documents, blob_pool, today))
+
+        image_count = 0
+        if image_ratio > 0 and Image is not None:
+            print(f"🖼️ Rendering {image_pool_size} vehicle photos...")
+            image_pool = create_image_pool(cur, rng, image_pool_size)
+            conn.commit()
+            image_count = load_child_table(
+                conn, "vehicle_images",
+                ("vehicle_id", "rendition", "content_sha256", "mime_type", "width", "height", "size"),
+                image_rows(rng, vehicle_ids, image_ratio, image_pool)) // (len(RENDITIONS) + 1)
+            # vehicle_images changes the fleet listing; its fleet trigger was off during the load
+            cur.execute("UPDATE fleet_revisions SET revision = nextval('revision_ids'), changed_at = clock_timestamp();")
+            conn.commit()
+        elif image_ratio > 0:
+            print("⚠️ Pillow is not installed; skipping vehicle photos.")
+
+        print("⚠️ Computing alerts...")
+        for start in range(0, len(vehicle_ids), 5000):
+            refresh_vehicle_alerts(cur, vehicle_ids[start:start + 5000], today, notify=False)
+            conn.commit()
+        cur.execute("""
+            INSERT INTO alert_rollovers (id, rolled_over_on) VALUES (TRUE, %s)
+            ON CONFLICT (id) DO UPDATE SET rolled_over_on = GREATEST(alert_rollovers.rolled_over_on, EXCLUDED.rolled_over_on);
+        """, (today,))
+        conn.commit()
+
+        print("📈 Updating planner statistics...")
+        conn.autocommit = True
+        cur.execute("ANALYZE vehicles, maintenance_logs, vehicle_documents, vehicle_images, fleet_alerts, "
+                    "vehicle_alert_reviews;")
+
+        print(f"\n✅ Generated {len(vehicle_ids)} vehicles, {log_count} maintenance logs, {document_count} documents "
+              f"and {image_count} vehicle photos in {time.time() - started:.1f}s (seed {seed}).")
+        return True
+    except Exception as e:
+        print(f"❌ Error generating fleet: {e}")
+        if conn and not conn.autocommit:
+            conn.rollback()
+        return False
+    finally:
+        if conn:
+            conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic fleet for load testing.")
+    parser.add_argument('--scale', choices=SCALES, default='small', help="Preset sizes (default: small)")
+    parser.add_argument('--vehicles', type=int, help="Number of vehicles (overrides --scale)")
+    parser.add_argument('--logs', type=int, help="Approximate number of maintenance logs (overrides --scale)")
+    parser.add_argument('--documents', type=int, help="Approximate number of documents (overrides --scale)")
+    parser.add_argument('--blob-pool', type=int, default=200, help="Distinct document contents to store (default: 200)")
+    parser.add_argument('--image-ratio', type=float, default=0.3, help="Share of vehicles with a photo (default: 0.3)")
+    parser.add_argument('--image-pool', type=int, default=12, help="Distinct vehicle photos to render (default: 12)")
+    parser.add_argument('--seed', type=int, default=42, help="Random seed, for repeatable fleets (default: 42)")
+    parser.add_argument('--reset', action='store_true', help="Delete every existing vehicle and document first")
+    args = parser.parse_args()
+
+    sizes = dict(SCALES[args.scale])
+    for key in sizes:
+        if getattr(args, key) is not None:
+            sizes[key] = getattr(args, key)
+
+    print("🚛 Logistics Synthetic Fleet Generator")
+    print("=" * 50)
+    if not test_database_connection():
+        print("\n❌ Cannot proceed without database connection.")
+        sys.exit(1)
+    if not generate(sizes['vehicles'], sizes['logs'], sizes['documents'], args.blob_pool, args.image_ratio,
+                    args.image_pool, args.seed, args.reset):
+        sys.exit(1)
@@ -0,0 +1,136 @@
+# images.py
+"""
+Vehicle image renditions.
+
+An uploaded vehicle photo is resized once into a few fixed-size renditions.
+Each rendition is stored in the content-addressed document store, and
+vehicle_images records which blob serves which rendition. Because a
+rendition URL carries its content hash, clients may cache it indefinitely.
+"""
+import io
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow is optional; without it every rendition is the original upload
+    Image = None
+
+# Rendition name -> bounding box (width, height). 'original' is always kept as uploaded.
+RENDITIONS = {
+    'thumbnail': (240, 240),  # List cards
+    'medium': (800, 800),     # Details page
+}
+ORIGINAL = 'original'
+JPEG_QUALITY = 85
+
+IMAGE_TABLES = [
+    """
+    CREATE TABLE IF NOT EXISTS vehicle_images (
+        vehicle_id INTEGER NOT NULL,
+        rendition VARCHAR(20) NOT NULL,
+        content_sha256 VARCHAR(64) NOT NULL,
+        mime_type VARCHAR(255) NOT NULL,
+        width INTEGER,
+        height INTEGER,
+        size BIGINT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (vehicle_id, rendition),
+        FOREIGN KEY (vehicle_id) REFERENCES vehicles(id) ON DELETE CASCADE
+    );
+    """,
+]
+
+# (index name, table, column list), built concurrently by migration 1
+IMAGE_INDEXES = [
+    ("idx_vehicle_images_content_sha256", "vehicle_images", "content_sha256"),
+]
+
+
+class InvalidImage(ValueError):
+    """Raised when uploaded bytes cannot be decoded as an image."""
+
+
+def build_renditions(data, mime_type):
+    """
+    Returns {rendition: (bytes, mime_type, width, height)} for an uploaded
+    image, including the untouched original.
+    """
+    if Image is None:
+        return {name: (data, mime_type, None, None) for name in [ORIGINAL, *RENDITIONS]}
+
+    try:
+        source = Image.open(io.BytesIO(data))
+        source.load()
+    except Exception as e:
+        raise InvalidImage(f"Uploaded file is not a readable image: {e}")
+
+    renditions = {ORIGINAL: (data, mime_type, source.width, source.height)}
+    source = ImageOps.exif_transpose(source)  # Phone photos carry their rotation in EXIF
+    has_alpha = source.mode in ('RGBA', 'LA') or (source.mode == 'P' and 'transparency' in source.info)
+    for name, box in RENDITIONS.items():
+        resized = source.copy()
+        resized.thumbnail(box, Image.LANCZOS)
+        buffer = io.BytesIO()
+        if has_alpha:
+            resized.save(buffer, format='PNG', optimize=True)
+            rendition_mime = 'image/png'
+        else:
+            resized.convert('RGB').save(buffer, format='JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+            rendition_mime = 'image/jpeg'
+        renditions[name] = (buffer.getvalue(), rendition_mime, resized.width, resized.height)
+    return renditions
+
+
+def replace_vehicle_image(cur, store, vehicle_id, renditions):
+    """Stores the output of build_renditions() for a vehicle, releasing the blobs of its previous image."""
+    previous = clear_vehicle_image(cur, store, vehicle_id, release=False)
+    for name, (content, rendition_mime, width, height) in renditions.items():
+        sha256, size = store.put(cur, content)
+        cur.execute("""
+            INSERT INTO vehicle_images (vehicle_id, rendition, content_sha256, mime_type, width, height, size)
+            VALUES (%s, %s, %s, %s, %s, %s, %s);
+        """, (vehicle_id, name, sha256, rendition_mime, width, height, size))
+    for sha256 in previous:
+        store.release(cur, sha256)
+
+
+def clear_vehicle_image(cur, store, vehicle_id, release=True):
+    """Removes a vehicle's renditions. Returns the released (or releasable) blob hashes."""
+    cur.execute("DELETE FROM vehicle_images WHERE vehicle_id = %s RETURNING content_sha256;", (vehicle_id,))
+    hashes = sorted({row[0] for row in cur.fetchall()})
+    if release:
+        for sha256 in hashes:
+            store.release(cur, sha256)
+    return hashes
+
+
+def rendition_url(vehicle_id, rendition, sha256):
+    """URL of a rendition; the hash makes it safe to cache forever."""
+    return f"/api/vehicles/{vehicle_id}/image/{rendition}?v={sha256[:16]}"
+
+
+IMAGE_URLS_QUERY = "SELECT rendition, content_sha256 FROM vehicle_images WHERE vehicle_id = %s;"
+
+
+def fetch_image_urls(cur, vehicle_id):
+    """Returns {rendition: url} for a vehicle's current image (empty if it has none)."""
+    cur.execute(IMAGE_URLS_QUERY, (vehicle_id,))
+    return image_urls_from_rows(vehicle_id, cur.fetchall())
+
+
+def image_urls_from_rows(vehicle_id, rows):
+    """Maps the (rendition, content_sha256) rows of IMAGE_URLS_QUERY to {rendition: url}."""
+    return {rendition: rendition_url(vehicle_id, rendition, sha256) for rendition, sha256 in rows}
+
+
+def legacy_image_urls(vehicle_id):
+    """URLs for an image still held in vehicles.main_image_base64 (served unresized, not cacheable forever)."""
+    return {name: f"/api/vehicles/{vehicle_id}/image/{ORIGINAL}" for name in [ORIGINAL, *RENDITIONS]}
+
+
+def image_url_fields(image_urls, empty=None):
+    """Maps rendition URLs onto the vehicle JSON fields used by the frontend."""
+    return {
+        "main_image_url": image_urls.get('medium', empty),
+        "main_image_original_url": image_urls.get(ORIGINAL, empty),
+        "thumbnail_url": image_urls.get('thumbnail', empty),
+    }
@@ -12,7 +12,9 @@ from datetime import date, datetime
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 try:
-    from app import app, create_tables, get_db_connection
+    from app import get_db_connection
+    from migrations import apply_migrations
+    from alerts import refresh_vehicle_alerts
     import psycopg2
     from psycopg2 import extras
 except ImportError as e:
@@ -27,14 +29,18 @@ def init_database():
     print("=" * 40)
     
     # Step 1: Create tables
-    print("📋 Step 1: Creating database tables...")
+    print("📋 Step 1: Applying schema migrations...")
+    conn = None
     try:
-        with app.app_context():
-            create_tables()
+        conn = get_db_connection()
+        apply_migrations(conn, log=lambda message: print(f"   {message}"))
         print("✅ Tables created successfully!")
     except Exception as e:
         print(f"❌ Error creating tables: {e}")
         return False
+    finally:
+        if conn:
+            conn.close()
     
     # Step 2: Add sample data
     print("\n📊 Step 2: Adding sample data...")
@@ -76,6 +82,7 @@ def init_database():
         ]
         
         # Insert sample vehicles
+        added_vehicle_ids = []
         for vehicle in sample_vehicles:
             cur.execute("""
                 INSERT INTO vehicles (model, year, make, vin, color, category, plate_number)
@@ -88,6 +95,7 @@ def init_database():
             result = cur.fetchone()
             if result:
                 vehicle_id = result['id']
+                added_vehicle_ids.append(vehicle_id)
                 print(f"✅ Added vehicle: {vehicle['year']} {vehicle['make']} {vehicle['model']} (ID: {vehicle_id})")
                 
                 # Add sample maintenance logs for this vehicle
@@ -133,6 +141,8 @@ def init_database():
                     """, (vehicle_id, doc['document_name'], doc['file_content_base64'], 
                           doc['file_mime_type'], doc['expiry_date']))
         
+        # Sample rows bypass the API, so their stored alerts are computed here
+        refresh_vehicle_alerts(cur, added_vehicle_ids)
         conn.commit()
         print("✅ Sample data added successfully!")
         
@@ -0,0 +1,214 @@
+# listing.py
+"""
+Keyset-paginated vehicle listing.
+
+Pages are addressed with opaque cursors that encode the sort key of the last
+row returned, so every page is an index range scan instead of an OFFSET scan
+over all preceding rows.
+"""
+import json
+import base64
+from datetime import datetime
+
+from alerts import VEHICLE_LIST_COLUMNS
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+# Sort name -> (column, direction). Every sort breaks ties on id in the same direction.
+SORT_ORDERS = {
+    'created_at_desc': ('created_at', 'DESC'),
+    'created_at_asc': ('created_at', 'ASC'),
+    'year_desc': ('year', 'DESC'),
+    'year_asc': ('year', 'ASC'),
+}
+DEFAULT_SORT = 'created_at_desc'
+# Sort columns that may be NULL; Postgres sorts NULLs first in DESC and last in ASC order
+NULLABLE_SORT_COLUMNS = {'created_at'}
+
+# Equality filters accepted as query parameters (parameter name -> column)
+EQUALITY_FILTERS = {
+    'category': 'category',
+    'make': 'make',
+    'fuel_level': 'fuel_level',
+    'year': 'year',
+}
+
+# (index name, table, column list) backing the filters and sort orders above, built concurrently by migration 1
+LISTING_INDEXES = [
+    ("idx_vehicles_created_at_id", "vehicles", "created_at, id"),
+    ("idx_vehicles_year_id", "vehicles", "year, id"),
+    ("idx_vehicles_category_created_at", "vehicles", "category, created_at, id"),
+    ("idx_vehicles_make_created_at", "vehicles", "make, created_at, id"),
+    ("idx_vehicles_fuel_level_created_at", "vehicles", "fuel_level, created_at, id"),
+]
+
+# Filter + year sort (and year filter + created_at sort) indexes, built concurrently by migration 6
+LISTING_SORT_INDEXES = [
+    ("idx_vehicles_category_year_id", "vehicles", "category, year, id"),
+    ("idx_vehicles_make_year_id", "vehicles", "make, year, id"),
+    ("idx_vehicles_fuel_level_year_id", "vehicles", "fuel_level, year, id"),
+    ("idx_vehicles_year_created_at_id", "vehicles", "year, created_at, id"),
+]
+
+# Any of these query parameters switches /api/cars into paginated listing mode
+LISTING_PARAMS = {'limit', 'cursor', 'sort', 'year_min', 'year_max', *EQUALITY_FILTERS}
+
+
+def is_paginated_request(args):
+    """Pagination is opt-in so the plain /api/cars contract stays unchanged."""
+    return any(param in args for param in LISTING_PARAMS)
+
+
+def encode_cursor(sort, value, vehicle_id):
+    """Builds an opaque cursor from the sort key of the last row on a page."""
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    payload = json.dumps({"s": sort, "v": value, "id": vehicle_id}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, sort):
+    """Returns the (value, id) pair stored in a cursor, validating it against the requested sort."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        value, vehicle_id = payload['v'], int(payload['id'])
+        cursor_sort = payload['s']
+    except (ValueError, KeyError, TypeError):
+        raise ValueError("Invalid cursor")
+    if cursor_sort != sort:
+        raise ValueError("Cursor was issued for a different sort order")
+    sort_column = SORT_ORDERS[sort][0]
+    if value is None:
+        # A page that ended on a row without a sort value
+        if sort_column not in NULLABLE_SORT_COLUMNS:
+            raise ValueError("Invalid cursor")
+        return None, vehicle_id
+    try:
+        if sort_column == 'created_at':
+            value = datetime.fromisoformat(value)
+        else:
+            value = int(value)
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+    return value, vehicle_id
+
+
+def parse_listing_args(args):
+    """
+    Validates the listing query parameters. Raises ValueError with a message
+    suitable for a 400 response.
+    """
+    sort = args.get('sort', DEFAULT_SORT)
+    if sort not in SORT_ORDERS:
+        raise ValueError(f"Unknown sort '{sort}'. Use one of: {', '.join(SORT_ORDERS)}")
+
+    try:
+        limit = int(args.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise ValueError("limit must be an integer")
+    if limit < 1 or limit > MAX_PAGE_SIZE:
+        raise ValueError(f"limit must be between 1 and {MAX_PAGE_SIZE}")
+
+    filters = {}
+    for param, column in EQUALITY_FILTERS.items():
+        value = args.get(param)
+        if value:
+            filters[column] = value
+    if 'year' in filters:
+        try:
+            filters['year'] = int(filters['year'])
+        except ValueError:
+            raise ValueError("year must be an integer")
+
+    year_range = {}
+    for param in ('year_min', 'year_max'):
+        if args.get(param):
+            try:
+                year_range[param] = int(args[param])
+            except ValueError:
+                raise ValueError(f"{param} must be an integer")
+
+    after = decode_cursor(args['cursor'], sort) if args.get('cursor') else None
+    return {"sort": sort, "limit": limit, "filters": filters, "year_range": year_range, "after": after}
+
+
+def build_listing_query(listing, columns=VEHICLE_LIST_COLUMNS):
+    """Returns (sql, params) for one page of vehicles described by parse_listing_args()."""
+    sort_column, direction = SORT_ORDERS[listing['sort']]
+    conditions = []
+    params = []
+
+    for column, value in listing['filters'].items():
+        conditions.append(f"{column} = %s")
+        params.append(value)
+    if 'year_min' in listing['year_range']:
+        conditions.append("year >= %s")
+        params.append(listing['year_range']['year_min'])
+    if 'year_max' in listing['year_range']:
+        conditions.append("year <= %s")
+        params.append(listing['year_range']['year_max'])
+
+    # One extra row tells us whether another page exists
+    fetch = listing['limit'] + 1
+    order_by = f"ORDER BY {sort_column} {direction}, id {direction}"
+    segments = keyset_segments(sort_column, direction, listing['after'])
+    parts = []
+    part_params = []
+    for condition, condition_params in segments:
+        where = conditions + ([condition] if condition else [])
+        where = f"WHERE {' AND '.join(where)}" if where else ""
+        parts.append(f"SELECT {columns} FROM vehicles {where} {order_by} LIMIT %s")
+        part_params.extend([*params, *condition_params, fetch])
+    if len(parts) == 1:
+        return f"{parts[0]};", part_params
+    # Each segment is read in index order and cut at the page size before they are merged
+    subqueries = " UNION ALL ".join(f"({part})" for part in parts)
+    return f"SELECT * FROM ({subqueries}) AS page {order_by} LIMIT %s;", [*part_params, fetch]
+
+
+def keyset_segments(sort_column, direction, after):
+    """
+    The rows after the cursor as [(condition, params)], each segment readable
+    in index order. With a nullable sort column a page can run from the NULL
+    rows into the others (DESC) or from the others into the NULL rows (ASC);
+    a single row comparison would skip the NULL rows.
+    """
+    if after is None:
+        return [(None, [])]
+    value, vehicle_id = after
+    comparison = '<' if direction == 'DESC' else '>'
+    if value is None:
+        segments = [(f"{sort_column} IS NULL AND id {comparison} %s", [vehicle_id])]
+        if direction == 'DESC':
+            segments.append((f"{sort_column} IS NOT NULL", []))
+        return segments
+    segments = [(f"({sort_column}, id) {comparison} (%s, %s)", [value, vehicle_id])]
+    if direction == 'ASC' and sort_column in NULLABLE_SORT_COLUMNS:
+        segments.append((f"{sort_column} IS NULL", []))
+    return segments
+
+
+def fetch_vehicle_page(cur, listing, columns=VEHICLE_LIST_COLUMNS):
+    """
+    Fetches one page of vehicle rows. Returns (rows, next_cursor), where
+    next_cursor is None on the last page.
+    """
+    query, params = build_listing_query(listing, columns)
+    cur.execute(query, params)
+    return split_page(cur.fetchall(), listing)
+
+
+def split_page(rows, listing):
+    """
+    Trims the look-ahead row fetched by build_listing_query(). Returns
+    (rows, next_cursor); rows must support access by column name.
+    """
+    next_cursor = None
+    if len(rows) > listing['limit']:
+        rows = rows[:listing['limit']]
+        last = rows[-1]
+        sort_column = SORT_ORDERS[listing['sort']][0]
+        next_cursor = encode_cursor(listing['sort'], last[sort_column], last['id'])
+    return rows, next_cursor
@@ -0,0 +1,124 @@
+# maintenance_ingest.py
+"""
+Batched maintenance-log ingestion.
+
+Workshop systems and telematics boxes post maintenance events in batches.
+Every event carries a client-supplied eventKey; maintenance_logs stores it
+under a unique index, so a batch that is retried after a timeout inserts
+only the events that did not make it the first time.
+"""
+import os
+from datetime import date
+
+from psycopg2.extras import execute_values
+
+from alerts import refresh_vehicle_alerts
+from events import publish
+
+# --- Ingestion Configuration ---
+MAX_MAINTENANCE_BATCH = int(os.environ.get("MAINTENANCE_MAX_BATCH", 10000))  # Events per request
+MAX_EVENT_KEY_LENGTH = 255
+
+MAINTENANCE_TABLES = [
+    "ALTER TABLE maintenance_logs ADD COLUMN IF NOT EXISTS event_key VARCHAR(255);",
+]
+
+# (index name, table, column list, method, predicate, unique), built concurrently by migration 1
+MAINTENANCE_INDEXES = [
+    ("idx_maintenance_logs_event_key", "maintenance_logs", "event_key", "btree", "event_key IS NOT NULL", True),
+]
+
+
+def clean_event(event):
+    """
+    Validates one event. Returns ((event_key, vehicle_id, log_type, log_date, notes), None)
+    or (None, error message).
+    """
+    if not isinstance(event, dict):
+        return None, "Each event must be a JSON object"
+    event_key = event.get('eventKey')
+    log_type = event.get('logType')
+    log_date = event.get('logDate')
+    notes = event.get('notes')
+    if not isinstance(event_key, str) or not event_key.strip():
+        return None, "eventKey is required"
+    if len(event_key) > MAX_EVENT_KEY_LENGTH:
+        return None, f"eventKey must be at most {MAX_EVENT_KEY_LENGTH} characters long"
+    if not all([log_type, log_date]):
+        return None, "Maintenance type and date are required"
+    if not isinstance(log_type, str) or len(log_type) > 255:
+        return None, "logType must be a string of at most 255 characters"
+    if notes is not None and not isinstance(notes, str):
+        return None, "notes must be a string"
+    try:
+        vehicle_id = int(event.get('vehicleId'))
+    except (TypeError, ValueError):
+        return None, "vehicleId must be an integer"
+    try:
+        # Telematics feeds send timestamps; only the date is kept
+        log_date = date.fromisoformat(str(log_date)[:10])
+    except ValueError:
+        return None, "logDate must be an ISO date (YYYY-MM-DD)"
+    return (event_key, vehicle_id, log_type, log_date, notes), None
+
+
+def ingest_maintenance_events(cur, events):
+    """
+    Inserts a batch of maintenance events in the caller's transaction.
+
+    Events that are invalid or reference unknown vehicles are rejected;
+    events whose eventKey is already stored (or repeated in the batch) are
+    counted as duplicates and leave the existing log untouched. Returns a
+    report with the ids of the inserted logs keyed by eventKey.
+    """
+    rejected = []
+    rows = []
+    seen_keys = set()
+    duplicates = 0
+    for index, event in enumerate(events):
+        row, error = clean_event(event)
+        if error is not None:
+            event_key = event.get('eventKey') if isinstance(event, dict) else None
+            rejected.append({"index": index, "eventKey": event_key if isinstance(event_key, str) else None,
+                             "error": error})
+            continue
+        if row[0] in seen_keys:
+            duplicates += 1
+            continue
+        seen_keys.add(row[0])
+        rows.append((index, row))
+
+    # One pass over vehicles; KEY SHARE keeps them from being deleted before the insert
+    vehicle_ids = sorted({row[1] for _, row in rows})
+    cur.execute("SELECT id FROM vehicles WHERE id = ANY(%s) ORDER BY id FOR KEY SHARE;", (vehicle_ids,))
+    known_vehicles = {vehicle_id for (vehicle_id,) in cur.fetchall()}
+    valid_rows = []
+    for index, row in rows:
+        if row[1] in known_vehicles:
+            valid_rows.append(row)
+        else:
+            rejected.append({"index": index, "eventKey": row[0], "error": "Vehicle not found"})
+
+    inserted = []
+    if valid_rows:
+        # Each row bumps its vehicle's revision; inserting in vehicle order makes concurrent
+        # batches lock those revision rows in the same order instead of deadlocking
+        valid_rows.sort(key=lambda row: row[1])
+        inserted = execute_values(cur, """
+            INSERT INTO maintenance_logs (event_key, vehicle_id, log_type, log_date, notes) VALUES %s
+            ON CONFLICT (event_key) WHERE event_key IS NOT NULL DO NOTHING
+            RETURNING event_key, id, vehicle_id;
+        """, valid_rows, page_size=1000, fetch=True)
+        # A batch can touch thousands of vehicles: one resync instead of an event per alert change
+        refresh_vehicle_alerts(cur, {vehicle_id for _, _, vehicle_id in inserted}, notify=False)
+        if inserted:
+            publish(cur, "resync", {})
+
+    rejected.sort(key=lambda item: item['index'])
+    return {
+        "received": len(events),
+        "inserted": len(inserted),
+        "duplicates": duplicates + len(valid_rows) - len(inserted),
+        "rejected": rejected,
+        "log_ids": {event_key: log_id for event_key, log_id, _ in inserted},
+    }
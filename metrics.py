@@ -0,0 +1,295 @@
+# metrics.py
+"""
+Per-request performance instrumentation.
+
+Every pooled connection is an InstrumentedConnection, whose cursors time
+each statement. While a request is being handled, the statements are
+counted against it; app.py records, per route, the request latency, the
+number of SQL statements, the total database time and the response size,
+and serves them on /metrics in the Prometheus text format. A route whose
+statement count grows with the data (an N+1 query) shows up in the
+`..._db_queries` histogram.
+
+Statements slower than SLOW_QUERY_MS are logged with their text and the
+shape of their parameters (types and lengths, never values).
+
+Metrics are kept per worker process, like /api/pool_stats.
+"""
+import os
+import re
+import time
+import logging
+import threading
+import contextvars
+
+from psycopg2 import extensions, sql
+from werkzeug.wsgi import FileWrapper
+
+# --- Metrics Configuration ---
+SLOW_QUERY_MS = float(os.environ.get("SLOW_QUERY_MS", 200))  # Statements slower than this are logged (0 disables)
+METRICS_PREFIX = "logistics"
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)  # Seconds
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)  # Bytes
+
+slow_query_logger = logging.getLogger("logistics.slow_queries")
+
+
+class Histogram:
+    """Cumulative-bucket histogram keyed by a tuple of label values."""
+
+    def __init__(self, name, help_text, label_names, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {}  # labels -> [bucket counts..., sum, count]
+
+    def observe(self, labels, value):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [0] * (len(self.buckets) + 2)
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[index] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for labels, series in sorted(self._series.items()):
+            label_text = format_labels(self.label_names, labels)
+            for bound, count in zip(self.buckets, series):
+                lines.append(f"{self.name}_bucket{{{label_text},le=\"{bound:g}\"}} {count}")
+            lines.append(f"{self.name}_bucket{{{label_text},le=\"+Inf\"}} {series[-1]}")
+            lines.append(f"{self.name}_sum{{{label_text}}} {series[-2]:.6g}")
+            lines.append(f"{self.name}_count{{{label_text}}} {series[-1]}")
+        return lines
+
+
+class Counter:
+    """Monotonic counter keyed by a tuple of label values."""
+
+    def __init__(self, name, help_text, label_names):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._series = {}
+
+    def inc(self, labels, amount=1):
+        self._series[labels] = self._series.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(self._series.items()):
+            lines.append(f"{self.name}{{{format_labels(self.label_names, labels)}}} {value}")
+        return lines
+
+
+def format_labels(names, values):
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for value in values)
+    return ",".join(f'{name}="{value}"' for name, value in zip(names, escaped))
+
+
+# --- Process-wide Registry ---
+_lock = threading.Lock()
+REQUESTS = Counter(f"{METRICS_PREFIX}_http_requests_total", "HTTP requests handled.",
+                   ("method", "route", "status"))
+REQUEST_DURATION = Histogram(f"{METRICS_PREFIX}_http_request_duration_seconds",
+                             "Time from the start of a request until its response was sent.",
+                             ("method", "route"), DURATION_BUCKETS)
+REQUEST_QUERIES = Histogram(f"{METRICS_PREFIX}_http_request_db_queries", "SQL statements executed per request.",
+                            ("method", "route"), QUERY_COUNT_BUCKETS)
+REQUEST_DB_TIME = Histogram(f"{METRICS_PREFIX}_http_request_db_seconds", "Time spent in SQL statements per request.",
+                            ("method", "route"), DURATION_BUCKETS)
+RESPONSE_SIZE = Histogram(f"{METRICS_PREFIX}_http_response_size_bytes", "Response body size.",
+                          ("method", "route"), SIZE_BUCKETS)
+SLOW_QUERIES = Counter(f"{METRICS_PREFIX}_db_slow_queries_total",
+                       f"SQL statements slower than SLOW_QUERY_MS ({SLOW_QUERY_MS:g} ms).", ("route",))
+
+
+class RequestMetrics:
+    """Measurements of the request currently being handled."""
+
+    def __init__(self, method, route):
+        self.method = method
+        self.route = route
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.response_bytes = 0
+        self.status = None
+
+
+_current = contextvars.ContextVar("request_metrics", default=None)
+
+
+def start_request(method, route):
+    """Starts measuring a request; statements executed from now on are counted against it."""
+    state = RequestMetrics(method, route)
+    _current.set(state)
+    return state
+
+
+def finish_request(state):
+    """Records a finished request (called once its response has been sent)."""
+    if _current.get() is state:
+        _current.set(None)
+    labels = (state.method, state.route)
+    with _lock:
+        REQUESTS.inc((state.method, state.route, str(state.status)))
+        REQUEST_DURATION.observe(labels, time.perf_counter() - state.started)
+        REQUEST_QUERIES.observe(labels, state.queries)
+        REQUEST_DB_TIME.observe(labels, state.db_seconds)
+        RESPONSE_SIZE.observe(labels, state.response_bytes)
+
+
+class MeasuredBody:
+    """Streamed response body that counts its bytes and finishes the request when the server closes it."""
+
+    def __init__(self, body, state):
+        self.body = body
+        self.state = state
+        self.closed = False
+
+    def __iter__(self):
+        for chunk in self.body:
+            self.state.response_bytes += len(chunk)
+            yield chunk
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            close = getattr(self.body, 'close', None)
+            if close is not None:
+                close()
+        finally:
+            finish_request(self.state)
+
+
+def measure_response(response, state, environ):
+    """
+    Arranges for finish_request(state) once `response` has been sent, so
+    streamed bodies (documents, images, events) and the statements they run
+    are included.
+    """
+    state.status = response.status_code
+    no_body = environ.get('REQUEST_METHOD') == 'HEAD' or response.status_code in (204, 304)
+    file_wrapper = environ.get('wsgi.file_wrapper', FileWrapper)
+    if no_body or (isinstance(file_wrapper, type) and isinstance(response.response, file_wrapper)):
+        # No body, or a send_file() body left to the server's sendfile support: measured up to the headers
+        state.response_bytes = 0 if no_body else response.content_length or 0
+        finish_request(state)
+    elif response.direct_passthrough or response.is_streamed:
+        # Direct-passthrough bodies are closed by the server without going through response.close()
+        response.response = MeasuredBody(response.response, state)
+    else:
+        state.response_bytes = response.content_length or 0
+        response.call_on_close(lambda: finish_request(state))
+    return response
+
+
+# Callables returning extra (name, help text, value) gauges, e.g. the async pool of asgi.py
+GAUGE_SOURCES = []
+
+
+def render_metrics(gauges=()):
+    """
+    Returns every metric in the Prometheus text exposition format. `gauges`
+    are extra (name, help text, value) triples sampled by the caller.
+    """
+    with _lock:
+        lines = []
+        for metric in (REQUESTS, REQUEST_DURATION, REQUEST_QUERIES, REQUEST_DB_TIME, RESPONSE_SIZE, SLOW_QUERIES):
+            lines.extend(metric.render())
+    gauges = list(gauges)
+    for source in GAUGE_SOURCES:
+        gauges.extend(source())
+    for name, help_text, value in gauges:
+        lines.extend([f"# HELP {METRICS_PREFIX}_{name} {help_text}", f"# TYPE {METRICS_PREFIX}_{name} gauge",
+                      f"{METRICS_PREFIX}_{name} {value}"])
+    return "\n".join(lines) + "\n"
+
+
+# --- Statement Timing ---
+
+def parameters_shape(params):
+    """Describes query parameters by type (and length for sequences), leaving out their values."""
+    if params is None:
+        return None
+    if isinstance(params, dict):
+        return {key: value_shape(value) for key, value in params.items()}
+    if isinstance(params, (list, tuple)):
+        return [value_shape(value) for value in params]
+    return value_shape(params)
+
+
+def value_shape(value):
+    if isinstance(value, (list, tuple, set, bytes, bytearray, memoryview)):
+        return f"{type(value).__name__}[{len(value)}]"
+    if isinstance(value, str) and len(value) > 64:
+        return f"str[{len(value)}]"
+    return type(value).__name__
+
+
+def statement_text(cursor, query):
+    if isinstance(query, sql.Composable):
+        query = query.as_string(cursor)
+    if isinstance(query, bytes):
+        query = query.decode('utf-8', 'replace')
+    return re.sub(r"\s+", " ", str(query)).strip()[:2000]
+
+
+def record_query(cursor, query, params, seconds):
+    state = _current.get()
+    if state is not None:
+        state.queries += 1
+        state.db_seconds += seconds
+    if SLOW_QUERY_MS > 0 and seconds * 1000 >= SLOW_QUERY_MS:
+        route = state.route if state is not None else "-"
+        with _lock:
+            SLOW_QUERIES.inc((route,))
+        slow_query_logger.warning("Slow query (%.1f ms) in %s: %s | params: %s", seconds * 1000, route,
+                                  statement_text(cursor, query), parameters_shape(params))
+
+
+class QueryTimingMixin:
+    """Cursor mixin that reports every statement to record_query()."""
+
+    def execute(self, query, vars=None):
+        started = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            record_query(self, query, vars, time.perf_counter() - started)
+
+    def copy_expert(self, sql, file, size=8192):
+        started = time.perf_counter()
+        try:
+            return super().copy_expert(sql, file, size)
+        finally:
+            record_query(self, sql, None, time.perf_counter() - started)
+
+
+_timed_cursor_classes = {}
+
+
+def timed_cursor_class(cursor_factory):
+    """Returns (and caches) a subclass of `cursor_factory` that times its statements."""
+    cls = _timed_cursor_classes.get(cursor_factory)
+    if cls is None:
+        cls = type(f"Timed{cursor_factory.__name__}", (QueryTimingMixin, cursor_factory), {})
+        _timed_cursor_classes[cursor_factory] = cls
+    return cls
+
+
+class InstrumentedConnection(extensions.connection):
+    """psycopg2 connection whose cursors, whatever their cursor_factory, time their statements."""
+
+    def cursor(self, *args, **kwargs):
+        cursor_factory = kwargs.get('cursor_factory') or self.cursor_factory or extensions.cursor
+        kwargs['cursor_factory'] = timed_cursor_class(cursor_factory)
+        return super().cursor(*args, **kwargs)
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Schema Migration Script for Logistics Application
+Applies pending schema migrations. The application never changes the
+schema itself, so run this before starting (or restarting) the workers of
+a new release.
+
+    python migrate.py              # Apply all pending migrations
+    python migrate.py --status     # Show applied and pending migrations
+    python migrate.py --target 1   # Apply migrations up to version 1 only
+"""
+
+import os
+import sys
+import argparse
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+try:
+    from db import get_db_connection
+    from migrations import MIGRATIONS, applied_migrations, apply_migrations
+except ImportError as e:
+    print(f"❌ Import error: {e}")
+    print("Make sure you're running this script from your application directory")
+    sys.exit(1)
+
+
+def show_status():
+    """Prints every known migration and whether it has been applied."""
+    conn = None
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor()
+        applied = applied_migrations(cur)
+        for migration in MIGRATIONS:
+            if migration.version in applied:
+                print(f"✅ {migration.version:>4}  {migration.name}  (applied {applied[migration.version][1]:%Y-%m-%d %H:%M})")
+            else:
+                print(f"⏳ {migration.version:>4}  {migration.name}  (pending)")
+        return True
+    except Exception as e:
+        print(f"❌ Error reading schema status: {e}")
+        return False
+    finally:
+        if conn:
+            conn.close()
+
+
+def run(target):
+    """Applies the pending migrations up to `target`."""
+    conn = None
+    try:
+        conn = get_db_connection()
+        applied = apply_migrations(conn, target, log=lambda message: print(f"🔧 {message}"))
+        if applied:
+            print(f"✅ Applied {len(applied)} migration(s); schema is at version {applied[-1]}.")
+        else:
+            print("✅ Schema is up to date.")
+        return True
+    except Exception as e:
+        print(f"❌ Migration failed: {e}")
+        return False
+    finally:
+        if conn:
+            conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply versioned schema migrations.")
+    parser.add_argument('--status', action='store_true', help="List applied and pending migrations")
+    parser.add_argument('--target', type=int, default=None, help="Highest version to apply (default: latest)")
+    args = parser.parse_args()
+
+    ok = show_status() if args.status else run(args.target)
+    if not ok:
+        sys.exit(1)
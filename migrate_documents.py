@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+Document Storage Migration Script for Logistics Application
+Moves legacy base64 document content (vehicle_documents.file_content_base64)
+into the content-addressed document store, one small batch per transaction so
+rows are never locked for long. Safe to interrupt and re-run.
+With --images, converts vehicles.main_image_base64 into stored renditions instead.
+Rows locked by live traffic are skipped and picked up by a further pass; rows
+still locked after --max-passes are reported, and the script exits with 1.
+
+    python migrate_documents.py [--batch-size 100] [--pause 0.05] [--max-passes 5]
+    python migrate_documents.py --images [--batch-size 20]
+    python migrate_documents.py --gc [--grace-hours 24]
+"""
+
+import os
+import sys
+import time
+import base64
+import binascii
+import argparse
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+try:
+    from app import get_db_connection
+    from storage import get_document_store, FileSystemDocumentStore, DOCUMENT_STORE_PATH
+    from images import build_renditions, replace_vehicle_image
+except ImportError as e:
+    print(f"❌ Import error: {e}")
+    print("Make sure you're running this script from your application directory")
+    sys.exit(1)
+
+
+# Rows still holding base64 content: (table, condition)
+LEGACY_DOCUMENTS = ("vehicle_documents", "content_sha256 IS NULL AND file_content_base64 IS NOT NULL")
+LEGACY_IMAGES = ("vehicles", "main_image_base64 IS NOT NULL")
+
+
+def count_legacy_rows(conn, legacy, failed_ids):
+    """Counts the legacy rows still to convert, leaving out those that failed to convert."""
+    table, condition = legacy
+    with conn.cursor() as cur:
+        cur.execute(f"SELECT COUNT(*) FROM {table} WHERE {condition} AND NOT (id = ANY(%s));", (list(failed_ids),))
+        count = cur.fetchone()[0]
+    conn.rollback()
+    return count
+
+
+def migrate_batch(conn, store, after_id, batch_size, failed_ids=()):
+    """
+    Converts up to `batch_size` legacy rows with id > after_id, leaving out
+    `failed_ids`. Returns (last_id_seen, migrated, ids that failed);
+    last_id_seen is None when nothing is left.
+    """
+    cur = conn.cursor()
+    try:
+        # SKIP LOCKED lets the migration run next to live traffic without waiting on it
+        cur.execute(f"""
+            SELECT id, file_content_base64 FROM vehicle_documents
+            WHERE id > %s AND {LEGACY_DOCUMENTS[1]} AND NOT (id = ANY(%s))
+            ORDER BY id LIMIT %s FOR UPDATE SKIP LOCKED;
+        """, (after_id, list(failed_ids), batch_size))
+        rows = cur.fetchall()
+        if not rows:
+            conn.rollback()
+            return None, 0, []
+
+        migrated = 0
+        failed = []
+        for document_id, content_base64 in rows:
+            try:
+                data = base64.b64decode(content_base64, validate=True)
+            except (binascii.Error, ValueError) as e:
+                print(f"⚠️  Document {document_id}: content is not valid base64 ({e}); left unchanged")
+                failed.append(document_id)
+                continue
+            sha256, size = store.put(cur, data)
+            cur.execute("""
+                UPDATE vehicle_documents
+                SET content_sha256 = %s, file_size = %s, file_content_base64 = NULL
+                WHERE id = %s;
+            """, (sha256, size, document_id))
+            migrated += 1
+        conn.commit()
+        return rows[-1][0], migrated, failed
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+
+def migrate_image_batch(conn, store, after_id, batch_size, failed_ids=()):
+    """
+    Converts up to `batch_size` legacy vehicle images with id > after_id into
+    renditions. Returns (last_id_seen, migrated, ids that failed) like migrate_batch().
+    """
+    cur = conn.cursor()
+    try:
+        cur.execute(f"""
+            SELECT id, main_image_base64, main_image_mime_type FROM vehicles
+            WHERE id > %s AND {LEGACY_IMAGES[1]} AND NOT (id = ANY(%s))
+            ORDER BY id LIMIT %s FOR UPDATE SKIP LOCKED;
+        """, (after_id, list(failed_ids), batch_size))
+        rows = cur.fetchall()
+        if not rows:
+            conn.rollback()
+            return None, 0, []
+
+        migrated = 0
+        failed = []
+        for vehicle_id, image_base64, mime_type in rows:
+            try:
+                renditions = build_renditions(base64.b64decode(image_base64, validate=True),
+                                              mime_type or 'application/octet-stream')
+            except (binascii.Error, ValueError) as e:
+                print(f"⚠️  Vehicle {vehicle_id}: main image could not be converted ({e}); left unchanged")
+                failed.append(vehicle_id)
+                continue
+            replace_vehicle_image(cur, store, vehicle_id, renditions)
+            cur.execute("""
+                UPDATE vehicles SET main_image_base64 = NULL, main_image_mime_type = NULL
+                WHERE id = %s;
+            """, (vehicle_id,))
+            migrated += 1
+        conn.commit()
+        return rows[-1][0], migrated, failed
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+
+def migrate(batch_size, pause, images=False, max_passes=5):
+    """
+    Migrates every legacy document row (or, with images=True, every legacy
+    vehicle image). A pass skips rows locked by other transactions, so passes
+    are repeated, up to `max_passes`, until only rows that failed to convert
+    are left. Returns False if locked rows remain.
+    """
+    store = get_document_store()
+    kind, batch, legacy = (("vehicle images", migrate_image_batch, LEGACY_IMAGES) if images
+                           else ("documents", migrate_batch, LEGACY_DOCUMENTS))
+    print(f"📦 Migrating base64 {kind} into the '{store.name}' store (batch size {batch_size})")
+    conn = None
+    total_migrated = 0
+    failed_ids = set()
+    remaining = 0
+    try:
+        conn = get_db_connection()
+        for pass_number in range(1, max_passes + 1):
+            after_id = 0
+            while True:
+                last_id, migrated, failed = batch(conn, store, after_id, batch_size, failed_ids)
+                if last_id is None:
+                    break
+                after_id = last_id
+                total_migrated += migrated
+                failed_ids.update(failed)
+                print(f"   ...up to id {last_id}: {total_migrated} migrated, {len(failed_ids)} skipped")
+                if pause:
+                    time.sleep(pause)  # Leaves room for foreground traffic between batches
+            remaining = count_legacy_rows(conn, legacy, failed_ids)
+            if remaining == 0:
+                break
+            if pass_number < max_passes:
+                print(f"🔁 {remaining} {kind} were locked by other transactions; starting pass {pass_number + 1}")
+                time.sleep(max(pause, 1))
+    except Exception as e:
+        print(f"❌ Error migrating {kind}: {e}")
+        return False
+    finally:
+        if conn:
+            conn.close()
+
+    if total_migrated:
+        print("   Run VACUUM (or let autovacuum run) to reclaim the space of the old base64 values.")
+    if remaining:
+        print(f"⚠️  {total_migrated} migrated, {len(failed_ids)} skipped, but {remaining} {kind} stayed locked "
+              f"after {max_passes} passes; re-run the script to convert them.")
+        return False
+    print(f"✅ Migration finished: {total_migrated} migrated, {len(failed_ids)} skipped.")
+    return True
+
+
+def collect_garbage(grace_hours):
+    """Deletes filesystem blobs that no document_blobs row references."""
+    store = FileSystemDocumentStore(DOCUMENT_STORE_PATH)
+    if not os.path.isdir(store.root):
+        print("✅ No filesystem document store found; nothing to collect.")
+        return True
+
+    cutoff = time.time() - grace_hours * 3600
+    removed = 0
+    conn = None
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor()
+        for directory, _, filenames in os.walk(store.root):
+            if os.path.basename(directory) == "staging":
+                continue
+            for filename in filenames:
+                path = os.path.join(directory, filename)
+                # Recently written files may belong to a transaction that has not committed yet
+                if os.path.getmtime(path) > cutoff:
+                    continue
+                cur.execute("SELECT 1 FROM document_blobs WHERE sha256 = %s;", (filename,))
+                if cur.fetchone() is None:
+                    os.remove(path)
+                    removed += 1
+        conn.rollback()
+    except Exception as e:
+        print(f"❌ Error collecting orphaned blobs: {e}")
+        return False
+    finally:
+        if conn:
+            conn.close()
+
+    print(f"✅ Removed {removed} orphaned blob file(s).")
+    return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move base64 documents and images into the document store.")
+    parser.add_argument('--batch-size', type=int, default=100, help="Rows converted per transaction")
+    parser.add_argument('--pause', type=float, default=0.05, help="Seconds to sleep between batches")
+    parser.add_argument('--max-passes', type=int, default=5, help="Passes over rows that were locked by other transactions")
+    parser.add_argument('--images', action='store_true', help="Convert legacy vehicle images into renditions")
+    parser.add_argument('--gc', action='store_true', help="Delete orphaned filesystem blobs instead of migrating")
+    parser.add_argument('--grace-hours', type=float, default=24, help="Minimum age of a blob file before --gc removes it")
+    args = parser.parse_args()
+
+    ok = collect_garbage(args.grace_hours) if args.gc else migrate(args.batch_size, args.pause, args.images, args.max_passes)
+    if not ok:
+        sys.exit(1)
@@ -0,0 +1,226 @@
+# migrations.py
+"""
+Versioned schema migrations.
+
+The schema is changed only by `python migrate.py` (or init_db.py), never
+when the application is imported, so workers start without taking DDL
+locks. Applied versions are recorded in schema_migrations.
+
+Migrations are applied in version order and must not be edited once they
+have shipped; schema changes are added as a new migration at the end of
+MIGRATIONS. Plain statements run in one transaction together with the
+version record. Indexes on tables that may already be large are listed
+as concurrent_indexes and built with CREATE INDEX CONCURRENTLY, which
+does not block writes but cannot run inside a transaction. Statements
+should be re-runnable (IF NOT EXISTS), because a migration whose index
+build fails is retried from the start.
+"""
+from listing import LISTING_INDEXES, LISTING_SORT_INDEXES
+from storage import STORAGE_TABLES, STORAGE_INDEXES
+from images import IMAGE_TABLES, IMAGE_INDEXES
+from uploads import UPLOAD_TABLES, UPLOAD_INDEXES
+from alerts import ALERT_TABLES, ALERT_INDEXES, ALERT_REVIEW_MAINTENANCE_DATE
+from events import EVENT_TABLES
+from revisions import REVISION_TABLES
+from maintenance_ingest import MAINTENANCE_TABLES, MAINTENANCE_INDEXES
+from search import SEARCH_INDEXES
+from alert_listing import ALERT_LISTING_INDEXES
+from analytics import ANALYTICS_TABLES
+
+# Advisory lock (two-key form) held while migrating, so concurrent deploys apply each migration once
+MIGRATION_LOCK_NAMESPACE = 8003
+
+MIGRATION_TABLE = """
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INTEGER PRIMARY KEY,
+        name VARCHAR(255) NOT NULL,
+        applied_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP
+    );
+"""
+
+# Core tables as originally created by app.create_tables()
+BASE_TABLES = [
+    """
+    CREATE TABLE IF NOT EXISTS vehicles (
+        id SERIAL PRIMARY KEY,
+        model VARCHAR(255) NOT NULL,
+        year INTEGER NOT NULL,
+        make VARCHAR(255) NOT NULL,
+        vin VARCHAR(17) UNIQUE NOT NULL,
+        color VARCHAR(100),
+        category VARCHAR(100),
+        plate_number VARCHAR(20),
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        main_image_base64 TEXT,
+        main_image_mime_type VARCHAR(255),
+        last_fueled_date DATE,
+        fuel_level VARCHAR(50) DEFAULT 'Full'
+    );
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS maintenance_logs (
+        id SERIAL PRIMARY KEY,
+        vehicle_id INTEGER NOT NULL,
+        log_type VARCHAR(255) NOT NULL,
+        log_date DATE NOT NULL,
+        notes TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (vehicle_id) REFERENCES vehicles(id) ON DELETE CASCADE
+    );
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS vehicle_documents (
+        id SERIAL PRIMARY KEY,
+        vehicle_id INTEGER NOT NULL,
+        document_name VARCHAR(255) NOT NULL,
+        file_content_base64 TEXT NOT NULL,
+        file_mime_type VARCHAR(255) NOT NULL,
+        expiry_date DATE,
+        uploaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (vehicle_id) REFERENCES vehicles(id) ON DELETE CASCADE
+    );
+    """,
+]
+
+
+class Migration:
+    """One schema version: statements run in a transaction, then indexes built concurrently."""
+
+    def __init__(self, version, name, statements=(), concurrent_indexes=()):
+        self.version = version
+        self.name = name
+        self.statements = list(statements)
+        # (index name, table, column list[, method[, predicate[, unique]]])
+        self.concurrent_indexes = list(concurrent_indexes)
+
+
+MIGRATIONS = [
+    # Everything create_tables() used to run at import time; idempotent, so existing databases adopt it as-is.
+    # Its indexes may be missing on a database that predates them, so they are built concurrently too.
+    Migration(1, "baseline", [
+        *BASE_TABLES,
+        *STORAGE_TABLES,
+        *IMAGE_TABLES,
+        *UPLOAD_TABLES,
+        *ALERT_TABLES,
+        *EVENT_TABLES,
+        *REVISION_TABLES,
+        *MAINTENANCE_TABLES,
+    ], concurrent_indexes=[
+        *LISTING_INDEXES,
+        *STORAGE_INDEXES,
+        *IMAGE_INDEXES,
+        *UPLOAD_INDEXES,
+        *ALERT_INDEXES,
+        *MAINTENANCE_INDEXES,
+    ]),
+    # Latest-maintenance and document-expiry lookups of the alert engine and the details page
+    Migration(2, "maintenance and document lookup indexes", concurrent_indexes=[
+        ("idx_maintenance_logs_vehicle_id_log_date", "maintenance_logs", "vehicle_id, log_date"),
+        ("idx_vehicle_documents_vehicle_id_expiry_date", "vehicle_documents", "vehicle_id, expiry_date"),
+    ]),
+    # Plate / VIN / make-model lookups of /api/vehicles/search
+    Migration(3, "vehicle search indexes", concurrent_indexes=SEARCH_INDEXES),
+    # Date-ordered alert sources of /api/alerts
+    Migration(4, "alert listing", ALERT_REVIEW_MAINTENANCE_DATE, concurrent_indexes=ALERT_LISTING_INDEXES),
+    # Maintenance analytics rollups and the queue that refreshes them (run refresh_analytics.py afterwards)
+    Migration(5, "maintenance analytics rollups", ANALYTICS_TABLES),
+    # Filtered /api/cars listings sorted by year (and year filters sorted by created_at)
+    Migration(6, "listing sort indexes", concurrent_indexes=LISTING_SORT_INDEXES),
+]
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+def schema_version(cur):
+    """Returns the highest applied migration version (0 for a database never migrated)."""
+    cur.execute("SELECT to_regclass('schema_migrations') IS NOT NULL;")
+    if not cur.fetchone()[0]:
+        return 0
+    cur.execute("SELECT COALESCE(MAX(version), 0) FROM schema_migrations;")
+    return cur.fetchone()[0]
+
+
+def applied_migrations(cur):
+    """Returns {version: (name, applied_at)} of the applied migrations."""
+    cur.execute("SELECT to_regclass('schema_migrations') IS NOT NULL;")
+    if not cur.fetchone()[0]:
+        return {}
+    cur.execute("SELECT version, name, applied_at FROM schema_migrations ORDER BY version;")
+    return {row[0]: (row[1], row[2]) for row in cur.fetchall()}
+
+
+def pending_migrations(cur, target=None):
+    """Returns the migrations not applied yet, up to `target` (default: all)."""
+    applied = applied_migrations(cur)
+    return [migration for migration in MIGRATIONS
+            if migration.version not in applied and (target is None or migration.version <= target)]
+
+
+def build_index_concurrently(conn, name, table, columns, method="btree", where=None, unique=False):
+    """
+    Builds an index (partial if `where` is given) without blocking writes.
+    A build that failed earlier leaves an INVALID index behind; it is
+    dropped and built again.
+    """
+    with conn.cursor() as cur:
+        cur.execute("SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(%s);", (name,))
+        row = cur.fetchone()
+        if row is not None and row[0]:
+            return
+        if row is not None:
+            cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name};")
+        predicate = f" WHERE {where}" if where else ""
+        kind = "UNIQUE INDEX" if unique else "INDEX"
+        cur.execute(f"CREATE {kind} CONCURRENTLY IF NOT EXISTS {name} ON {table} USING {method} ({columns}){predicate};")
+
+
+def record_migration(cur, migration):
+    cur.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s);",
+                (migration.version, migration.name))
+
+
+def apply_migrations(conn, target=None, log=print):
+    """
+    Applies pending migrations on a dedicated (unpooled) connection and
+    returns the versions applied. Safe to run from several deploy jobs at
+    once: they wait for each other on an advisory lock.
+    """
+    conn.autocommit = True
+    applied = []
+    with conn.cursor() as cur:
+        cur.execute("SELECT pg_advisory_lock(%s, 0);", (MIGRATION_LOCK_NAMESPACE,))
+    try:
+        with conn.cursor() as cur:
+            cur.execute(MIGRATION_TABLE)
+            pending = pending_migrations(cur, target)
+        for migration in pending:
+            log(f"Applying migration {migration.version}: {migration.name}")
+            conn.autocommit = False
+            with conn.cursor() as cur:
+                for statement in migration.statements:
+                    cur.execute(statement)
+                if not migration.concurrent_indexes:
+                    record_migration(cur, migration)
+            conn.commit()
+            conn.autocommit = True
+            if migration.concurrent_indexes:
+                for name, table, columns, *options in migration.concurrent_indexes:
+                    log(f"  Building index {name} concurrently")
+                    build_index_concurrently(conn, name, table, columns, *options)
+                with conn.cursor() as cur:
+                    # Expression indexes have no statistics until the table is analyzed
+                    for table in sorted({index[1] for index in migration.concurrent_indexes}):
+                        cur.execute(f"ANALYZE {table};")
+                    record_migration(cur, migration)
+            applied.append(migration.version)
+    except Exception:
+        if not conn.autocommit:
+            conn.rollback()
+            conn.autocommit = True
+        raise
+    finally:
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_advisory_unlock(%s, 0);", (MIGRATION_LOCK_NAMESPACE,))
+    return applied
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Maintenance Analytics Refresh Script for Logistics Application
+Applies queued maintenance-log and vehicle changes to the analytics rollups,
+one batch of vehicles per transaction, so it never holds locks for long.
+Schedule it every few minutes (e.g. `*/5 * * * * python refresh_analytics.py`)
+or keep it running with --watch.
+
+    python refresh_analytics.py
+    python refresh_analytics.py --watch 60    # Refresh every 60 seconds until interrupted
+    python refresh_analytics.py --rebuild     # Recompute the rollups from scratch
+"""
+
+import os
+import sys
+import time
+import argparse
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+try:
+    from db import get_db_connection
+    from analytics import ANALYTICS_REFRESH_BATCH, refresh_maintenance_rollups, rebuild_maintenance_rollups
+    import psycopg2
+except ImportError as e:
+    print(f"❌ Import error: {e}")
+    print("Make sure you're running this script from your application directory")
+    sys.exit(1)
+
+
+def run(rebuild, batch_size):
+    """Drains the refresh queue, committing after every batch. Returns the number of vehicles refreshed."""
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor()
+        if rebuild:
+            rebuild_maintenance_rollups(cur)
+            conn.commit()
+            print("🧹 Rollups cleared; every vehicle is queued.")
+        total = 0
+        while True:
+            refreshed = refresh_maintenance_rollups(cur, batch_size)
+            conn.commit()
+            if not refreshed:
+                return total
+            total += refreshed
+            print(f"   ... {total} vehicles refreshed")
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply queued maintenance changes to the analytics rollups.")
+    parser.add_argument('--rebuild', action='store_true', help="Recompute the rollups of every vehicle")
+    parser.add_argument('--watch', type=float, metavar='SECONDS', help="Keep refreshing at this interval")
+    parser.add_argument('--batch-size', type=int, default=ANALYTICS_REFRESH_BATCH, help="Vehicles per transaction")
+    args = parser.parse_args()
+
+    rebuild = args.rebuild
+    while True:
+        try:
+            started = time.perf_counter()
+            refreshed = run(rebuild, args.batch_size)
+            print(f"✅ Analytics refresh complete: {refreshed} vehicles in {time.perf_counter() - started:.1f}s.")
+        except psycopg2.Error as e:
+            print(f"❌ Error refreshing analytics: {e}")
+            if not args.watch:
+                sys.exit(1)
+        if not args.watch:
+            break
+        rebuild = False
+        time.sleep(args.watch)
@@ -0,0 +1,207 @@
+# revisions.py
+"""
+Revision counters for conditional GETs.
+
+Triggers stamp every change with a value from one sequence:
+- fleet_revisions (a single row) changes whenever anything shown by /api/cars
+  changes (vehicles, their thumbnails or their stored alerts);
+- vehicle_revisions changes whenever anything shown by
+  /api/vehicles/<id>/details changes (the vehicle, its maintenance logs,
+  documents or images).
+
+Because the counters are maintained by triggers, changes made by scripts are
+covered as well as those made through the API. A request whose ETag still
+matches is answered with 304 after reading one row.
+"""
+import hashlib
+from datetime import date
+
+from flask import request
+
+from compression import encoded_etag, etag_variants, negotiate_encoding
+
+# Tables whose changes alter the fleet listing
+FLEET_TABLES = ['vehicles', 'vehicle_images', 'fleet_alerts']
+# Child tables whose changes alter a vehicle's details
+VEHICLE_CHILD_TABLES = ['maintenance_logs', 'vehicle_documents', 'vehicle_images']
+
+
+def create_trigger_if_missing(name, table, definition, constraint=False):
+    """Creates a trigger only when it does not exist yet, so app start-up takes no table locks."""
+    kind = "CONSTRAINT TRIGGER" if constraint else "TRIGGER"
+    return f"""
+    DO $$ BEGIN
+        IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = '{name}' AND tgrelid = '{table}'::regclass) THEN
+            CREATE {kind} {name} {definition};
+        END IF;
+    END $$;
+    """
+
+
+REVISION_TABLES = [
+    "CREATE SEQUENCE IF NOT EXISTS revision_ids;",
+    """
+    CREATE TABLE IF NOT EXISTS fleet_revisions (
+        id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+        revision BIGINT NOT NULL,
+        changed_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP
+    );
+    """,
+    """
+    INSERT INTO fleet_revisions (id, revision)
+    SELECT TRUE, nextval('revision_ids') WHERE NOT EXISTS (SELECT 1 FROM fleet_revisions);
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS vehicle_revisions (
+        vehicle_id INTEGER PRIMARY KEY,
+        revision BIGINT NOT NULL,
+        changed_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (vehicle_id) REFERENCES vehicles(id) ON DELETE CASCADE
+    );
+    """,
+    """
+    INSERT INTO vehicle_revisions (vehicle_id, revision)
+    SELECT v.id, nextval('revision_ids') FROM vehicles v
+    WHERE NOT EXISTS (SELECT 1 FROM vehicle_revisions r WHERE r.vehicle_id = v.id);
+    """,
+    """
+    CREATE OR REPLACE FUNCTION bump_fleet_revision() RETURNS trigger AS $$
+    BEGIN
+        -- Once per transaction is enough
+        IF current_setting('logistics.fleet_revision_bumped', true) = 'on' THEN
+            RETURN NULL;
+        END IF;
+        PERFORM set_config('logistics.fleet_revision_bumped', 'on', true);
+        UPDATE fleet_revisions SET revision = nextval('revision_ids'), changed_at = clock_timestamp();
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+    """,
+    """
+    CREATE OR REPLACE FUNCTION track_new_vehicle_revisions() RETURNS trigger AS $$
+    BEGIN
+        -- Statement level, so a bulk import adds all its rows in one INSERT
+        INSERT INTO vehicle_revisions (vehicle_id, revision, changed_at)
+        SELECT id, nextval('revision_ids'), clock_timestamp() FROM new_vehicles
+        ON CONFLICT (vehicle_id) DO NOTHING;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+    """,
+    """
+    CREATE OR REPLACE FUNCTION track_vehicle_revision() RETURNS trigger AS $$
+    BEGIN
+        UPDATE vehicle_revisions SET revision = nextval('revision_ids'), changed_at = clock_timestamp()
+        WHERE vehicle_id = NEW.id;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+    """,
+    # Rows removed by ON DELETE CASCADE find no vehicle_revisions row left to update, which is fine
+    """
+    CREATE OR REPLACE FUNCTION bump_vehicle_revision() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            UPDATE vehicle_revisions SET revision = nextval('revision_ids'), changed_at = clock_timestamp()
+            WHERE vehicle_id = NEW.vehicle_id;
+        END IF;
+        IF TG_OP = 'DELETE' OR (TG_OP = 'UPDATE' AND OLD.vehicle_id IS DISTINCT FROM NEW.vehicle_id) THEN
+            UPDATE vehicle_revisions SET revision = nextval('revision_ids'), changed_at = clock_timestamp()
+            WHERE vehicle_id = OLD.vehicle_id;
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+    """,
+    create_trigger_if_missing(
+        'vehicles_track_new_revisions', 'vehicles',
+        "AFTER INSERT ON vehicles REFERENCING NEW TABLE AS new_vehicles "
+        "FOR EACH STATEMENT EXECUTE FUNCTION track_new_vehicle_revisions()"),
+    create_trigger_if_missing(
+        'vehicles_track_revision', 'vehicles',
+        "AFTER UPDATE ON vehicles FOR EACH ROW EXECUTE FUNCTION track_vehicle_revision()"),
+    # Deferred to commit, so the single fleet_revisions row is locked last and only briefly;
+    # taking it mid-transaction would serialize all writers and could deadlock with alert refreshes
+    *[create_trigger_if_missing(
+        f'{table}_bump_fleet_revision', table,
+        f"AFTER INSERT OR UPDATE OR DELETE ON {table} DEFERRABLE INITIALLY DEFERRED "
+        "FOR EACH ROW EXECUTE FUNCTION bump_fleet_revision()",
+        constraint=True)
+      for table in FLEET_TABLES],
+    *[create_trigger_if_missing(
+        f'{table}_bump_vehicle_revision', table,
+        f"AFTER INSERT OR UPDATE OR DELETE ON {table} FOR EACH ROW EXECUTE FUNCTION bump_vehicle_revision()")
+      for table in VEHICLE_CHILD_TABLES],
+]
+
+
+def fetch_fleet_revision(cur):
+    """Returns (revision, changed_at) of the fleet listing."""
+    cur.execute("SELECT revision, changed_at FROM fleet_revisions;")
+    row = cur.fetchone()
+    return (row[0], row[1]) if row else (0, None)
+
+
+def fetch_vehicle_revision(cur, vehicle_id):
+    """Returns (revision, changed_at) of a vehicle's details, or None if the vehicle does not exist."""
+    cur.execute("SELECT revision, changed_at FROM vehicle_revisions WHERE vehicle_id = %s;", (vehicle_id,))
+    row = cur.fetchone()
+    return (row[0], row[1]) if row else None
+
+
+def fleet_etag(revision, today=None, query_string=None):
+    """
+    ETag of a fleet listing response. It includes the date, because alerts
+    change with the calendar, and the query string, because each page or
+    filter is a different representation. Outside a Flask request (asgi.py)
+    the raw query string is passed in.
+    """
+    today = today or date.today()
+    query_string = request.query_string if query_string is None else query_string
+    variant = hashlib.sha1(query_string).hexdigest()[:12]
+    return f"fleet-{revision}-{today.isoformat()}-{variant}"
+
+
+def vehicle_etag(vehicle_id, revision, query_string=None):
+    """ETag of a vehicle details response."""
+    query_string = request.query_string if query_string is None else query_string
+    variant = hashlib.sha1(query_string).hexdigest()[:12]
+    return f"vehicle-{vehicle_id}-{revision}-{variant}"
+
+
+def validators_match(if_none_match, if_modified_since, etag, last_modified=None):
+    """
+    Evaluates parsed If-None-Match (werkzeug ETags, falsy when absent) or, when
+    absent, If-Modified-Since (datetime or None) against the current validators.
+    """
+    if if_none_match:
+        # The client may hold the ETag of a compressed representation, or a weakened one from a proxy
+        return any(if_none_match.contains_weak(tag) for tag in etag_variants(etag))
+    if last_modified is not None and if_modified_since is not None:
+        # HTTP dates have one-second resolution
+        return last_modified.replace(microsecond=0) <= if_modified_since
+    return False
+
+
+def is_not_modified(etag, last_modified=None):
+    """
+    Evaluates the current request's If-None-Match (or, when absent,
+    If-Modified-Since) against the current validators.
+    """
+    return validators_match(request.if_none_match, request.if_modified_since, etag, last_modified)
+
+
+def with_validators(response, etag, last_modified=None, accept_encodings=None):
+    """
+    Adds the ETag, Last-Modified and revalidation headers to a JSON response
+    (or its 304). The ETag names the encoding the response is sent in (see
+    compression.py); outside a Flask request (asgi.py) the request's parsed
+    Accept-Encoding is passed in.
+    """
+    accept_encodings = request.accept_encodings if accept_encodings is None else accept_encodings
+    response.set_etag(encoded_etag(etag, negotiate_encoding(accept_encodings)))
+    response.vary.add('Accept-Encoding')
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
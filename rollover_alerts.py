@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Daily Alert Rollover Script for Logistics Application
+Re-evaluates the stored fleet alerts of the vehicles whose maintenance or
+document-expiry thresholds are crossed today. Schedule it shortly after
+midnight (e.g. `5 0 * * * python rollover_alerts.py`); /api/cars also runs
+the rollover on its first request of the day if this job has not.
+
+    python rollover_alerts.py
+    python rollover_alerts.py --rebuild    # Recompute the alerts of every vehicle
+"""
+
+import os
+import sys
+import argparse
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+try:
+    from app import get_db_connection
+    from alerts import rollover_alerts, refresh_vehicle_alerts
+except ImportError as e:
+    print(f"❌ Import error: {e}")
+    print("Make sure you're running this script from your application directory")
+    sys.exit(1)
+
+
+def run(rebuild):
+    """Runs the rollover (or a full rebuild) in one transaction."""
+    conn = None
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor()
+        if rebuild:
+            cur.execute("SELECT id FROM vehicles;")
+            vehicle_ids = [row[0] for row in cur.fetchall()]
+            refresh_vehicle_alerts(cur, vehicle_ids)
+            rollover_alerts(cur)
+            print(f"✅ Rebuilt the alerts of {len(vehicle_ids)} vehicles.")
+        else:
+            refreshed = rollover_alerts(cur)
+            print(f"✅ Rollover complete: {refreshed} vehicles re-evaluated.")
+        conn.commit()
+        return True
+    except Exception as e:
+        print(f"❌ Error rolling over alerts: {e}")
+        if conn:
+            conn.rollback()
+        return False
+    finally:
+        if conn:
+            conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bring the stored fleet alerts up to today.")
+    parser.add_argument('--rebuild', action='store_true', help="Recompute every vehicle's alerts")
+    args = parser.parse_args()
+
+    if not run(args.rebuild):
+        sys.exit(1)
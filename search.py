@@ -0,0 +1,109 @@
+# search.py
+"""
+Vehicle search for dispatcher typeahead.
+
+A query is matched in three tiers, each answered by its own index, so a
+search stays a few index probes however large the fleet is:
+
+    0. exact plate number or VIN
+    1. plate number prefix, VIN prefix or VIN suffix (the last digits
+       printed on documents)
+    2. make / model words, by full-text prefix match ("toy hi" finds
+       Toyota HiAce)
+
+Plate numbers are compared without spaces or dashes and case-insensitively,
+so "ab12cd", "AB-12 CD" and "AB12CD" are the same plate. Within tier 2 at
+most SEARCH_CANDIDATES matches are ranked, which keeps one-word prefixes of
+common makes ("to") fast.
+"""
+import os
+import re
+
+from alerts import VEHICLE_LIST_COLUMNS
+
+# --- Search Configuration ---
+DEFAULT_SEARCH_LIMIT = 10
+MAX_SEARCH_LIMIT = 50
+MIN_SEARCH_LENGTH = 2     # Shorter queries return no results instead of a large part of the fleet
+MIN_VIN_SUFFIX_LENGTH = 4
+MAX_QUERY_LENGTH = 100
+SEARCH_CANDIDATES = int(os.environ.get("SEARCH_CANDIDATES", 200))  # Make/model matches ranked per query
+
+# Index expressions; the queries below must use exactly the same text for Postgres to use the indexes
+PLATE_KEY = "upper(regexp_replace(coalesce(plate_number, ''), '[^[:alnum:]]', '', 'g'))"
+VIN_KEY = "upper(vin)"
+TEXT_DOCUMENT = "to_tsvector('simple', make || ' ' || model)"
+
+# (index name, table, columns, method), built concurrently by migration 3
+SEARCH_INDEXES = [
+    ("idx_vehicles_plate_key", "vehicles", f"{PLATE_KEY} text_pattern_ops", "btree"),
+    ("idx_vehicles_vin_key", "vehicles", f"{VIN_KEY} text_pattern_ops", "btree"),
+    ("idx_vehicles_vin_key_reverse", "vehicles", f"reverse({VIN_KEY}) text_pattern_ops", "btree"),
+    ("idx_vehicles_make_model_text", "vehicles", TEXT_DOCUMENT, "gin"),
+]
+
+# `USING ~<~` orders by the text_pattern_ops indexes, so a prefix matching thousands of rows reads only `limit`
+SEARCH_QUERY = f"""
+    WITH text_query AS (SELECT to_tsquery('simple', %(text_query)s) AS query),
+    matches AS (
+        (SELECT id, 0 AS tier, 0::real AS score FROM vehicles WHERE {PLATE_KEY} = %(key)s LIMIT %(limit)s)
+        UNION ALL
+        (SELECT id, 0, 0 FROM vehicles WHERE {VIN_KEY} = %(key)s LIMIT %(limit)s)
+        UNION ALL
+        (SELECT id, 1, 0 FROM vehicles WHERE {PLATE_KEY} LIKE %(prefix)s
+         ORDER BY {PLATE_KEY} USING ~<~ LIMIT %(limit)s)
+        UNION ALL
+        (SELECT id, 1, 0 FROM vehicles WHERE {VIN_KEY} LIKE %(prefix)s
+         ORDER BY {VIN_KEY} USING ~<~ LIMIT %(limit)s)
+        UNION ALL
+        (SELECT id, 1, 0 FROM vehicles WHERE reverse({VIN_KEY}) LIKE %(reversed_prefix)s
+         ORDER BY reverse({VIN_KEY}) USING ~<~ LIMIT %(limit)s)
+        UNION ALL
+        (SELECT id, 2, ts_rank(document, query) FROM (
+             SELECT id, {TEXT_DOCUMENT} AS document, text_query.query
+             FROM vehicles, text_query
+             WHERE {TEXT_DOCUMENT} @@ text_query.query
+             LIMIT %(candidates)s
+         ) candidates
+         ORDER BY 3 DESC LIMIT %(limit)s)
+    )
+    SELECT {VEHICLE_LIST_COLUMNS}
+    FROM vehicles
+    JOIN (SELECT DISTINCT ON (id) id, tier, score FROM matches ORDER BY id, tier, score DESC) best USING (id)
+    ORDER BY best.tier, best.score DESC, make, model, id
+    LIMIT %(limit)s;
+"""
+
+
+def parse_search_args(args):
+    """
+    Validates the search query parameters. Returns (text, limit); raises
+    ValueError with a message suitable for a 400 response.
+    """
+    text = args.get('q', '').strip()
+    if len(text) > MAX_QUERY_LENGTH:
+        raise ValueError(f"q must be at most {MAX_QUERY_LENGTH} characters long")
+    try:
+        limit = int(args.get('limit', DEFAULT_SEARCH_LIMIT))
+    except ValueError:
+        raise ValueError("limit must be an integer")
+    if limit < 1 or limit > MAX_SEARCH_LIMIT:
+        raise ValueError(f"limit must be between 1 and {MAX_SEARCH_LIMIT}")
+    return text, limit
+
+
+def build_search_query(text, limit):
+    """Returns (sql, params) for a search, or None when the query is too short to search for."""
+    words = re.findall(r"[^\W_]+", text.lower())
+    key = "".join(words).upper()
+    if len(key) < MIN_SEARCH_LENGTH:
+        return None
+    return SEARCH_QUERY, {
+        "key": key,
+        # Words are letters and digits only, so they need no LIKE or tsquery escaping
+        "prefix": f"{key}%",
+        "reversed_prefix": f"{key[::-1]}%" if len(key) >= MIN_VIN_SUFFIX_LENGTH else None,
+        "text_query": " & ".join(f"{word}:*" for word in words),
+        "limit": limit,
+        "candidates": SEARCH_CANDIDATES,
+    }
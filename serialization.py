@@ -0,0 +1,50 @@
+# serialization.py
+"""
+JSON response encoding.
+
+Routes that return many rows build plain dicts from tuple rows (DictCursor
+rows are several times slower to create and copy) and leave dates and
+timestamps as date/datetime objects; the whole payload is then encoded in
+one pass by orjson, or by the standard library when orjson is not
+installed. The output matches jsonify(): sorted keys and ISO-8601 dates
+(microseconds only when non-zero), so clients see the same JSON.
+"""
+import json
+from datetime import date, datetime, time
+from decimal import Decimal
+
+from flask import current_app
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; the standard library encoder produces the same JSON, only slower
+    orjson = None
+
+
+def encode_default(value):
+    """Encodes the column types neither encoder handles natively."""
+    if isinstance(value, (date, datetime, time)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (bytes, memoryview)):
+        raise TypeError("Binary columns must not be serialized into JSON responses")
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(payload):
+    """Encodes `payload` as compact JSON bytes with sorted keys."""
+    if orjson is not None:
+        return orjson.dumps(payload, default=encode_default, option=orjson.OPT_SORT_KEYS)
+    return json.dumps(payload, default=encode_default, sort_keys=True, separators=(",", ":")).encode("utf-8")
+
+
+def json_response(payload, status=200):
+    """Drop-in replacement for jsonify() for large payloads."""
+    return current_app.response_class(dumps(payload), status=status, mimetype="application/json")
+
+
+def fetch_dicts(cur):
+    """Fetches the remaining rows of a plain (tuple) cursor as dicts keyed by column name."""
+    columns = [column[0] for column in cur.description]
+    return [dict(zip(columns, row)) for row in cur.fetchall()]
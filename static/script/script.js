@@ -5,6 +5,9 @@ document.addEventListener("DOMContentLoaded", function () {
   let vehicleToDeleteId = null;
   let originalSubmitBtnText = "Register Vehicle";
   let currentAlerts = [];
+  let currentVehicles = []; // Newest first, as listed by /api/cars
+  let vehiclesLoaded = false;
+  let liveUpdatesConnected = false;
 
   // --- MODAL ELEMENTS ---
   const customModal = document.getElementById("customModal");
@@ -124,7 +127,8 @@ document.addEventListener("DOMContentLoaded", function () {
     else if (tabName === "messages") tabIndex = 2;
     const navTabs = document.querySelectorAll(".nav-tab");
     if (navTabs[tabIndex]) navTabs[tabIndex].classList.add("active");
-    if (tabName === "vehicles") fetchAndDisplayVehicles();
+    // With live updates the list is kept current by events; only load it once
+    if (tabName === "vehicles" && (!vehiclesLoaded || !liveUpdatesConnected)) fetchAndDisplayVehicles();
     else if (tabName === "messages") displayMessages();
     if (tabName === "register" && !editingVehicleId) cancelEdit();
   }
@@ -144,9 +148,10 @@ document.addEventListener("DOMContentLoaded", function () {
         );
       }
       const data = await response.json();
-      const vehicles = data.vehicles;
+      currentVehicles = data.vehicles;
       currentAlerts = data.alerts;
-      displayVehicles(vehicles);
+      vehiclesLoaded = true;
+      displayVehicles(currentVehicles);
       displayMessages();
     } catch (error) {
       showCustomModal(
@@ -166,94 +171,157 @@ document.addEventListener("DOMContentLoaded", function () {
         '<div class="no-data">No vehicles registered yet. Register your first vehicle using the form above!</div>';
       return;
     }
-    vehiclesList.innerHTML = vehicles
-      .map((vehicle) => {
-        const registrationDate = vehicle.created_at
-          ? new Date(vehicle.created_at).toLocaleDateString("en-US", {
-              year: "numeric",
-              month: "short",
-              day: "numeric",
-            })
-          : "N/A";
-        return `
-          <div class="vehicle-card" data-vehicle-id="${vehicle.id}">
-            <div class="vehicle-header">
-              <div class="vehicle-title">${vehicle.year} ${vehicle.make} ${vehicle.model}</div>
-              <div class="vehicle-category">${vehicle.category}</div>
-            </div>
-            <div class="vehicle-details">
-              <div class="vehicle-detail">
-                <div class="detail-label">VIN</div>
-                <div class="detail-value">${vehicle.vin}</div>
-              </div>
-              <div class="vehicle-detail">
-                <div class="detail-label">Plate Number</div>
-                <div class="detail-value">${vehicle.plate_number || "N/A"}</div>
-              </div>
-              <div class="vehicle-detail">
-                <div class="detail-label">Color</div>
-                <div class="detail-value">${vehicle.color}</div>
-              </div>
-              <div class="vehicle-detail">
-                <div class="detail-label">Registered On</div>
-                <div class="detail-value">${registrationDate}</div>
-              </div>
-              <div class="vehicle-detail">
-                <div class="detail-label">Fuel Level</div>
-                <div class="detail-value">
-                  <span class="px-2 py-1 rounded-full text-xs font-semibold ${getStatusColorClass(
-                    vehicle.fuelLevel
-                  )}">
-                    ${vehicle.fuelLevel}
-                  </span>
-                </div>
-              </div>
-            </div>
-            <div class="vehicle-actions">
-              <button class="edit-btn" data-vehicle-id="${vehicle.id}">Edit</button>
-              <button class="delete-btn" data-vehicle-id="${vehicle.id}">Delete</button>
-              <a href="/vehicle_details/${vehicle.id}" class="view-details-btn">View Details</a>
+    vehiclesList.innerHTML = vehicles.map(renderVehicleCard).join("");
+  }
+
+  function renderVehicleCard(vehicle) {
+    const registrationDate = vehicle.created_at
+      ? new Date(vehicle.created_at).toLocaleDateString("en-US", {
+          year: "numeric",
+          month: "short",
+          day: "numeric",
+        })
+      : "N/A";
+    return `
+      <div class="vehicle-card" data-vehicle-id="${vehicle.id}">
+        ${vehicle.thumbnail_url ? `<img class="vehicle-thumbnail" src="${vehicle.thumbnail_url}" loading="lazy" alt="${vehicle.make} ${vehicle.model}">` : ""}
+        <div class="vehicle-header">
+          <div class="vehicle-title">${vehicle.year} ${vehicle.make} ${vehicle.model}</div>
+          <div class="vehicle-category">${vehicle.category}</div>
+        </div>
+        <div class="vehicle-details">
+          <div class="vehicle-detail">
+            <div class="detail-label">VIN</div>
+            <div class="detail-value">${vehicle.vin}</div>
+          </div>
+          <div class="vehicle-detail">
+            <div class="detail-label">Plate Number</div>
+            <div class="detail-value">${vehicle.plate_number || "N/A"}</div>
+          </div>
+          <div class="vehicle-detail">
+            <div class="detail-label">Color</div>
+            <div class="detail-value">${vehicle.color}</div>
+          </div>
+          <div class="vehicle-detail">
+            <div class="detail-label">Registered On</div>
+            <div class="detail-value">${registrationDate}</div>
+          </div>
+          <div class="vehicle-detail">
+            <div class="detail-label">Fuel Level</div>
+            <div class="detail-value">
+              <span class="px-2 py-1 rounded-full text-xs font-semibold ${getStatusColorClass(
+                vehicle.fuelLevel
+              )}">
+                ${vehicle.fuelLevel}
+              </span>
             </div>
           </div>
-        `;
-      })
-      .join("");
-    document.querySelectorAll(".edit-btn").forEach((button) => {
-      button.addEventListener("click", async (e) => {
+        </div>
+        <div class="vehicle-actions">
+          <button class="edit-btn" data-vehicle-id="${vehicle.id}">Edit</button>
+          <button class="delete-btn" data-vehicle-id="${vehicle.id}">Delete</button>
+          <a href="/vehicle_details/${vehicle.id}" class="view-details-btn">View Details</a>
+        </div>
+      </div>
+    `;
+  }
+
+  // One delegated listener serves every card, including cards added later by live updates
+  const vehiclesListElement = document.getElementById("vehiclesList");
+  if (vehiclesListElement) {
+    vehiclesListElement.addEventListener("click", async (e) => {
+      const editButton = e.target.closest(".edit-btn");
+      const deleteButton = e.target.closest(".delete-btn");
+      if (editButton) {
         e.stopPropagation();
-        const vehicleId = e.target.dataset.vehicleId;
+        const vehicleId = editButton.dataset.vehicleId;
         try {
-          const response = await fetch(`/api/vehicles/${vehicleId}/details`);
+          // Only the form's fields: no logs, documents or image lookups
+          const response = await fetch(
+            `/api/vehicles/${vehicleId}/details?fields=model,year,make,vin,color,category,plate_number`
+          );
           if (!response.ok) throw new Error("Failed to fetch vehicle details.");
           const vehicleToEdit = await response.json();
           populateEditForm(vehicleToEdit);
         } catch (error) {
           showCustomModal("Error", "Could not load vehicle details for editing.");
         }
-      });
-    });
-    document.querySelectorAll(".delete-btn").forEach((button) => {
-      button.addEventListener("click", (e) => {
+        return;
+      }
+      if (deleteButton) {
         e.stopPropagation();
-        const vehicleId = e.target.dataset.vehicleId;
-        confirmDeleteVehicle(vehicleId);
-      });
+        confirmDeleteVehicle(deleteButton.dataset.vehicleId);
+        return;
+      }
+      if (e.target.closest(".view-details-btn")) return;
+      const card = e.target.closest(".vehicle-card");
+      if (card && card.dataset.vehicleId) {
+        window.location.href = `/vehicle_details/${card.dataset.vehicleId}`;
+      }
     });
-    document.querySelectorAll(".vehicle-card").forEach((card) => {
-      card.addEventListener("click", (e) => {
-        if (
-          e.target.closest(".edit-btn") ||
-          e.target.closest(".delete-btn") ||
-          e.target.closest(".view-details-btn")
-        ) {
-          return;
-        }
-        const vehicleId = e.currentTarget.dataset.vehicleId;
-        if (vehicleId) {
-          window.location.href = `/vehicle_details/${vehicleId}`;
-        }
-      });
+  }
+
+  // --- LIVE UPDATES ---
+  // Replaces, inserts (newest first) or removes a single card instead of re-rendering the list
+  function applyVehicleDelta(vehicle, deleted = false) {
+    const index = currentVehicles.findIndex((v) => String(v.id) === String(vehicle.id));
+    if (deleted) {
+      if (index !== -1) currentVehicles.splice(index, 1);
+    } else if (index !== -1) {
+      currentVehicles[index] = vehicle;
+    } else {
+      currentVehicles.unshift(vehicle);
+    }
+    const vehiclesList = document.getElementById("vehiclesList");
+    if (!vehiclesList || !vehiclesLoaded) return;
+    if (currentVehicles.length === 0 || (index === -1 && currentVehicles.length === 1)) {
+      displayVehicles(currentVehicles); // Switches between the empty state and the list
+      return;
+    }
+    const card = vehiclesList.querySelector(`.vehicle-card[data-vehicle-id="${vehicle.id}"]`);
+    if (deleted) {
+      if (card) card.remove();
+      return;
+    }
+    const template = document.createElement("template");
+    template.innerHTML = renderVehicleCard(vehicle).trim();
+    if (card) card.replaceWith(template.content.firstChild);
+    else vehiclesList.prepend(template.content.firstChild);
+  }
+
+  function applyAlertDelta(alert, cleared = false) {
+    const index = currentAlerts.findIndex((a) => a.id === alert.id);
+    if (cleared) {
+      if (index !== -1) currentAlerts.splice(index, 1);
+    } else if (index !== -1) {
+      currentAlerts[index] = alert;
+    } else {
+      currentAlerts.push(alert);
+    }
+    displayMessages();
+  }
+
+  function connectLiveUpdates() {
+    if (!window.EventSource) return; // Falls back to fetching on demand
+    const source = new EventSource("/api/events");
+    const handlers = {
+      "vehicle.created": (data) => applyVehicleDelta(data),
+      "vehicle.updated": (data) => applyVehicleDelta(data),
+      "vehicle.deleted": (data) => applyVehicleDelta(data, true),
+      "alert.raised": (data) => applyAlertDelta(data),
+      "alert.cleared": (data) => applyAlertDelta(data, true),
+      resync: () => fetchAndDisplayVehicles(),
+    };
+    Object.entries(handlers).forEach(([type, handler]) => {
+      source.addEventListener(type, (e) => handler(JSON.parse(e.data)));
     });
+    source.onopen = () => {
+      // Changes made while disconnected are replayed via Last-Event-ID or a resync event
+      liveUpdatesConnected = true;
+    };
+    source.onerror = () => {
+      liveUpdatesConnected = false; // EventSource reconnects by itself
+    };
   }
 
   function populateEditForm(vehicle) {
@@ -341,7 +409,7 @@ document.addEventListener("DOMContentLoaded", function () {
         "Success",
         result.message || "Vehicle deleted successfully!"
       );
-      fetchAndDisplayVehicles();
+      if (!liveUpdatesConnected) fetchAndDisplayVehicles();
     } catch (error) {
       showCustomModal(
         "Deletion Error",
@@ -581,7 +649,7 @@ function displayMessages() {
             throw new Error(result.error || "Registration failed");
           }
         }
-        fetchAndDisplayVehicles();
+        if (!liveUpdatesConnected) fetchAndDisplayVehicles();
       } catch (error) {
         showCustomModal(
           editingVehicleId ? "Update Error" : "Registration Error",
@@ -617,6 +685,7 @@ function displayMessages() {
   // --- INITIAL LOAD ---
   setTimeout(() => {
     fetchAndDisplayVehicles();
+    connectLiveUpdates();
     showTab("register");
   }, 100);
 });
\ No newline at end of file
@@ -36,8 +36,8 @@ document.addEventListener("DOMContentLoaded", function() {
     // Main image upload elements
     const mainImageUpload = document.getElementById('mainImageUpload');
     const removeMainImageBtn = document.getElementById('removeMainImageBtn');
-    let newMainImageBase64 = null; // Stores Base64 for new image to be uploaded
-    let newMainImageMimeType = null; // Stores MIME type for new image
+    let newMainImageFile = null; // New image file to upload after the details are saved
+    let mainImageRemoved = false; // True when the remove button cleared the current image
 
     // Action buttons for main vehicle details
     const editDetailsBtn = document.getElementById('editDetailsBtn');
@@ -124,6 +124,81 @@ document.addEventListener("DOMContentLoaded", function() {
         return date.toISOString().split('T')[0];
     };
 
+    // Helper to format a byte count for display
+    const formatFileSize = (bytes) => {
+        if (bytes < 1024) return `${bytes} B`;
+        if (bytes < 1024 * 1024) return `${(bytes / 1024).toFixed(1)} KB`;
+        return `${(bytes / (1024 * 1024)).toFixed(1)} MB`;
+    };
+
+    // Files above this size are sent in resumable chunks instead of a single request
+    const RESUMABLE_UPLOAD_THRESHOLD = 5 * 1024 * 1024;
+    const UPLOAD_CHUNK_SIZE = 1024 * 1024;
+    const UPLOAD_RETRIES = 5;
+
+    // Uploads a file through /api/uploads. After a failed chunk it asks the server how much
+    // arrived and continues from there, so a dropped connection does not restart the file.
+    async function uploadResumable(file, metadata) {
+        const startResponse = await fetch('/api/uploads', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ ...metadata, fileName: file.name, mimeType: file.type, size: file.size })
+        });
+        const session = await startResponse.json();
+        if (!startResponse.ok) throw new Error(session.error || "Failed to start upload.");
+
+        const chunkSize = Math.min(UPLOAD_CHUNK_SIZE, session.max_chunk_size);
+        let offset = session.offset;
+        let failures = 0;
+        while (true) {
+            let response;
+            try {
+                response = await fetch(session.upload_url, {
+                    method: 'PATCH',
+                    headers: { 'Content-Type': 'application/offset+octet-stream', 'Upload-Offset': String(offset) },
+                    body: file.slice(offset, offset + chunkSize)
+                });
+            } catch (error) {
+                response = null; // Network failure: retry below
+            }
+            if (response && response.status < 500) {
+                const result = await response.json();
+                if (response.status === 201) return result;
+                if (!response.ok && response.status !== 409) throw new Error(result.error || "Upload failed.");
+                offset = result.offset; // 409 means our offset was stale; continue from the server's
+                failures = 0;
+                continue;
+            }
+            if (++failures > UPLOAD_RETRIES) throw new Error("Upload failed after several retries.");
+            await new Promise(resolve => setTimeout(resolve, 1000 * failures));
+            try {
+                const status = await fetch(session.upload_url);
+                if (status.ok) offset = (await status.json()).offset;
+            } catch (error) {
+                // Still offline; the next attempt will try again
+            }
+        }
+    }
+
+    // Uploads a file as multipart/form-data, or in resumable chunks when it is large
+    async function uploadFile(url, fieldName, file, fields, resumableMetadata) {
+        if (file.size > RESUMABLE_UPLOAD_THRESHOLD) {
+            return uploadResumable(file, resumableMetadata);
+        }
+        const formData = new FormData();
+        Object.entries(fields).forEach(([name, value]) => {
+            if (value !== null && value !== undefined) formData.append(name, value);
+        });
+        formData.append(fieldName, file);
+        const response = await fetch(url, { method: 'POST', body: formData });
+        const result = await response.json();
+        if (!response.ok) {
+            const detailedErrorMessage = result.details ? ` Details: ${result.details}` : "";
+            throw new Error(`${result.error || "Upload failed."}${detailedErrorMessage}`);
+        }
+        return result;
+    }
+
     // Function to update fuel level visual indicator
     function updateFuelLevelDisplay(level) {
         if (!displayFuelLevel || !fuelLevelBar || !fuelLevelFill) return;
@@ -194,7 +269,7 @@ document.addEventListener("DOMContentLoaded", function() {
 
         if (removeMainImageBtn) {
             // Show remove button only if an image currently exists AND we are in edit mode
-            removeMainImageBtn.style.display = enable && currentVehicleData && currentVehicleData.main_image_base64 ? 'inline-block' : 'none';
+            removeMainImageBtn.style.display = enable && currentVehicleData && currentVehicleData.main_image_url ? 'inline-block' : 'none';
         }
 
         if (enable && currentVehicleData) {
@@ -271,8 +346,8 @@ document.addEventListener("DOMContentLoaded", function() {
 
             // Display main vehicle image if available
             if (mainVehicleImage) {
-                if (vehicle.main_image_base64 && vehicle.main_image_mime_type) {
-                    mainVehicleImage.src = `data:${vehicle.main_image_mime_type};base64,${vehicle.main_image_base64}`;
+                if (vehicle.main_image_url) {
+                    mainVehicleImage.src = vehicle.main_image_url; // Medium rendition, cached by the browser
                     // Only show remove button if in edit mode and image exists
                     if (editDetailsBtn.style.display === 'none' && removeMainImageBtn) { // If in "display" mode
                         removeMainImageBtn.style.display = 'none'; // Keep hidden in display mode
@@ -346,11 +421,12 @@ document.addEventListener("DOMContentLoaded", function() {
             docItem.dataset.id = doc.id; // Store document ID on the item for easy access
 
             let filePreview = '';
+            // Document content is streamed from its own endpoint, not embedded in the details JSON
+            const contentUrl = `/api/documents/${doc.id}/content`;
             // Determine preview based on MIME type
-            if (doc.file_mime_type && doc.file_content_base64) {
-                const base64Prefix = `data:${doc.file_mime_type};base64,`;
+            if (doc.file_mime_type) {
                 if (doc.file_mime_type.startsWith('image/')) {
-                    filePreview = `<img src="${base64Prefix}${doc.file_content_base64}" class="document-thumbnail" alt="${doc.document_name} preview">`;
+                    filePreview = `<img src="${contentUrl}" class="document-thumbnail" loading="lazy" alt="${doc.document_name} preview">`;
                 } else if (doc.file_mime_type === 'application/pdf') {
                     filePreview = `<div class="pdf-preview"><svg class="pdf-icon" xmlns="http://www.w3.org/2000/svg" viewBox="0 0 24 24" fill="currentColor"><path d="M19 12v7H5V5h7V3H5c-1.1 0-2 .9-2 2v14c0 1.1.9 2 2 2h14c1.1 0 2-.9 2-2v-7h-2zM12 9V7h1.41L16 9.59V9h4v4h-2V9h-2V7h-2V5h-2v2h-2v2h2zM15 16h2v-2h-2v2z"/></svg><p>PDF Document</p></div>`;
                 } else {
@@ -363,14 +439,14 @@ document.addEventListener("DOMContentLoaded", function() {
             docItem.innerHTML = `
                 <h4 class="document-name-display">${doc.document_name}</h4>
                 <input type="text" class="document-name-edit edit-input" value="${doc.document_name}" style="display: none;">
-                <p>Uploaded: ${formatDate(doc.uploaded_at)}</p>
+                <p>Uploaded: ${formatDate(doc.uploaded_at)}${doc.file_size ? ` (${formatFileSize(doc.file_size)})` : ''}</p>
                 <p>Expires: <span class="doc-expiry-display">${doc.expiry_date ? formatDate(doc.expiry_date) : 'N/A'}</span></p>
                 <input type="date" class="doc-expiry-edit edit-input" value="${doc.expiry_date ? formatDateForInput(doc.expiry_date) : ''}" style="display: none;">
                 <div class="doc-preview-wrapper">
                     ${filePreview}
                 </div>
                 <div class="item-actions">
-                    ${doc.file_content_base64 && doc.file_mime_type ? `<button class="view-btn" data-base64="${doc.file_content_base64}" data-mimetype="${doc.file_mime_type}" data-name="${doc.document_name}">View</button>` : ''}
+                    ${doc.file_mime_type ? `<button class="view-btn" data-url="${contentUrl}" data-mimetype="${doc.file_mime_type}" data-name="${doc.document_name}">View</button>` : ''}
                     <button class="edit-document-btn" data-id="${doc.id}">Edit</button>
                     <button class="save-document-btn submit-btn" data-id="${doc.id}" style="display: none;">Save</button>
                     <button class="cancel-document-btn secondary-btn" data-id="${doc.id}" style="display: none;">Cancel</button>
@@ -480,49 +556,26 @@ document.addEventListener("DOMContentLoaded", function() {
     function attachViewDocumentListeners() {
         document.querySelectorAll('.view-btn').forEach(button => {
             button.onclick = (e) => {
-                const base64 = e.target.dataset.base64;
+                const url = e.target.dataset.url;
                 const mimetype = e.target.dataset.mimetype;
                 const docName = e.target.dataset.name;
 
-                if (base64 && mimetype) {
-                    const dataUrl = `data:${mimetype};base64,${base64}`;
-                    const newWindow = window.open();
-                    if (newWindow) { // Check if window was opened successfully
-                        if (mimetype.startsWith('image/')) {
-                            newWindow.document.write(`<img src="${dataUrl}" alt="${docName}" style="max-width: 100%; height: auto; display: block; margin: auto;">`);
-                            newWindow.document.title = docName;
-                        } else if (mimetype === 'application/pdf') {
-                            newWindow.document.write(`
-                                <!DOCTYPE html>
-                                <html lang="en">
-                                <head>
-                                    <meta charset="UTF-8">
-                                    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-                                    <title>${docName} - PDF Viewer</title>
-                                    <style>
-                                        body { margin: 0; padding: 0; overflow: hidden; }
-                                        iframe { width: 100vw; height: 100vh; border: none; }
-                                    </style>
-                                </head>
-                                <body>
-                                    <iframe src="${dataUrl}"></iframe>
-                                </body>
-                                </html>
-                            `);
-                            newWindow.document.title = docName;
-                        } else {
-                            // For other file types, offer download
-                            const downloadLink = document.createElement('a');
-                            downloadLink.href = dataUrl;
-                            downloadLink.download = docName || `document.${mimetype.split('/')[1] || 'bin'}`;
-                            newWindow.document.body.appendChild(downloadLink);
-                            downloadLink.click();
-                            newWindow.document.body.removeChild(downloadLink);
-                            newWindow.close(); // Close the blank window if it's not needed
-                            showCustomModal("Download Initiated", `Attempting to download ${docName || 'document'}.`);
+                if (url && mimetype) {
+                    if (mimetype.startsWith('image/') || mimetype === 'application/pdf') {
+                        // The browser renders images and PDFs inline straight from the download endpoint
+                        const newWindow = window.open(url, '_blank');
+                        if (!newWindow) {
+                            showCustomModal("Error", "Could not open a new window to view document. Pop-ups might be blocked.");
                         }
                     } else {
-                        showCustomModal("Error", "Could not open a new window to view document. Pop-ups might be blocked.");
+                        // For other file types, offer download
+                        const downloadLink = document.createElement('a');
+                        downloadLink.href = `${url}?download=1`;
+                        downloadLink.download = docName || `document.${mimetype.split('/')[1] || 'bin'}`;
+                        document.body.appendChild(downloadLink);
+                        downloadLink.click();
+                        document.body.removeChild(downloadLink);
+                        showCustomModal("Download Initiated", `Attempting to download ${docName || 'document'}.`);
                     }
                 } else {
                     showCustomModal("Error", "Document content is not available for viewing.");
@@ -633,44 +686,20 @@ document.addEventListener("DOMContentLoaded", function() {
                 return;
             }
 
-            // Convert file to Base64
-            const reader = new FileReader();
-            reader.readAsDataURL(file);
-            reader.onload = async () => {
-                const base64Content = reader.result.split(',')[1]; // Get base64 string without prefix
-                const mimeType = file.type;
-
-                const data = {
-                    documentName: documentName,
-                    fileContentBase64: base64Content,
-                    fileMimeType: mimeType,
-                    expiryDate: expiryDate
-                };
-
-                try {
-                    const response = await fetch(`/api/vehicles/${vehicleId}/documents`, {
-                        method: 'POST',
-                        headers: { 'Content-Type': 'application/json' },
-                        body: JSON.stringify(data)
-                    });
-                    const result = await response.json();
-
-                    if (response.ok) {
-                        showCustomModal("Success", "Document uploaded successfully!");
-                        addDocumentForm.reset();
-                        fetchVehicleDetails(); // Refresh the details page
-                    } else {
-                        throw new Error(result.error || "Failed to upload document.");
-                    }
-                } catch (error) {
-                    console.error("Error uploading document:", error);
-                    showCustomModal("Error", `Failed to upload document: ${error.message}`);
-                }
-            };
-            reader.onerror = (error) => {
-                console.error("Error reading file:", error);
-                showCustomModal("File Error", "Failed to read the document file.");
-            };
+            // The file is sent as-is (multipart or resumable chunks), never as base64
+            try {
+                await uploadFile(
+                    `/api/vehicles/${vehicleId}/documents`, 'file', file,
+                    { documentName: documentName, fileMimeType: file.type, expiryDate: expiryDate },
+                    { vehicleId: vehicleId, kind: 'document', fileName: documentName, expiryDate: expiryDate }
+                );
+                showCustomModal("Success", "Document uploaded successfully!");
+                addDocumentForm.reset();
+                fetchVehicleDetails(); // Refresh the details page
+            } catch (error) {
+                console.error("Error uploading document:", error);
+                showCustomModal("Error", `Failed to upload document: ${error.message}`);
+            }
         });
     } else {
         console.error("Error: addDocumentForm not found.");
@@ -683,8 +712,8 @@ document.addEventListener("DOMContentLoaded", function() {
     if (cancelEditDetailsBtn) {
         cancelEditDetailsBtn.addEventListener('click', () => {
             toggleEditMode(false);
-            newMainImageBase64 = null; // Reset image upload state
-            newMainImageMimeType = null;
+            newMainImageFile = null; // Reset image upload state
+            mainImageRemoved = false;
             fetchVehicleDetails(); // Re-fetch to revert any unsaved changes
         });
     }
@@ -703,17 +732,11 @@ document.addEventListener("DOMContentLoaded", function() {
                 fuelLevel: editFuelLevel.value // Get value from the fuel level select
             };
 
-            // Add image data if a new image was selected or if the current one was removed
-            if (newMainImageBase64 !== null) { // Only include if it was set (new image or clear)
-                updatedData.mainImageBase64 = newMainImageBase64;
-                updatedData.mainImageMimeType = newMainImageMimeType;
-            } else {
-                // If newMainImageBase64 is still null, it means no new image was selected
-                // and the remove button was not explicitly clicked. In this case,
-                // we should NOT send the image fields in the PUT request payload
-                // so the backend preserves the existing image data.
-                // The backend handles 'empty string' as NULL, but 'undefined' or
-                // 'missing key' means no change.
+            // An empty mainImageBase64 clears the image. A newly selected image is uploaded
+            // separately after the details are saved; without either, the image is left unchanged.
+            if (mainImageRemoved && !newMainImageFile) {
+                updatedData.mainImageBase64 = "";
+                updatedData.mainImageMimeType = "";
             }
 
 
@@ -737,10 +760,16 @@ document.addEventListener("DOMContentLoaded", function() {
                 const result = await response.json();
 
                 if (response.ok) {
+                    if (newMainImageFile) {
+                        await uploadFile(
+                            `/api/vehicles/${vehicleId}/image`, 'image', newMainImageFile, {},
+                            { vehicleId: vehicleId, kind: 'image' }
+                        );
+                    }
                     showCustomModal("Success", result.message || "Vehicle details updated successfully!");
                     toggleEditMode(false); // Switch back to display mode
-                    newMainImageBase64 = null; // Reset image upload state
-                    newMainImageMimeType = null;
+                    newMainImageFile = null; // Reset image upload state
+                    mainImageRemoved = false;
                     fetchVehicleDetails(); // Refresh to show updated data
                 } else {
                     // Display full error details from backend if available
@@ -759,18 +788,11 @@ document.addEventListener("DOMContentLoaded", function() {
         mainImageUpload.addEventListener('change', (e) => {
             const file = e.target.files[0];
             if (file) {
-                const reader = new FileReader();
-                reader.readAsDataURL(file);
-                reader.onload = () => {
-                    if (mainVehicleImage) mainVehicleImage.src = reader.result;
-                    newMainImageBase64 = reader.result.split(',')[1];
-                    newMainImageMimeType = file.type;
-                    if (removeMainImageBtn) removeMainImageBtn.style.display = 'inline-block'; // Show remove button
-                };
-                reader.onerror = (error) => {
-                    console.error("Error reading main image file:", error);
-                    showCustomModal("Image Upload Error", "Failed to read the selected image file.");
-                };
+                // Preview straight from the file; it is uploaded when the details are saved
+                if (mainVehicleImage) mainVehicleImage.src = URL.createObjectURL(file);
+                newMainImageFile = file;
+                mainImageRemoved = false;
+                if (removeMainImageBtn) removeMainImageBtn.style.display = 'inline-block'; // Show remove button
             }
         });
     }
@@ -779,8 +801,8 @@ document.addEventListener("DOMContentLoaded", function() {
     if (removeMainImageBtn) {
         removeMainImageBtn.addEventListener('click', () => {
             if (mainVehicleImage) mainVehicleImage.src = "https://placehold.co/400x250/E0E6ED/7F8C8D?text=Vehicle+Image"; // Reset to placeholder
-            newMainImageBase64 = ""; // Explicitly set to empty string to clear in DB
-            newMainImageMimeType = ""; // Explicitly set to empty string to clear in DB
+            newMainImageFile = null;
+            mainImageRemoved = true; // Sent as an empty image on save, which clears it in the DB
             if (removeMainImageBtn) removeMainImageBtn.style.display = 'none'; // Hide remove button
         });
     }
@@ -0,0 +1,308 @@
+# storage.py
+"""
+Content-addressed document storage.
+
+Document (and vehicle image) bytes are stored once per SHA-256 digest, no
+matter how many rows reference them. Every stored blob has a row in
+document_blobs; the bytes themselves live either in document_blob_chunks
+(bytea, the default) or in a local directory, depending on DOCUMENT_STORE.
+
+All methods take the caller's cursor so that storing or releasing a blob is
+part of the same transaction as the vehicle_documents change.
+"""
+import io
+import os
+import uuid
+import hashlib
+import tempfile
+
+from db import transaction, read_transaction
+
+# --- Storage Configuration ---
+DOCUMENT_STORE = os.environ.get("DOCUMENT_STORE", "database")  # 'database' or 'filesystem'
+DOCUMENT_STORE_PATH = os.environ.get(
+    "DOCUMENT_STORE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "document_store"),
+)
+CHUNK_SIZE = 256 * 1024  # Bytes per bytea row / read buffer (must not change once blobs are stored)
+
+def external_storage(table, column):
+    """
+    Statement storing `column` out of line and uncompressed. ALTER TABLE locks
+    out writers, so the lock is only taken when the setting is still missing.
+    """
+    return f"""
+    DO $$
+    BEGIN
+        IF EXISTS (SELECT 1 FROM pg_attribute
+                   WHERE attrelid = '{table}'::regclass AND attname = '{column}' AND attstorage <> 'e') THEN
+            ALTER TABLE {table} ALTER COLUMN {column} SET STORAGE EXTERNAL;
+        END IF;
+    END $$;
+    """
+
+
+STORAGE_TABLES = [
+    """
+    CREATE TABLE IF NOT EXISTS document_blobs (
+        sha256 VARCHAR(64) PRIMARY KEY,
+        size BIGINT NOT NULL,
+        storage VARCHAR(20) NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS document_blob_chunks (
+        sha256 VARCHAR(64) NOT NULL,
+        seq INTEGER NOT NULL,
+        data BYTEA NOT NULL,
+        PRIMARY KEY (sha256, seq),
+        FOREIGN KEY (sha256) REFERENCES document_blobs(sha256) ON DELETE CASCADE ON UPDATE CASCADE
+    );
+    """,
+    # Chunks are already bounded in size and documents are mostly compressed formats
+    external_storage("document_blob_chunks", "data"),
+    "ALTER TABLE vehicle_documents ADD COLUMN IF NOT EXISTS content_sha256 VARCHAR(64);",
+    "ALTER TABLE vehicle_documents ADD COLUMN IF NOT EXISTS file_size BIGINT;",
+    "ALTER TABLE vehicle_documents ALTER COLUMN file_content_base64 DROP NOT NULL;",
+]
+
+# (index name, table, column list), built concurrently by migration 1
+STORAGE_INDEXES = [
+    ("idx_vehicle_documents_content_sha256", "vehicle_documents", "content_sha256"),
+]
+
+
+# Columns that may reference a blob; a blob is deleted once none of them do
+BLOB_REFERENCES = [
+    ("vehicle_documents", "content_sha256"),
+    ("vehicle_images", "content_sha256"),
+]
+
+
+def lock_digest(cur, sha256):
+    """
+    Serializes writers and releasers of the same digest until the end of the
+    transaction, so a blob is never deleted while another transaction is about
+    to reference it.
+    """
+    cur.execute("SELECT pg_advisory_xact_lock(%s);", (int(sha256[:15], 16),))
+
+
+class DocumentStore:
+    """Base class for content-addressed blob stores."""
+
+    name = None
+
+    def put(self, cur, data):
+        """Stores `data` (bytes) and returns (sha256, size)."""
+        return self.put_stream(cur, io.BytesIO(data))
+
+    def put_stream(self, cur, fileobj):
+        """Stores everything read from `fileobj` in CHUNK_SIZE pieces and returns (sha256, size)."""
+        raise NotImplementedError
+
+    def iter_chunks(self, cur, sha256):
+        """Yields the blob's bytes in order, one chunk at a time."""
+        raise NotImplementedError
+
+    def get(self, cur, sha256):
+        """Returns the whole blob as bytes."""
+        return b"".join(self.iter_chunks(cur, sha256))
+
+    def iter_range(self, sha256, start, stop):
+        """
+        Yields bytes [start, stop) of a blob for streaming responses. Runs
+        outside the caller's transaction so a slow client never holds a
+        pooled connection for the whole download.
+        """
+        raise NotImplementedError
+
+    def exists(self, cur, sha256):
+        cur.execute("SELECT 1 FROM document_blobs WHERE sha256 = %s;", (sha256,))
+        return cur.fetchone() is not None
+
+    def release(self, cur, sha256):
+        """Deletes the blob if no document or vehicle image references it any more."""
+        if not sha256:
+            return
+        lock_digest(cur, sha256)
+        unreferenced = " AND ".join(
+            f"NOT EXISTS (SELECT 1 FROM {table} WHERE {column} = %(sha256)s)"
+            for table, column in BLOB_REFERENCES
+        )
+        cur.execute(f"DELETE FROM document_blobs WHERE sha256 = %(sha256)s AND {unreferenced};",
+                    {"sha256": sha256})
+
+    def _register(self, cur, sha256, size):
+        """Records a blob; returns False if it was already stored."""
+        cur.execute("""
+            INSERT INTO document_blobs (sha256, size, storage) VALUES (%s, %s, %s)
+            ON CONFLICT (sha256) DO NOTHING;
+        """, (sha256, size, self.name))
+        return cur.rowcount == 1
+
+
+class DatabaseDocumentStore(DocumentStore):
+    """Stores blobs as fixed-size bytea chunks in document_blob_chunks."""
+
+    name = "database"
+
+    def put_stream(self, cur, fileobj):
+        # Chunks are written under a temporary key while the digest is computed,
+        # then re-keyed (or dropped, if the content is already stored).
+        staging_key = f"staging-{uuid.uuid4().hex}"
+        cur.execute("INSERT INTO document_blobs (sha256, size, storage) VALUES (%s, 0, %s);",
+                    (staging_key, self.name))
+        digest = hashlib.sha256()
+        size = 0
+        seq = 0
+        while True:
+            chunk = fileobj.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+            size += len(chunk)
+            cur.execute("INSERT INTO document_blob_chunks (sha256, seq, data) VALUES (%s, %s, %s);",
+                        (staging_key, seq, chunk))
+            seq += 1
+
+        sha256 = digest.hexdigest()
+        lock_digest(cur, sha256)
+        if self.exists(cur, sha256):
+            cur.execute("DELETE FROM document_blobs WHERE sha256 = %s;", (staging_key,))
+        else:
+            cur.execute("UPDATE document_blobs SET sha256 = %s, size = %s WHERE sha256 = %s;",
+                        (sha256, size, staging_key))
+        return sha256, size
+
+    def iter_chunks(self, cur, sha256):
+        cur.execute("SELECT COUNT(*) FROM document_blob_chunks WHERE sha256 = %s;", (sha256,))
+        chunk_count = cur.fetchone()[0]
+        # One chunk per query keeps memory bounded for large blobs
+        for seq in range(chunk_count):
+            cur.execute("SELECT data FROM document_blob_chunks WHERE sha256 = %s AND seq = %s;",
+                        (sha256, seq))
+            yield bytes(cur.fetchone()[0])
+
+    CHUNK_QUERY = "SELECT data FROM document_blob_chunks WHERE sha256 = %s AND seq = %s;"
+
+    def iter_range(self, sha256, start, stop):
+        for seq, chunk_start in self.chunks_in_range(start, stop):
+            with read_transaction() as cur:
+                cur.execute(self.CHUNK_QUERY, (sha256, seq))
+                row = cur.fetchone()
+                on_replica = cur.connection.readonly
+            if row is None and on_replica:
+                # A replica that lags behind the one the metadata came from may not have the blob yet
+                with transaction() as cur:
+                    cur.execute(self.CHUNK_QUERY, (sha256, seq))
+                    row = cur.fetchone()
+            yield self.slice_chunk(sha256, seq, chunk_start, row, start, stop)
+
+    @staticmethod
+    def chunks_in_range(start, stop):
+        """Chunks are fixed-size, so a byte range maps directly onto (seq, offset of the chunk) pairs."""
+        return [(seq, seq * CHUNK_SIZE) for seq in range(start // CHUNK_SIZE, (stop - 1) // CHUNK_SIZE + 1)]
+
+    @staticmethod
+    def slice_chunk(sha256, seq, chunk_start, row, start, stop):
+        """Returns the part of a CHUNK_QUERY row that falls inside [start, stop)."""
+        if row is None:
+            raise IOError(f"Blob {sha256} is missing chunk {seq}")
+        data = bytes(row[0])
+        return data[max(start - chunk_start, 0):min(stop - chunk_start, len(data))]
+
+
+class FileSystemDocumentStore(DocumentStore):
+    """
+    Stores blobs as files under DOCUMENT_STORE_PATH/<aa>/<bb>/<sha256>.
+
+    Files are not removed inside the request transaction (a rollback could not
+    restore them); release() only drops the document_blobs row and
+    `python migrate_documents.py --gc` deletes the orphaned files.
+    """
+
+    name = "filesystem"
+
+    def __init__(self, root=DOCUMENT_STORE_PATH):
+        self.root = root
+
+    def path_for(self, sha256):
+        return os.path.join(self.root, sha256[:2], sha256[2:4], sha256)
+
+    def put_stream(self, cur, fileobj):
+        staging_dir = os.path.join(self.root, "staging")
+        os.makedirs(staging_dir, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        fd, staging_path = tempfile.mkstemp(dir=staging_dir)
+        try:
+            with os.fdopen(fd, "wb") as staging_file:
+                while True:
+                    chunk = fileobj.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    size += len(chunk)
+                    staging_file.write(chunk)
+                staging_file.flush()
+                os.fsync(staging_file.fileno())
+
+            sha256 = digest.hexdigest()
+            lock_digest(cur, sha256)
+            final_path = self.path_for(sha256)
+            if os.path.exists(final_path):
+                os.utime(final_path)  # Keeps the file out of the --gc grace period
+            else:
+                os.makedirs(os.path.dirname(final_path), exist_ok=True)
+                os.replace(staging_path, final_path)
+            self._register(cur, sha256, size)
+            return sha256, size
+        finally:
+            if os.path.exists(staging_path):
+                os.remove(staging_path)
+
+    def iter_chunks(self, cur, sha256):
+        with open(self.path_for(sha256), "rb") as blob_file:
+            while True:
+                chunk = blob_file.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+
+    def iter_range(self, sha256, start, stop):
+        with open(self.path_for(sha256), "rb") as blob_file:
+            blob_file.seek(start)
+            remaining = stop - start
+            while remaining > 0:
+                chunk = blob_file.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+
+
+STORES = {
+    DatabaseDocumentStore.name: DatabaseDocumentStore,
+    FileSystemDocumentStore.name: FileSystemDocumentStore,
+}
+
+_store = None
+
+
+def get_document_store():
+    """Returns the store configured by DOCUMENT_STORE."""
+    global _store
+    if _store is None:
+        if DOCUMENT_STORE not in STORES:
+            raise ValueError(f"Unknown DOCUMENT_STORE '{DOCUMENT_STORE}'. Use one of: {', '.join(STORES)}")
+        _store = STORES[DOCUMENT_STORE]()
+    return _store
+
+
+def get_store_for(storage):
+    """Returns the store that holds blobs recorded with the given document_blobs.storage value."""
+    if storage == get_document_store().name:
+        return get_document_store()
+    return STORES[storage]()
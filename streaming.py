@@ -0,0 +1,88 @@
+# streaming.py
+"""
+HTTP helpers for serving stored blobs.
+
+Builds streaming responses with Content-Length, single-range requests
+(HTTP 206/416) and ETag-based conditional GETs (HTTP 304).
+"""
+from urllib.parse import quote
+
+from flask import Response, request
+
+
+def content_disposition(filename, attachment=False):
+    """Builds a Content-Disposition header value that is safe for any file name."""
+    disposition = "attachment" if attachment else "inline"
+    ascii_name = filename.encode("ascii", "ignore").decode("ascii").replace('"', "") or "download"
+    return f"{disposition}; filename=\"{ascii_name}\"; filename*=UTF-8''{quote(filename)}"
+
+
+def resolve_range(range_header, if_range, etag, size):
+    """
+    Returns the (start, stop) byte range the client asked for, None for the
+    whole body, or False if the range cannot be satisfied. Takes the parsed
+    (werkzeug) Range and If-Range headers.
+    """
+    if range_header is None:
+        return None
+    # If-Range: only honour the range when the client's copy is still current
+    if if_range.etag is not None and if_range.etag != etag:
+        return None
+    if if_range.date is not None:
+        return None
+    if range_header.units != "bytes" or len(range_header.ranges) != 1:
+        return None
+    byte_range = range_header.range_for_length(size)
+    return byte_range if byte_range is not None else False
+
+
+def blob_headers(etag, filename=None, attachment=False, cache_control="private, no-cache"):
+    """Headers common to every response of blob_response()."""
+    headers = {
+        "ETag": f'"{etag}"',
+        "Accept-Ranges": "bytes",
+        "Cache-Control": cache_control,
+    }
+    if filename:
+        headers["Content-Disposition"] = content_disposition(filename, attachment)
+    return headers
+
+
+def plan_blob_response(headers, size, etag, if_none_match, range_header, if_range):
+    """
+    Decides how a blob request is answered from its parsed conditional and
+    Range headers. Returns (status, start, stop); `headers` gains
+    Content-Range / Content-Length as needed. A 304 or 416 has no body.
+    """
+    if if_none_match.contains(etag):
+        return 304, 0, 0
+
+    byte_range = resolve_range(range_header, if_range, etag, size)
+    if byte_range is False:
+        headers["Content-Range"] = f"bytes */{size}"
+        return 416, 0, 0
+
+    status = 200
+    start, stop = 0, size
+    if byte_range is not None:
+        start, stop = byte_range
+        status = 206
+        headers["Content-Range"] = f"bytes {start}-{stop - 1}/{size}"
+    headers["Content-Length"] = str(stop - start)
+    return status, start, stop
+
+
+def blob_response(chunks_for_range, size, etag, mimetype, filename=None,
+                  attachment=False, cache_control="private, no-cache"):
+    """
+    Streams a blob. `chunks_for_range(start, stop)` must return an iterator
+    over bytes [start, stop) and is only called when a body is sent.
+    """
+    headers = blob_headers(etag, filename, attachment, cache_control)
+    status, start, stop = plan_blob_response(headers, size, etag, request.if_none_match, request.range,
+                                             request.if_range)
+    if status in (304, 416):
+        return Response(status=status, headers=headers)
+
+    body = chunks_for_range(start, stop) if stop > start else iter(())
+    return Response(body, status=status, headers=headers, mimetype=mimetype, direct_passthrough=True)
@@ -0,0 +1,262 @@
+# telemetry.py
+"""
+Fuel telemetry ingestion with write coalescing.
+
+Telematics boxes report fuel level (and the last fuelling date) every few
+seconds. Writing each reading through PUT /api/vehicles/<id> would cost a
+transaction, a revision bump and an alert refresh per reading, and would
+invalidate every cached /api/cars response just as often.
+
+Instead, POST /api/telemetry/fuel only records readings in a per-process
+buffer and returns 202. Readings of one vehicle are coalesced, so only the
+latest level (and the latest fuelling date reported) is kept. A flusher
+thread writes the buffer every TELEMETRY_FLUSH_SECONDS in batched UPDATEs.
+Vehicles whose values did not change are not written. Changed vehicles get
+their alerts refreshed and a vehicle.updated event, just as an edit does.
+
+The buffer holds at most TELEMETRY_MAX_PENDING vehicles. Readings for
+further vehicles are dropped and counted, as are readings lost when a
+flush fails twice. Readings still buffered when a worker is killed are
+lost, which the next report from the vehicle makes good.
+"""
+import os
+import time
+import atexit
+import threading
+from datetime import date
+
+from psycopg2.extras import execute_values
+
+from db import transaction
+from alerts import VEHICLE_LIST_COLUMNS, serialize_vehicle_summary, refresh_vehicle_alerts
+from events import publish
+
+# --- Telemetry Configuration ---
+TELEMETRY_FLUSH_SECONDS = float(os.environ.get("TELEMETRY_FLUSH_SECONDS", 2))  # Interval between flushes
+TELEMETRY_FLUSH_BATCH = int(os.environ.get("TELEMETRY_FLUSH_BATCH", 1000))  # Vehicles per UPDATE transaction
+TELEMETRY_MAX_PENDING = int(os.environ.get("TELEMETRY_MAX_PENDING", 100000))  # Vehicles buffered per worker
+MAX_TELEMETRY_BATCH = int(os.environ.get("TELEMETRY_MAX_BATCH", 10000))  # Readings per request
+MAX_FUEL_LEVEL_LENGTH = 50
+# More changed vehicles than this in one batch are announced with a single resync event
+MAX_TELEMETRY_EVENTS = 100
+
+
+def clean_reading(reading):
+    """
+    Validates one reading. Returns ((vehicle_id, fuel_level, last_fueled_date), None)
+    or (None, error message).
+    """
+    if not isinstance(reading, dict):
+        return None, "Each reading must be a JSON object"
+    try:
+        vehicle_id = int(reading.get('vehicleId'))
+    except (TypeError, ValueError):
+        return None, "vehicleId must be an integer"
+    fuel_level = reading.get('fuelLevel')
+    if not isinstance(fuel_level, str) or not fuel_level.strip() or len(fuel_level) > MAX_FUEL_LEVEL_LENGTH:
+        return None, f"fuelLevel must be a string of at most {MAX_FUEL_LEVEL_LENGTH} characters"
+    last_fueled_date = reading.get('lastFueledDate') or None
+    if last_fueled_date is not None:
+        try:
+            # Telematics feeds send timestamps; only the date is kept
+            last_fueled_date = date.fromisoformat(str(last_fueled_date)[:10])
+        except ValueError:
+            return None, "lastFueledDate must be an ISO date (YYYY-MM-DD)"
+    return (vehicle_id, fuel_level, last_fueled_date), None
+
+
+def parse_readings(payload):
+    """
+    Validates a request body: one reading or a list of them. Returns the
+    cleaned readings; raises ValueError naming the first invalid one.
+    """
+    readings = payload if isinstance(payload, list) else [payload]
+    if not readings:
+        raise ValueError("No readings provided")
+    if len(readings) > MAX_TELEMETRY_BATCH:
+        raise ValueError(f"At most {MAX_TELEMETRY_BATCH} readings per request")
+    cleaned = []
+    for index, reading in enumerate(readings):
+        row, error = clean_reading(reading)
+        if error is not None:
+            raise ValueError(f"Reading {index}: {error}")
+        cleaned.append(row)
+    return cleaned
+
+
+def apply_fuel_readings(cur, readings):
+    """
+    Writes coalesced (vehicle_id, fuel_level, last_fueled_date) readings in the
+    caller's transaction, leaving unchanged vehicles untouched. Returns the ids
+    of the vehicles that changed.
+    """
+    if not readings:
+        return []
+    readings = sorted(readings)
+    # Row locks in id order, so concurrent flushes from several workers cannot deadlock
+    cur.execute("SELECT id FROM vehicles WHERE id = ANY(%s) ORDER BY id FOR NO KEY UPDATE;",
+                ([reading[0] for reading in readings],))
+    changed = execute_values(cur, """
+        UPDATE vehicles v
+        SET fuel_level = r.fuel_level,
+            last_fueled_date = COALESCE(r.last_fueled_date, v.last_fueled_date),
+            updated_at = CURRENT_TIMESTAMP
+        FROM (VALUES %s) AS r (id, fuel_level, last_fueled_date)
+        WHERE v.id = r.id
+          AND (v.fuel_level IS DISTINCT FROM r.fuel_level
+               OR (r.last_fueled_date IS NOT NULL AND v.last_fueled_date IS DISTINCT FROM r.last_fueled_date))
+        RETURNING v.id;
+    """, readings, template="(%s, %s, %s::date)", page_size=len(readings), fetch=True)
+    vehicle_ids = sorted(row[0] for row in changed)
+    if not vehicle_ids:
+        return []
+    # Only a fuel level change can raise or clear an alert, but the refresh is cheap next to the write
+    refresh_vehicle_alerts(cur, vehicle_ids)
+    if len(vehicle_ids) > MAX_TELEMETRY_EVENTS:
+        publish(cur, "resync", {})
+    else:
+        cur.execute(f"SELECT {VEHICLE_LIST_COLUMNS} FROM vehicles WHERE id = ANY(%s) ORDER BY id;", (vehicle_ids,))
+        for row in cur.fetchall():
+            publish(cur, "vehicle.updated", serialize_vehicle_summary(row))
+    return vehicle_ids
+
+
+class FuelTelemetryBuffer:
+    """Per-process buffer of the latest fuel reading of each vehicle, flushed by a background thread."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}  # vehicle_id -> [fuel_level, last_fueled_date, first buffered at, retried]
+        self._thread = None
+        self._pid = None
+        self._counters = {
+            "readings_received": 0,
+            "readings_coalesced": 0,
+            "readings_dropped": 0,
+            "vehicles_written": 0,
+            "vehicles_unchanged": 0,
+            "flushes": 0,
+            "flush_errors": 0,
+        }
+        self._last_flush = {"at": None, "seconds": None, "lag_seconds": None}
+
+    def add(self, readings):
+        """Buffers cleaned readings, later ones replacing earlier ones of the same vehicle."""
+        self._ensure_flusher()
+        now = time.monotonic()
+        with self._lock:
+            self._counters["readings_received"] += len(readings)
+            for vehicle_id, fuel_level, last_fueled_date in readings:
+                self._merge(vehicle_id, fuel_level, last_fueled_date, now, False)
+
+    def _merge(self, vehicle_id, fuel_level, last_fueled_date, buffered_at, retried):
+        # Caller holds the lock
+        entry = self._pending.get(vehicle_id)
+        if entry is None:
+            if len(self._pending) >= TELEMETRY_MAX_PENDING:
+                self._counters["readings_dropped"] += 1
+                return
+            self._pending[vehicle_id] = [fuel_level, last_fueled_date, buffered_at, retried]
+            return
+        self._counters["readings_coalesced"] += 1
+        if retried:
+            # A failed flush's reading is older than whatever arrived since; keep only its missing date
+            if entry[1] is None:
+                entry[1] = last_fueled_date
+        else:
+            entry[0] = fuel_level
+            entry[1] = last_fueled_date or entry[1]
+            entry[3] = False
+        entry[2] = min(entry[2], buffered_at)
+
+    def flush(self):
+        """Writes everything buffered, TELEMETRY_FLUSH_BATCH vehicles per transaction. Returns vehicles written."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        started = time.monotonic()
+        oldest = min(entry[2] for entry in pending.values())
+        vehicle_ids = sorted(pending)
+        written = 0
+        for start in range(0, len(vehicle_ids), TELEMETRY_FLUSH_BATCH):
+            batch = vehicle_ids[start:start + TELEMETRY_FLUSH_BATCH]
+            readings = [(vehicle_id, pending[vehicle_id][0], pending[vehicle_id][1]) for vehicle_id in batch]
+            try:
+                with transaction() as cur:
+                    changed = len(apply_fuel_readings(cur, readings))
+            except Exception as e:
+                print(f"Error flushing fuel telemetry for {len(batch)} vehicles: {e}")
+                self._requeue(pending, batch)
+                continue
+            written += changed
+            with self._lock:
+                self._counters["vehicles_written"] += changed
+                self._counters["vehicles_unchanged"] += len(batch) - changed
+        finished = time.monotonic()
+        with self._lock:
+            self._counters["flushes"] += 1
+            self._last_flush = {"at": time.time(), "seconds": finished - started, "lag_seconds": finished - oldest}
+        return written
+
+    def _requeue(self, pending, batch):
+        """Puts the readings of a failed batch back for the next flush; a second failure drops them."""
+        with self._lock:
+            self._counters["flush_errors"] += 1
+            for vehicle_id in batch:
+                fuel_level, last_fueled_date, buffered_at, retried = pending[vehicle_id]
+                if retried:
+                    self._counters["readings_dropped"] += 1
+                else:
+                    self._merge(vehicle_id, fuel_level, last_fueled_date, buffered_at, True)
+
+    def stats(self):
+        """Counters since start, plus the current and last flush lag, in seconds."""
+        now = time.monotonic()
+        with self._lock:
+            oldest = min((entry[2] for entry in self._pending.values()), default=None)
+            return {
+                **self._counters,
+                "pending_vehicles": len(self._pending),
+                # Age of the oldest reading not written yet (0 when nothing is buffered)
+                "flush_lag_seconds": round(now - oldest, 3) if oldest is not None else 0,
+                "last_flush_at": self._last_flush["at"],
+                "last_flush_seconds": self._last_flush["seconds"],
+                "last_flush_lag_seconds": self._last_flush["lag_seconds"],
+                "flushing": self._thread is not None and self._pid == os.getpid() and self._thread.is_alive(),
+            }
+
+    def _ensure_flusher(self):
+        # A forked worker inherits the object but not the thread
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            if self._pid != os.getpid():
+                self._pending = {}  # Readings of the parent process are flushed by the parent
+                self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="fuel-telemetry-flusher", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(TELEMETRY_FLUSH_SECONDS)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Fuel telemetry flusher error: {e}")
+
+
+_buffer = FuelTelemetryBuffer()
+
+
+def get_telemetry_buffer():
+    return _buffer
+
+
+@atexit.register
+def flush_on_exit():
+    """Writes what is still buffered when a worker shuts down cleanly."""
+    try:
+        _buffer.flush()
+    except Exception as e:
+        print(f"Error flushing fuel telemetry at exit: {e}")
@@ -0,0 +1,197 @@
+# uploads.py
+"""
+Streaming and resumable uploads.
+
+Multipart uploads are copied into the document store CHUNK_SIZE bytes at a
+time, so a worker never holds a whole file (or its base64 text) in memory.
+
+Resumable uploads are split into sessions: the client creates a session
+with the file's total size, then sends the bytes in any number of PATCH
+requests, each starting at the offset the server reports. Received bytes
+are kept in upload_chunks until the last one arrives, so an interrupted
+upload continues from where it stopped instead of restarting.
+"""
+import io
+import os
+import uuid
+
+from flask import request
+
+from storage import CHUNK_SIZE, external_storage
+
+# --- Upload Configuration ---
+MAX_UPLOAD_SIZE = int(os.environ.get("UPLOAD_MAX_SIZE", 25 * 1024 * 1024))  # Bytes per file
+MAX_UPLOAD_CHUNK_SIZE = int(os.environ.get("UPLOAD_MAX_CHUNK_SIZE", 8 * 1024 * 1024))  # Bytes per PATCH
+UPLOAD_SESSION_TTL_HOURS = float(os.environ.get("UPLOAD_SESSION_TTL_HOURS", 24))
+MULTIPART_OVERHEAD = 64 * 1024  # Room for form fields and part headers around the file
+UPLOAD_KINDS = ('document', 'image')
+
+UPLOAD_TABLES = [
+    """
+    CREATE TABLE IF NOT EXISTS upload_sessions (
+        id VARCHAR(32) PRIMARY KEY,
+        vehicle_id INTEGER NOT NULL,
+        kind VARCHAR(20) NOT NULL,
+        file_name VARCHAR(255) NOT NULL,
+        mime_type VARCHAR(255) NOT NULL,
+        expiry_date DATE,
+        total_size BIGINT NOT NULL,
+        received BIGINT NOT NULL DEFAULT 0,
+        chunk_count INTEGER NOT NULL DEFAULT 0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (vehicle_id) REFERENCES vehicles(id) ON DELETE CASCADE
+    );
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS upload_chunks (
+        upload_id VARCHAR(32) NOT NULL,
+        seq INTEGER NOT NULL,
+        data BYTEA NOT NULL,
+        PRIMARY KEY (upload_id, seq),
+        FOREIGN KEY (upload_id) REFERENCES upload_sessions(id) ON DELETE CASCADE
+    );
+    """,
+    external_storage("upload_chunks", "data"),
+]
+
+# (index name, table, column list), built concurrently by migration 1
+UPLOAD_INDEXES = [
+    ("idx_upload_sessions_updated_at", "upload_sessions", "updated_at"),
+]
+
+
+class UploadTooLarge(ValueError):
+    """Raised when an upload exceeds its size limit (HTTP 413)."""
+
+
+class UploadOffsetMismatch(ValueError):
+    """Raised when a chunk does not start where the session left off (HTTP 409)."""
+
+    def __init__(self, offset):
+        super().__init__(f"Upload is at offset {offset}")
+        self.offset = offset
+
+
+class LimitedReader:
+    """File-like wrapper that raises UploadTooLarge once more than `limit` bytes are read."""
+
+    def __init__(self, fileobj, limit):
+        self.fileobj = fileobj
+        self.limit = limit
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        # Never ask for more than one byte past the limit, so an oversized body is not buffered
+        remaining = self.limit - self.bytes_read + 1
+        data = self.fileobj.read(remaining if size is None or size < 0 else min(size, remaining))
+        self.bytes_read += len(data)
+        if self.bytes_read > self.limit:
+            raise UploadTooLarge(f"Upload exceeds the {self.limit} byte limit")
+        return data
+
+
+def check_request_size(limit):
+    """
+    Rejects a request body before it is read. Raises UploadTooLarge if the
+    declared Content-Length is above `limit`.
+    """
+    if request.content_length is not None and request.content_length > limit:
+        raise UploadTooLarge(f"Upload exceeds the {limit} byte limit")
+
+
+def base64_size(size):
+    """Length of the base64 text for `size` bytes; used to bound legacy JSON uploads."""
+    return (size + 2) // 3 * 4
+
+
+def purge_expired_sessions(cur):
+    """Drops resumable uploads that have not received data within UPLOAD_SESSION_TTL_HOURS."""
+    cur.execute("DELETE FROM upload_sessions WHERE updated_at < CURRENT_TIMESTAMP - %s * INTERVAL '1 hour';",
+                (UPLOAD_SESSION_TTL_HOURS,))
+    return cur.rowcount
+
+
+def create_session(cur, vehicle_id, kind, file_name, mime_type, total_size, expiry_date=None):
+    """Starts a resumable upload and returns its id."""
+    if kind not in UPLOAD_KINDS:
+        raise ValueError(f"Unknown upload kind '{kind}'. Use one of: {', '.join(UPLOAD_KINDS)}")
+    if total_size < 1:
+        raise ValueError("size must be a positive integer")
+    if total_size > MAX_UPLOAD_SIZE:
+        raise UploadTooLarge(f"Upload exceeds the {MAX_UPLOAD_SIZE} byte limit")
+    purge_expired_sessions(cur)
+    upload_id = uuid.uuid4().hex
+    cur.execute("""
+        INSERT INTO upload_sessions (id, vehicle_id, kind, file_name, mime_type, expiry_date, total_size)
+        VALUES (%s, %s, %s, %s, %s, %s, %s);
+    """, (upload_id, vehicle_id, kind, file_name, mime_type, expiry_date, total_size))
+    return upload_id
+
+
+def fetch_session(cur, upload_id, lock=False):
+    """Returns the session row as a dict, or None. lock=True serializes concurrent PATCHes."""
+    cur.execute(f"""
+        SELECT id, vehicle_id, kind, file_name, mime_type, expiry_date, total_size, received, chunk_count
+        FROM upload_sessions WHERE id = %s {'FOR UPDATE' if lock else ''};
+    """, (upload_id,))
+    row = cur.fetchone()
+    if row is None:
+        return None
+    keys = ('id', 'vehicle_id', 'kind', 'file_name', 'mime_type', 'expiry_date', 'total_size', 'received', 'chunk_count')
+    return dict(zip(keys, row))
+
+
+def append_chunk(cur, session, offset, stream):
+    """
+    Appends the bytes read from `stream` to a locked session. `offset` must
+    equal the bytes already received. Returns the new offset.
+    """
+    if offset != session['received']:
+        raise UploadOffsetMismatch(session['received'])
+    reader = LimitedReader(stream, min(session['total_size'] - offset, MAX_UPLOAD_CHUNK_SIZE))
+    received, seq = session['received'], session['chunk_count']
+    while True:
+        chunk = reader.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        cur.execute("INSERT INTO upload_chunks (upload_id, seq, data) VALUES (%s, %s, %s);",
+                    (session['id'], seq, chunk))
+        received += len(chunk)
+        seq += 1
+    cur.execute("""
+        UPDATE upload_sessions SET received = %s, chunk_count = %s, updated_at = CURRENT_TIMESTAMP
+        WHERE id = %s;
+    """, (received, seq, session['id']))
+    session['received'], session['chunk_count'] = received, seq
+    return received
+
+
+class SessionReader(io.RawIOBase):
+    """Reads a completed session's bytes back one stored chunk at a time."""
+
+    def __init__(self, cur, session):
+        self.cur = cur
+        self.session = session
+        self.seq = 0
+        self.buffer = b""
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        while (size is None or size < 0 or len(self.buffer) < size) and self.seq < self.session['chunk_count']:
+            self.cur.execute("SELECT data FROM upload_chunks WHERE upload_id = %s AND seq = %s;",
+                             (self.session['id'], self.seq))
+            self.buffer += bytes(self.cur.fetchone()[0])
+            self.seq += 1
+        if size is None or size < 0:
+            size = len(self.buffer)
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+
+def delete_session(cur, upload_id):
+    """Deletes a session and its received chunks. Returns False if it did not exist."""
+    cur.execute("DELETE FROM upload_sessions WHERE id = %s;", (upload_id,))
+    return cur.rowcount == 1
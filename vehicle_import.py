@@ -0,0 +1,236 @@
+# vehicle_import.py
+"""
+Bulk vehicle import.
+
+Rows are read from a CSV or NDJSON stream one at a time, validated with the
+same rules as /api/register_vehicle and loaded in batches: each batch is
+COPYed into a temporary staging table and moved into vehicles with a single
+INSERT ... ON CONFLICT (vin) DO NOTHING. Rows that fail validation or whose
+VIN is already taken are listed in the report instead of aborting the
+import, so memory use depends on the batch size, not on the file size.
+"""
+import io
+import os
+import csv
+import json
+
+from alerts import refresh_vehicle_alerts
+from events import publish
+
+# --- Import Configuration ---
+IMPORT_BATCH_SIZE = int(os.environ.get("IMPORT_BATCH_SIZE", 5000))  # Rows per COPY
+IMPORT_MAX_REPORTED_ROWS = int(os.environ.get("IMPORT_MAX_REPORTED_ROWS", 1000))  # Rejected rows listed in the report
+
+IMPORT_COLUMNS = ('model', 'year', 'make', 'vin', 'color', 'category', 'plate_number')
+REQUIRED_COLUMNS = ('model', 'year', 'make', 'vin', 'color', 'category')
+# Column sizes of the vehicles table; longer values would fail the whole COPY
+COLUMN_LIMITS = {'model': 255, 'make': 255, 'vin': 17, 'color': 100, 'category': 100, 'plate_number': 20}
+# Range of the INTEGER year column
+INT4_MIN, INT4_MAX = -2147483648, 2147483647
+
+IMPORT_FORMATS = {
+    'csv': ('text/csv', 'application/csv'),
+    'ndjson': ('application/x-ndjson', 'application/ndjson', 'application/jsonl', 'application/x-jsonlines'),
+}
+
+
+class ImportFormatError(ValueError):
+    """Raised when the file as a whole cannot be imported (HTTP 400)."""
+
+
+def detect_format(requested=None, mime_type=None, file_name=None):
+    """Picks the import format from an explicit ?format=, the file name or the content type."""
+    if requested:
+        if requested not in IMPORT_FORMATS:
+            raise ImportFormatError(f"Unknown import format '{requested}'. Use one of: {', '.join(IMPORT_FORMATS)}")
+        return requested
+    extension = os.path.splitext(file_name or "")[1].lower()
+    if extension == '.csv':
+        return 'csv'
+    if extension in ('.ndjson', '.jsonl'):
+        return 'ndjson'
+    mime_type = (mime_type or "").split(';')[0].strip().lower()
+    for name, mime_types in IMPORT_FORMATS.items():
+        if mime_type in mime_types:
+            return name
+    raise ImportFormatError("Cannot tell the import format; send text/csv or application/x-ndjson, or pass ?format=")
+
+
+def iter_csv_records(text):
+    """Yields (line, record, error) for each CSV row. The header names the columns."""
+    reader = csv.DictReader(text)
+    if reader.fieldnames is None:
+        return
+    reader.fieldnames = [name.strip().lower() for name in reader.fieldnames]
+    missing = [column for column in REQUIRED_COLUMNS if column not in reader.fieldnames]
+    if missing:
+        raise ImportFormatError(f"CSV header is missing required columns: {', '.join(missing)}")
+    for record in reader:
+        yield reader.line_num, record, None
+
+
+def iter_ndjson_records(text):
+    """Yields (line, record, error) for each non-blank NDJSON line."""
+    for line, raw in enumerate(text, start=1):
+        if not raw.strip():
+            continue
+        try:
+            record = json.loads(raw)
+        except ValueError as e:
+            yield line, None, f"Invalid JSON: {e}"
+            continue
+        if not isinstance(record, dict):
+            yield line, None, "Each line must be a JSON object"
+            continue
+        yield line, record, None
+
+
+RECORD_READERS = {'csv': iter_csv_records, 'ndjson': iter_ndjson_records}
+
+
+def iter_records(stream, import_format):
+    """Decodes a binary stream and yields (line, record, error) without reading it all into memory."""
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='' if import_format == 'csv' else None)
+    return RECORD_READERS[import_format](text)
+
+
+def clean_record(record):
+    """
+    Validates one record. Returns (row, None) with the row ordered as
+    IMPORT_COLUMNS, or (None, error message).
+    """
+    values = {}
+    for column in IMPORT_COLUMNS:
+        value = record.get(column)
+        if isinstance(value, str):
+            if '\x00' in value:
+                # Postgres text cannot hold NUL; COPY would abort the whole batch
+                return None, f"{column} must not contain NUL characters"
+            value = value.strip()
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            value = str(value)
+        elif value is not None:
+            return None, f"{column} must be a string"
+        values[column] = value or None
+
+    if not all(values[column] for column in REQUIRED_COLUMNS):
+        return None, "All fields are required"
+    if len(values['vin']) != 17:
+        return None, "VIN must be exactly 17 characters long"
+    try:
+        values['year'] = int(values['year'])
+    except ValueError:
+        return None, "year must be an integer"
+    if not INT4_MIN <= values['year'] <= INT4_MAX:
+        return None, "year is out of range"
+    for column, limit in COLUMN_LIMITS.items():
+        if values[column] is not None and len(values[column]) > limit:
+            return None, f"{column} must be at most {limit} characters long"
+    return tuple(values[column] for column in IMPORT_COLUMNS), None
+
+
+class ImportReport:
+    """Counts the outcome of every row and lists up to IMPORT_MAX_REPORTED_ROWS rejected ones."""
+
+    def __init__(self, max_reported=IMPORT_MAX_REPORTED_ROWS):
+        self.max_reported = max_reported
+        self.total = 0
+        self.imported = 0
+        self.duplicates = 0
+        self.invalid = 0
+        self.rejected = []
+
+    def reject(self, line, vin, reason, duplicate=False):
+        if duplicate:
+            self.duplicates += 1
+        else:
+            self.invalid += 1
+        if len(self.rejected) < self.max_reported:
+            self.rejected.append({"line": line, "vin": vin, "error": reason})
+
+    def to_dict(self):
+        return {
+            "rows": self.total,
+            "imported": self.imported,
+            "duplicates": self.duplicates,
+            "invalid": self.invalid,
+            "rejected": self.rejected,
+            "rejected_truncated": self.duplicates + self.invalid > len(self.rejected),
+        }
+
+
+STAGING_TABLE = """
+    CREATE TEMPORARY TABLE IF NOT EXISTS vehicle_import_staging (
+        line BIGINT NOT NULL,
+        model TEXT, year INTEGER, make TEXT, vin TEXT, color TEXT, category TEXT, plate_number TEXT
+    ) ON COMMIT DROP;
+"""
+
+# The first row of each VIN in the batch is inserted unless the VIN exists; every staged row
+# comes back with the id it was inserted as (or NULL) and the line that claimed its VIN.
+MOVE_STAGED_ROWS = """
+    WITH candidates AS (
+        SELECT DISTINCT ON (vin) line, model, year, make, vin, color, category, plate_number
+        FROM vehicle_import_staging ORDER BY vin, line
+    ), inserted AS (
+        INSERT INTO vehicles (model, year, make, vin, color, category, plate_number)
+        SELECT model, year, make, vin, color, category, plate_number FROM candidates ORDER BY line
+        ON CONFLICT (vin) DO NOTHING
+        RETURNING id, vin
+    )
+    SELECT s.line, s.vin, i.id, c.line
+    FROM vehicle_import_staging s
+    JOIN candidates c ON c.vin = s.vin
+    LEFT JOIN inserted i ON i.vin = s.vin
+    ORDER BY s.line;
+"""
+
+
+def load_batch(cur, batch, report):
+    """COPYs one batch of (line, *row) tuples into vehicles. Returns the ids of the inserted vehicles."""
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(batch)
+    buffer.seek(0)
+    cur.execute("TRUNCATE vehicle_import_staging;")
+    cur.copy_expert(f"COPY vehicle_import_staging (line, {', '.join(IMPORT_COLUMNS)}) FROM STDIN WITH (FORMAT csv);",
+                    buffer)
+    cur.execute(MOVE_STAGED_ROWS)
+    vehicle_ids = []
+    for line, vin, vehicle_id, first_line in cur.fetchall():
+        if line != first_line:
+            report.reject(line, vin, f"Duplicate VIN; already used on line {first_line}", duplicate=True)
+        elif vehicle_id is None:
+            report.reject(line, vin, "VIN already exists. Vehicle might be registered already.", duplicate=True)
+        else:
+            vehicle_ids.append(vehicle_id)
+    report.imported += len(vehicle_ids)
+    return vehicle_ids
+
+
+def import_vehicles(cur, records, batch_size=IMPORT_BATCH_SIZE):
+    """
+    Imports (line, record, error) tuples in the caller's transaction and
+    returns an ImportReport. Alerts of the new vehicles are stored as they
+    are loaded; live dashboards get one resync event instead of one event
+    per vehicle.
+    """
+    report = ImportReport()
+    cur.execute(STAGING_TABLE)
+    batch = []
+    for line, record, error in records:
+        report.total += 1
+        if error is None:
+            row, error = clean_record(record)
+        if error is not None:
+            vin = record.get('vin') if isinstance(record, dict) else None
+            report.reject(line, vin if isinstance(vin, str) else None, error)
+            continue
+        batch.append((line, *row))
+        if len(batch) >= batch_size:
+            refresh_vehicle_alerts(cur, load_batch(cur, batch, report), notify=False)
+            batch = []
+    if batch:
+        refresh_vehicle_alerts(cur, load_batch(cur, batch, report), notify=False)
+    if report.imported:
+        publish(cur, "resync", {})
+    return report
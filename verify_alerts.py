@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Alert Engine Verification Script for Logistics Application
+Generates a random fleet inside a transaction, runs both the original
+per-vehicle alert loop and the set-based alert engine over it, and checks that
+they produce identical alerts. It then checks that the persisted alerts table
+matches the engine, both right after a refresh and after each simulated daily
+rollover. The transaction is rolled back at the end, so no data is left behind.
+
+It is a manual check: run it against a migrated scratch database after
+changing the alert code. It exits with status 1 on the first mismatch:
+
+    python migrate.py
+    python verify_alerts.py --vehicles 500 --seed 42 --days 25
+"""
+
+import os
+import sys
+import random
+import argparse
+from datetime import date, timedelta
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+try:
+    from app import get_db_connection
+    from alerts import (VEHICLE_LIST_COLUMNS, serialize_vehicle_summary,
+                        build_fleet_alerts, legacy_fleet_alerts, refresh_vehicle_alerts,
+                        fetch_fleet_alerts, rollover_alerts)
+    import psycopg2.extras
+except ImportError as e:
+    print(f"❌ Import error: {e}")
+    print("Make sure you're running this script from your application directory")
+    sys.exit(1)
+
+MAKES = {
+    'Honda': ['Civic', 'Accord', 'CR-V'],
+    'Ford': ['F-150', 'Transit', 'Ranger'],
+    'Toyota': ['Camry', 'Hilux', 'Corolla'],
+    'Mercedes': ['Sprinter', 'Actros'],
+}
+CATEGORIES = ['Sedan', 'Truck', 'Van', 'SUV']
+FUEL_LEVELS = ['Full', 'Half', 'Low']
+DOCUMENT_NAMES = ['Insurance Certificate', 'Vehicle Registration', 'Road Worthiness', 'Permit']
+
+
+def generate_fleet(cur, vehicle_count, today, rng):
+    """Inserts a random fleet that exercises every alert branch."""
+    for i in range(vehicle_count):
+        make = rng.choice(list(MAKES))
+        cur.execute("""
+            INSERT INTO vehicles (model, year, make, vin, color, category, plate_number, fuel_level, last_fueled_date)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s) RETURNING id;
+        """, (rng.choice(MAKES[make]), rng.randint(2005, 2025), make, f"VERIFY{i:011d}",
+              'White', rng.choice(CATEGORIES), rng.choice([f"TST{i:05d}", None]),
+              rng.choice(FUEL_LEVELS), rng.choice([today - timedelta(days=rng.randint(0, 30)), None])))
+        vehicle_id = cur.fetchone()[0]
+
+        # Roughly a fifth of the fleet has never been serviced
+        for _ in range(rng.choice([0, 1, 1, 2, 4])):
+            cur.execute("""
+                INSERT INTO maintenance_logs (vehicle_id, log_type, log_date, notes)
+                VALUES (%s, %s, %s, %s);
+            """, (vehicle_id, 'Oil Change', today - timedelta(days=rng.randint(0, 40)), None))
+
+        # Expiry dates straddle every threshold, including the 0 and 10 day edges
+        for _ in range(rng.randint(0, 3)):
+            expiry = rng.choice([None, today - timedelta(days=rng.randint(1, 60)),
+                                 today + timedelta(days=rng.randint(0, 20))])
+            cur.execute("""
+                INSERT INTO vehicle_documents (vehicle_id, document_name, file_content_base64, file_mime_type, expiry_date)
+                VALUES (%s, %s, %s, %s, %s);
+            """, (vehicle_id, rng.choice(DOCUMENT_NAMES), 'JVBERi0xLjQK', 'application/pdf', expiry))
+
+
+def strip_timestamps(alerts):
+    """
+    The original loop stamps alerts with the request time, stored alerts with
+    the time they were raised; only the alerts themselves are compared.
+    """
+    return [{key: value for key, value in alert.items() if key != 'timestamp'} for alert in alerts]
+
+
+def per_vehicle_order(alerts, vehicles):
+    """
+    Orders each vehicle's alerts by content. The original loop reads a
+    vehicle's documents in no particular order, so only the set of alerts
+    of each vehicle (and the vehicle order) can be compared with it.
+    """
+    position = {vehicle['id']: index for index, vehicle in enumerate(vehicles)}
+    return sorted(alerts, key=lambda alert: (position[int(alert['id'].split('_', 1)[0])], sorted(alert.items())))
+
+
+def same_alerts(expected_label, expected, actual_label, actual):
+    """Prints the alert counts and the first difference; returns True if both lists are identical."""
+    print(f"   {expected_label}: {len(expected)} alerts")
+    print(f"   {actual_label}: {len(actual)} alerts")
+    if expected == actual:
+        return True
+    for index, (old, new) in enumerate(zip(expected, actual)):
+        if old != new:
+            print(f"❌ First difference at alert {index}:\n   expected: {old}\n   actual:   {new}")
+            break
+    else:
+        print("❌ Alert lists differ in length")
+    return False
+
+
+def verify(vehicle_count, seed, days):
+    """Returns True if all alert paths agree on a generated fleet."""
+    rng = random.Random(seed)
+    today = date.today()
+    conn = None
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
+
+        print(f"🚗 Generating {vehicle_count} vehicles (seed {seed})...")
+        generate_fleet(cur, vehicle_count, today, rng)
+
+        cur.execute(f"SELECT {VEHICLE_LIST_COLUMNS} FROM vehicles ORDER BY created_at DESC, id;")
+        vehicles = [serialize_vehicle_summary(row) for row in cur.fetchall()]
+
+        legacy = strip_timestamps(legacy_fleet_alerts(cur, vehicles, today))
+        fleet = strip_timestamps(build_fleet_alerts(cur, vehicles, today))
+
+        if not same_alerts("Original loop  ", per_vehicle_order(legacy, vehicles),
+                           "Set-based query", per_vehicle_order(fleet, vehicles)):
+            return False
+        print("✅ Both alert paths produce identical output.")
+
+        print("💾 Checking the persisted alerts table...")
+        refresh_vehicle_alerts(cur, [vehicle['id'] for vehicle in vehicles], today)
+        if not same_alerts("Set-based query", fleet, "Stored alerts  ", strip_timestamps(fetch_fleet_alerts(cur, vehicles))):
+            return False
+
+        # Each rollover only touches vehicles whose thresholds are crossed, yet must match a full recomputation
+        for offset in range(1, days + 1):
+            day = today + timedelta(days=offset)
+            refreshed = rollover_alerts(cur, day)
+            print(f"📅 Rollover to {day.isoformat()} re-evaluated {refreshed} vehicles")
+            expected = strip_timestamps(build_fleet_alerts(cur, vehicles, day))
+            if not same_alerts("Set-based query", expected, "Stored alerts  ", strip_timestamps(fetch_fleet_alerts(cur, vehicles))):
+                return False
+        print("✅ Stored alerts match the engine after every rollover.")
+        return True
+    except Exception as e:
+        print(f"❌ Error verifying alerts: {e}")
+        return False
+    finally:
+        if conn:
+            conn.rollback()
+            conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the original, set-based and persisted alert engines.")
+    parser.add_argument('--vehicles', type=int, default=500, help="Number of vehicles to generate")
+    parser.add_argument('--seed', type=int, default=42, help="Random seed for the generated fleet")
+    parser.add_argument('--days', type=int, default=25, help="Number of daily rollovers to simulate")
+    args = parser.parse_args()
+
+    if not verify(args.vehicles, args.seed, args.days):
+        sys.exit(1)